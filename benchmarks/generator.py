@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic fact generator for the benchmark suite.
+
+Facts have the shape of `hello_world.IrbdBalance`: an ``item`` dimension with
+the ``category``, ``subcategory`` and ``line_item`` levels, a ``year``
+dimension and an ``amount`` measure. The ``flat`` variant stores everything
+in the ``irbd_balance`` table, the ``star`` variant keeps the item levels in
+the ``benchmark_item`` dimension table referenced by ``benchmark_sale``.
+
+Rows are generated from a seeded random generator, so the same arguments
+always produce the same database.
+"""
+import random
+from itertools import islice
+
+from django.db import connection, transaction
+
+__all__ = ['VARIANTS', 'item_members', 'generate']
+
+
+VARIANTS = {
+    'flat': {
+        'cube': 'irbd_balance',
+        'class_name': 'hello_world.IrbdBalance',
+        'models': {'django': 'model-flat.json', 'sql': 'model-flat.json'},
+    },
+    'star': {
+        'cube': 'sales',
+        'class_name': 'benchmarks.Sale',
+        'models': {'django': 'model-star-django.json', 'sql': 'model-star-sql.json'},
+    },
+}
+
+BATCH_SIZE = 5000
+
+
+def item_members(cardinalities):
+    """Returns a list of (category, category_label, subcategory,
+    subcategory_label, line_item) tuples. `cardinalities` is a tuple with the
+    number of categories, subcategories per category and line items per
+    subcategory."""
+    categories, subcategories, line_items = cardinalities
+    members = []
+    for c in range(categories):
+        category = 'c%d' % c
+        for s in range(subcategories):
+            subcategory = '%ss%d' % (category, s)
+            for l in range(line_items):
+                members.append((
+                    category, 'Category %d' % c,
+                    subcategory, 'Subcategory %d.%d' % (c, s),
+                    'Line item %d.%d.%d' % (c, s, l),
+                ))
+    return members
+
+
+def _insert(table, columns, rows):
+    qn = connection.ops.quote_name
+    sql = 'INSERT INTO %s (%s) VALUES (%s)' % (
+        qn(table), ', '.join(qn(column) for column in columns), ', '.join(['%s'] * len(columns))
+    )
+    cursor = connection.cursor()
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, BATCH_SIZE))
+        if not batch:
+            break
+        cursor.executemany(sql, batch)
+
+
+def _facts(rng, rows, item_count, first_year, years):
+    for pk in range(1, rows + 1):
+        yield (pk, rng.randrange(item_count), first_year + rng.randrange(years), rng.randint(-1000, 100000))
+
+
+def generate(variant, rows, cardinalities=(3, 10, 20), years=10, first_year=2000, seed=0):
+    """Deletes the facts of `variant` and loads `rows` new ones."""
+    rng = random.Random(seed)
+    members = item_members(cardinalities)
+
+    with transaction.atomic():
+        if variant == 'flat':
+            from example.hello_world.models import IrbdBalance
+            IrbdBalance.objects.all().delete()
+            _insert(
+                IrbdBalance._meta.db_table,
+                ['id', 'category', 'category_label', 'subcategory', 'subcategory_label', 'line_item', 'year', 'amount'],
+                ((pk,) + members[index] + (year, amount)
+                 for pk, index, year, amount in _facts(rng, rows, len(members), first_year, years))
+            )
+        elif variant == 'star':
+            from benchmarks.models import Item, Sale
+            Sale.objects.all().delete()
+            Item.objects.all().delete()
+            _insert(
+                Item._meta.db_table,
+                ['id', 'category', 'category_label', 'subcategory', 'subcategory_label', 'line_item'],
+                ((pk,) + member for pk, member in enumerate(members, 1))
+            )
+            _insert(
+                Sale._meta.db_table,
+                ['id', 'item_id', 'year', 'amount'],
+                ((pk, index + 1, year, amount)
+                 for pk, index, year, amount in _facts(rng, rows, len(members), first_year, years))
+            )
+        else:
+            raise ValueError("Unknown benchmark variant '%s'" % variant)
+
+    # The raw inserts do not send the signals that bump the data version
+    from django_cubes.versions import bump_data_version
+    bump_data_version(IrbdBalance if variant == 'flat' else Sale)
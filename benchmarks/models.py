@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models
+
+
+class Item(models.Model):
+    """Item dimension table of the star schema variant of `IrbdBalance`"""
+    category = models.CharField(max_length=256)
+    category_label = models.CharField(max_length=256)
+    subcategory = models.CharField(max_length=256)
+    subcategory_label = models.CharField(max_length=256)
+    line_item = models.CharField(max_length=256)
+
+    class Meta:
+        db_table = 'benchmark_item'
+
+
+class Sale(models.Model):
+    """Fact table of the star schema variant of `IrbdBalance`"""
+    item = models.ForeignKey(Item, db_column='item_id')
+    year = models.IntegerField()
+    amount = models.IntegerField()
+
+    class Meta:
+        db_table = 'benchmark_sale'
@@ -0,0 +1,338 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Times the slicer endpoints against a synthetic fact table.
+
+Example::
+
+    python benchmarks/run.py --variant flat --rows 100000 --output results.json
+    python benchmarks/run.py --variant flat --rows 100000 --baseline results.json
+
+The generated SQLite database is kept in `--workdir` and reused by later runs
+with the same data arguments. Every endpoint is requested once to warm up and
+then `--repeat` times; timings are in milliseconds. When a `--baseline` is
+given, median timings are compared with it and the exit status is 1 if any
+endpoint got slower than `--threshold` times its baseline. Endpoints that
+do not answer 200, like actions the backend does not enable (``members``
+and ``report`` on the ``django`` backend), are reported as skipped and not
+timed.
+
+The time taken to import the URLs of the slicer, and then its views, is
+measured in new interpreters, as paid by every process that loads the URLs.
+The exit status is 1 as well if importing the URLs takes longer than
+`--import-budget` milliseconds.
+"""
+from __future__ import print_function
+
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from os.path import abspath, dirname, exists, join
+
+ROOT = dirname(dirname(abspath(__file__)))
+ASSETS = join(ROOT, 'benchmarks', 'assets')
+
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+BACKENDS = ('django', 'sql')
+
+SLICER_CONFIG = {
+    'django': u"""[workspace]
+log_level: error
+
+[store]
+type: django
+class_name: {class_name}
+
+[models]
+main: {model}
+""",
+    'sql': u"""[workspace]
+log_level: error
+
+[store]
+type: sql
+url: sqlite:///{database}
+
+[models]
+main: {model}
+""",
+}
+
+
+def endpoints(cube_name):
+    """Returns a list of (name, method, path, data) tuples to be timed."""
+    base = '/cube/%s' % cube_name
+    report = json.dumps({
+        'queries': {
+            'summary': {'query': 'aggregate'},
+            'by_category': {'query': 'aggregate', 'drilldown': ['item']},
+            'categories': {'query': 'values', 'dimension': 'item', 'depth': 1},
+        }
+    })
+    return [
+        ('aggregate', 'get', '%s/aggregate/' % base, None),
+        ('aggregate_drilldown', 'get', '%s/aggregate/?drilldown=item|year' % base, None),
+        ('aggregate_drilldown_columnar', 'get', '%s/aggregate/?drilldown=item|year&format=columnar' % base, None),
+        ('aggregate_drilldown_cut', 'get', '%s/aggregate/?drilldown=item&cut=item:c0' % base, None),
+        ('facts_page', 'get', '%s/facts/?page=2&pagesize=100&order=amount' % base, None),
+        ('facts_page_columnar', 'get', '%s/facts/?page=2&pagesize=100&order=amount&format=columnar' % base, None),
+        ('cell', 'get', '%s/cell/?cut=item:c0' % base, None),
+        ('members', 'get', '%s/members/item/?level=category' % base, None),
+        ('report', 'post', '%s/report/' % base, report),
+    ]
+
+
+def configure_settings(database):
+    from django.conf import settings
+
+    settings.configure(
+        DEBUG=False,
+        DATABASES={
+            'default': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': database,
+            }
+        },
+        INSTALLED_APPS=(
+            'django.contrib.contenttypes',
+            'django.contrib.auth',
+            'django.contrib.sessions',
+            'django_cubes',
+            'example.hello_world',
+            'benchmarks',
+        ),
+        MIDDLEWARE_CLASSES=(
+            'django.middleware.common.CommonMiddleware',
+            'django.contrib.sessions.middleware.SessionMiddleware',
+            'django.contrib.auth.middleware.AuthenticationMiddleware',
+        ),
+        ROOT_URLCONF='django_cubes.urls',
+        SLICER_MODELS_DIR=ASSETS,
+        SLICER_CONFIG_FILE=None,
+    )
+    return settings
+
+
+# Imports the URLs and then the views of the slicer in a new interpreter,
+# printing the milliseconds taken by each
+IMPORT_TIMER = u"""
+import json, sys, time
+sys.path.insert(0, {root!r})
+from benchmarks.run import configure_settings
+configure_settings(':memory:')
+import django
+if django.VERSION >= (1, 7):
+    django.setup()
+start = time.time()
+import django_cubes.urls
+urls = time.time()
+import django_cubes.api
+views = time.time()
+print(json.dumps({{'urls': (urls - start) * 1000.0, 'views': (views - urls) * 1000.0}}))
+"""
+
+
+def time_imports(repeat):
+    """Returns the summaries of the timings of importing the URLs and the
+    views of the slicer, in milliseconds."""
+    timings = {'urls': [], 'views': []}
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, '-c', IMPORT_TIMER.format(root=ROOT)])
+        for name, value in json.loads(output.decode('utf-8')).items():
+            timings[name].append(value)
+    results = dict((name, summarize(values)) for name, values in timings.items())
+    for name in ('urls', 'views'):
+        print('  import %-23s %14.2f ms' % (name, results[name]['median']))
+    return results
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    middle = len(timings) // 2
+    if len(timings) % 2:
+        median = timings[middle]
+    else:
+        median = (timings[middle - 1] + timings[middle]) / 2.0
+    return {
+        'min': timings[0],
+        'median': median,
+        'mean': sum(timings) / len(timings),
+        'max': timings[-1],
+    }
+
+
+def time_endpoints(client, cube_name, repeat):
+    results = {}
+    for name, method, path, data in endpoints(cube_name):
+        kwargs = {'content_type': 'application/json'} if data else {}
+        request = getattr(client, method)
+
+        timings = []
+        try:
+            for _ in range(repeat + 1):
+                start = time.time()
+                response = request(path, data, **kwargs) if data else request(path)
+                timings.append((time.time() - start) * 1000.0)
+                if response.status_code != 200:
+                    break
+        except Exception as e:
+            # The test client re-raises exceptions of the view
+            results[name] = {'status': 500, 'error': repr(e)}
+            print('  %-30s 500 %r' % (name, e))
+            continue
+
+        if response.status_code != 200:
+            # Actions not enabled by the backend, the error path is not timed
+            results[name] = {'status': response.status_code, 'skipped': True}
+            print('  %-30s %3d skipped' % (name, response.status_code))
+            continue
+
+        result = {'status': response.status_code, 'bytes': len(response.content)}
+        result.update(summarize(timings[1:]))
+        results[name] = result
+        print('  %-30s %3d %10.2f ms' % (name, response.status_code, result['median']))
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Prints median ratios against `baseline`. Returns the list of
+    (backend, endpoint, ratio) that are slower than `threshold`."""
+    regressions = []
+    if baseline.get('parameters') != results['parameters']:
+        print('\nWarning: the baseline was run with different parameters: %s' % baseline.get('parameters'))
+    print('\nComparison with baseline (median, current / baseline):')
+    for backend, endpoints_results in sorted(results['results'].items()):
+        for name, current in sorted(endpoints_results.items()):
+            previous = baseline.get('results', {}).get(backend, {}).get(name)
+            if not previous or previous['status'] != 200 or current['status'] != 200:
+                continue
+            ratio = current['median'] / previous['median'] if previous['median'] else 1.0
+            flag = ' REGRESSION' if ratio > threshold else ''
+            print('  %-7s %-30s %6.2fx%s' % (backend, name, ratio, flag))
+            if flag:
+                regressions.append((backend, name, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='django-cubes endpoint benchmarks')
+    parser.add_argument('--variant', choices=['flat', 'star'], default='flat')
+    parser.add_argument('--rows', type=int, default=10000, help='number of generated facts')
+    parser.add_argument('--levels', default='3,10,20',
+                        help='categories, subcategories per category and line items per subcategory')
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--backends', default=','.join(BACKENDS))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--workdir', default=join(tempfile.gettempdir(), 'django-cubes-benchmarks'))
+    parser.add_argument('--regenerate', action='store_true', help='regenerate the database even if it exists')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    parser.add_argument('--baseline', help='JSON results of a previous run to compare with')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='slowdown ratio considered a regression')
+    parser.add_argument('--import-budget', type=float, default=None,
+                        help='milliseconds importing the URLs of the slicer may take')
+    args = parser.parse_args(argv)
+
+    cardinalities = tuple(int(value) for value in args.levels.split(','))
+    if not exists(args.workdir):
+        os.makedirs(args.workdir)
+    database = join(args.workdir, '%s-%d-%s-%d-%d.sqlite' % (
+        args.variant, args.rows, '_'.join(str(value) for value in cardinalities), args.years, args.seed
+    ))
+    generate_data = args.regenerate or not exists(database)
+
+    configure_settings(database)
+    import django
+    if django.VERSION >= (1, 7):
+        django.setup()
+
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+    from django.test import Client
+    from django.test.utils import override_settings, setup_test_environment
+    from cubes import __version__ as cubes_version
+    from django_cubes import api
+    from benchmarks.generator import VARIANTS, generate
+
+    setup_test_environment()
+    variant = VARIANTS[args.variant]
+
+    if generate_data:
+        print('Generating %d %s facts into %s' % (args.rows, args.variant, database))
+        call_command('migrate' if django.VERSION >= (1, 7) else 'syncdb', interactive=False, verbosity=0)
+        start = time.time()
+        generate(args.variant, args.rows, cardinalities, years=args.years, seed=args.seed)
+        print('  done in %.1f s' % (time.time() - start))
+
+    User = get_user_model()
+    if not User.objects.filter(username='benchmark').exists():
+        User.objects.create_user('benchmark', 'benchmark@example.test', 'benchmark')
+    client = Client()
+    client.login(username='benchmark', password='benchmark')
+
+    results = {
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'cubes': cubes_version,
+            'platform': platform.platform(),
+        },
+        'parameters': {
+            'variant': args.variant,
+            'rows': args.rows,
+            'levels': list(cardinalities),
+            'years': args.years,
+            'seed': args.seed,
+            'repeat': args.repeat,
+        },
+        'results': {},
+    }
+
+    print('Imports')
+    results['imports'] = time_imports(args.repeat)
+
+    for backend in args.backends.split(','):
+        config = join(args.workdir, 'slicer-%s-%s.ini' % (args.variant, backend))
+        with io.open(config, 'w') as handle:
+            handle.write(SLICER_CONFIG[backend].format(
+                class_name=variant['class_name'],
+                model=variant['models'][backend],
+                database=database,
+            ))
+
+        # The workspace is cached per thread, drop it to pick the new backend
+        api.data.__dict__.pop('workspace', None)
+        print('Backend %s, cube %s' % (backend, variant['cube']))
+        with override_settings(SLICER_CONFIG_FILE=config):
+            results['results'][backend] = time_endpoints(client, variant['cube'], args.repeat)
+
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump(results, handle, indent=2, sort_keys=True)
+
+    status = 0
+    if args.import_budget is not None and results['imports']['urls']['median'] > args.import_budget:
+        print('\nImporting the URLs took %.2f ms, over the budget of %.2f ms' % (
+            results['imports']['urls']['median'], args.import_budget
+        ))
+        status = 1
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)
+        if compare(results, baseline, args.threshold):
+            status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+
+# Django >= 1.7
+default_app_config = 'django_cubes.apps.CubesConfig'
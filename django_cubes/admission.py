@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Admission control for slicer requests.
+
+Configured by the ``settings.SLICER_ADMISSION`` dictionary, every key is
+optional:
+
+* ``max_concurrent`` – slicer requests a user can have running at once
+* ``queue_timeout`` – seconds a request waits for one of the user's slots
+  before being rejected with 429 (default 0, reject at once)
+* ``max_rows`` – estimated fact rows a single aggregation may scan
+* ``max_rows_per_minute`` – estimated fact rows a user may scan per minute
+* ``max_cells`` – estimated cells an unpaginated drilldown may return
+* ``policy`` – what to do with a drilldown over ``max_cells``: ``paginate``
+  (default) serves its first page of ``page_size`` cells, ``reject`` refuses
+  it
+* ``page_size`` – page size of downgraded drilldowns (default 1000)
+
+Cost estimates are provided by browsers implementing ``estimate_cost()``,
+other browsers are only subject to the concurrency limit. Limits are kept per
+process.
+"""
+import logging
+import time
+from collections import deque
+from threading import Condition, Lock
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError, Throttled
+
+__all__ = ['AdmissionController', 'get_admission_controller']
+
+POLICIES = ('paginate', 'reject')
+
+
+class AdmissionController(object):
+
+    def __init__(self, max_concurrent=None, queue_timeout=0, max_rows=None,
+                 max_rows_per_minute=None, max_cells=None, policy='paginate', page_size=1000):
+        if policy not in POLICIES:
+            raise ValueError("Unknown admission policy '%s'" % policy)
+
+        self.max_concurrent = max_concurrent
+        self.queue_timeout = queue_timeout
+        self.max_rows = max_rows
+        self.max_rows_per_minute = max_rows_per_minute
+        self.max_cells = max_cells
+        self.policy = policy
+        self.page_size = page_size
+
+        self.running = {}
+        self.condition = Condition()
+        self.scanned = {}
+        self.scanned_lock = Lock()
+
+    def _user_key(self, user):
+        return user.pk if user is not None and user.is_authenticated() else None
+
+    def acquire(self, user):
+        """Takes one of the concurrency slots of `user`, waiting at most
+        `queue_timeout` seconds for one to be released. Returns a key to be
+        passed to `release()`."""
+        key = self._user_key(user)
+        if self.max_concurrent is None:
+            return key
+
+        deadline = time.time() + self.queue_timeout
+        with self.condition:
+            while self.running.get(key, 0) >= self.max_concurrent:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    message = "Too many concurrent requests, at most %d are allowed" % self.max_concurrent
+                    logging.error(message)
+                    raise Throttled(detail=message)
+                self.condition.wait(remaining)
+            self.running[key] = self.running.get(key, 0) + 1
+        return key
+
+    def release(self, key):
+        if self.max_concurrent is None:
+            return
+
+        with self.condition:
+            self.running[key] -= 1
+            if not self.running[key]:
+                del self.running[key]
+            self.condition.notify_all()
+
+    def _charge(self, user, rows):
+        """Accounts `rows` to the rolling one minute budget of `user`."""
+        key = self._user_key(user)
+        now = time.time()
+        with self.scanned_lock:
+            history = self.scanned.setdefault(key, deque())
+            while history and history[0][0] < now - 60:
+                history.popleft()
+
+            if sum(item[1] for item in history) + rows > self.max_rows_per_minute:
+                message = "Query budget exceeded, try again in a minute"
+                logging.error(message)
+                raise Throttled(wait=60, detail=message)
+            history.append((now, rows))
+
+    def admit_aggregation(self, user, browser, cell, drilldown, page, page_size):
+        """Checks the estimated cost of aggregating `cell` by `drilldown` (a
+        `Drilldown` object) against the budgets. Returns a tuple (`page`,
+        `page_size`, `downgraded`) with the pagination to be used; raises
+        `ParseError` or `Throttled` when the aggregation is refused."""
+        limits = (self.max_rows, self.max_rows_per_minute, self.max_cells)
+        if not hasattr(browser, 'estimate_cost') or all(limit is None for limit in limits):
+            return page, page_size, False
+
+        cost = browser.estimate_cost(cell, drilldown)
+
+        if self.max_rows is not None and cost.rows > self.max_rows:
+            message = "Aggregation would scan about %d rows, at most %d are allowed. " \
+                      "Narrow down the cut" % (cost.rows, self.max_rows)
+            logging.error(message)
+            raise ParseError(detail=message)
+
+        paginated = page_size and page is not None
+        downgraded = False
+        if drilldown and self.max_cells is not None and cost.cells > self.max_cells:
+            downgraded = not (paginated and page_size <= self.page_size)
+
+        if downgraded and self.policy == 'reject':
+            message = "Drilldown would return about %d cells, at most %d are allowed " \
+                      "without pagination" % (cost.cells, self.max_cells)
+            logging.error(message)
+            raise ParseError(detail=message)
+
+        # Only admitted aggregations are charged
+        if self.max_rows_per_minute is not None:
+            self._charge(user, cost.rows)
+
+        if downgraded:
+            return (page if paginated else 1), self.page_size, True
+        return page, page_size, False
+
+
+_controller = None
+_controller_config = None
+_controller_lock = Lock()
+
+
+def get_admission_controller():
+    """Returns the process wide `AdmissionController` configured by
+    ``settings.SLICER_ADMISSION`` or ``None`` when admission control is
+    disabled."""
+    global _controller, _controller_config
+
+    config = getattr(settings, 'SLICER_ADMISSION', None)
+    if not config:
+        return None
+
+    with _controller_lock:
+        if config is not _controller_config:
+            _controller = AdmissionController(**config)
+            _controller_config = config
+        return _controller
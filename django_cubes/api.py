@@ -1,30 +1,47 @@
 # -*- coding: utf-8 -*-
 import logging
 import re
+import time
 from collections import OrderedDict
+from functools import partial
 from threading import local
 
 from rest_framework.views import APIView
-from rest_framework import permissions
+from rest_framework import permissions, status
 from rest_framework.response import Response
-from rest_framework.exceptions import ParseError
+from rest_framework.exceptions import APIException, ParseError
 from rest_framework.renderers import TemplateHTMLRenderer
+from rest_framework.settings import api_settings
 
 from cubes import __version__, browser, cut_from_dict
 from cubes.workspace import Workspace, SLICER_INFO_KEYS
-from cubes.errors import NoSuchCubeError
+from cubes.auth import NotAuthorized
+from cubes.errors import ArgumentError, NoSuchCubeError
 from cubes.calendar import CalendarMemberConverter
-from cubes.browser import Cell, cuts_from_string
+from cubes.browser import Cell, Drilldown, cuts_from_string
 
 from django.conf import settings
-from django.http import Http404
+from django.http import Http404, StreamingHttpResponse
+from django.utils.http import http_date
 from django.core.exceptions import ImproperlyConfigured
 
+from .admission import get_admission_controller
+from .authorization import get_authorization_cache
+from .backends.django_orm import register_extensions
+from .backends.django_orm.timeouts import QueryTimeoutError
+from .columnar import columnar_aggregation, columnar_facts
+from .conditional import digest, etag_matches, get_http_cache, make_etag, modified_since, normalized_query
+from .metadata import get_model_cache
+from .profiling import RequestProfiler, profiling_requested
+from .querylog import get_query_log
+from .renderers import ColumnarJSONRenderer, CubesCSVRenderer, CubesJSONLinesRenderer, CubesJSONRenderer
+from .streaming import ServerSentEventsRenderer, aggregation_events
+
 API_VERSION = 2
 
 __all__ = [
     'Index', 'ApiVersion', 'Info',
-    'ListCubes', 'CubeModel', 'CubeAggregation',
+    'ListCubes', 'CubeModel', 'CubeAggregation', 'CubeAggregationStream',
     'CubeCell', 'CubeReport', 'CubeFacts',
     'CubeFact', 'CubeMembers',
 ]
@@ -32,17 +49,32 @@ __all__ = [
 
 data = local()
 
+# Renderers of the views returning aggregation, facts and members results
+RESULT_RENDERER_CLASSES = (CubesJSONRenderer, ) + tuple(api_settings.DEFAULT_RENDERER_CLASSES) + (
+    ColumnarJSONRenderer, CubesCSVRenderer, CubesJSONLinesRenderer
+)
+
 
 def create_local_workspace(config, cubes_root):
     """
-    Returns or creates a thread-local instance of Workspace
+    Returns or creates a thread-local instance of Workspace, with the models
+    of its cubes precomputed unless ``settings.SLICER_PRELOAD_MODELS`` is
+    ``False``.
     """
     if not hasattr(data, 'workspace'):
+        register_extensions()
         data.workspace = Workspace(config=config, cubes_root=cubes_root)
+        if getattr(settings, 'SLICER_PRELOAD_MODELS', True):
+            get_model_cache(data.workspace).preload()
 
     return data.workspace
 
 
+class QueryTimeout(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Query cancelled because it took too long.'
+
+
 class ApiVersion(APIView):
     permission_classes = (permissions.IsAuthenticated,)
 
@@ -86,15 +118,27 @@ class CubesView(APIView):
 
     def get_cube(self, request, cube_name):
         self.initialize_slicer()
+        if self.workspace.authorizer and not self.get_authorization().authorize(request.user, [cube_name]):
+            raise NotAuthorized
         try:
-            cube = self.workspace.cube(cube_name, request.user)
+            cube = get_model_cache(self.workspace).cube(cube_name)
         except NoSuchCubeError:
             raise Http404
 
         return cube
 
+    def get_authorization(self):
+        """Returns the cached answers of the authorizer of the workspace,
+        see `django_cubes.authorization`."""
+        return get_authorization_cache(self.workspace)
+
     def get_browser(self, cube):
-        return self.workspace.browser(cube)
+        """Returns the browser of `cube`, shared by the requests to the cube,
+        see `django_cubes.metadata`."""
+        return get_model_cache(self.workspace).browser(cube)
+
+    def get_features(self, browser):
+        return get_model_cache(self.workspace).features(browser)
 
     def get_cell(self, request, cube, argname="cut", restrict=False):
         """Returns a `Cell` object from argument with name `argname`"""
@@ -115,7 +159,7 @@ class CubesView(APIView):
 
         if restrict:
             if self.workspace.authorizer:
-                cell = self.workspace.authorizer.restricted_cell(
+                cell = self.get_authorization().restricted_cell(
                     request.user, cube=cube, cell=cell
                 )
         return cell
@@ -133,8 +177,48 @@ class CubesView(APIView):
         info["api_version"] = API_VERSION
         return info
 
+    def conditional_response(self, request, data, content_digest):
+        """Returns the response of `data`, whose content has
+        `content_digest`, with its ETag. The response is a 304 without
+        content if the client has it already."""
+        etag = make_etag(content_digest, request.accepted_renderer.format)
+        if etag_matches(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+        return response
+
+    def check_not_modified(self, request, browser, cell):
+        """Returns a 304 response if the client has the result of `browser`
+        for the `cell`, restricted by the authorizer, and the query of
+        `request` already, or else ``None``. The result is tagged by
+        `finalize_response()`. See `django_cubes.conditional`."""
+        config = get_http_cache()
+        data_version = getattr(browser, 'data_version', None)
+        if config is None or data_version is None:
+            return None
+
+        version, timestamp = data_version()
+        if version is None:
+            # Without a known version any tag could be stale
+            return None
+        content_digest = digest(
+            version, repr(timestamp), request.path, normalized_query(request), cell.to_str() if cell else ''
+        )
+        etag = make_etag(content_digest, request.accepted_renderer.format)
+        request.conditional = (etag, timestamp, config)
+
+        if request.META.get('HTTP_IF_NONE_MATCH'):
+            not_modified = etag_matches(request, etag)
+        else:
+            not_modified = timestamp is not None and not modified_since(request, timestamp)
+        if not_modified:
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+        return None
+
     def assert_enabled_action(self, request, browser, action):
-        features = browser.features()
+        features = self.get_features(browser)
         if action not in features['actions']:
             message = u"The action '{}' is not enabled".format(action)
             logging.error(message)
@@ -142,14 +226,14 @@ class CubesView(APIView):
 
     def _handle_pagination_and_order(self, request):
         try:
-            page = request.QUERY_PARAMS.get('page', None)
-        except ValueError:
+            page = int(request.QUERY_PARAMS['page'])
+        except (KeyError, ValueError):
             page = None
         request.page = page
 
         try:
-            page_size = request.QUERY_PARAMS.get('pagesize', None)
-        except ValueError:
+            page_size = int(request.QUERY_PARAMS['pagesize'])
+        except (KeyError, ValueError):
             page_size = None
         request.page_size = page_size
 
@@ -167,9 +251,57 @@ class CubesView(APIView):
 
     def initialize_request(self, request, *args, **kwargs):
         request = super(CubesView, self).initialize_request(request, *args, **kwargs)
+        request.started = time.time()
         self._handle_pagination_and_order(request)
         return request
 
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super(CubesView, self).dispatch(request, *args, **kwargs)
+        finally:
+            slot = getattr(getattr(self, 'request', None), 'admission_slot', None)
+            if slot is not None:
+                admission, key = slot
+                admission.release(key)
+
+    def initial(self, request, *args, **kwargs):
+        super(CubesView, self).initial(request, *args, **kwargs)
+        admission = get_admission_controller()
+        if admission is not None:
+            request.admission_slot = (admission, admission.acquire(request.user))
+
+        if profiling_requested(request):
+            request.profiler = RequestProfiler()
+            request.profiler.start()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, QueryTimeoutError):
+            logging.error(str(exc))
+            exc = QueryTimeout(detail=str(exc))
+        elif isinstance(exc, ArgumentError):
+            # Arguments the browser can not serve, like a sample of a
+            # partitioned cube
+            logging.error(str(exc))
+            exc = ParseError(detail=str(exc))
+        return super(CubesView, self).handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super(CubesView, self).finalize_response(request, response, *args, **kwargs)
+        conditional = getattr(request, 'conditional', None)
+        if conditional is not None and response.status_code in (200, 304):
+            etag, timestamp, config = conditional
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+            response['Cache-Control'] = config['cache_control']
+        profiler = getattr(request, 'profiler', None)
+        if profiler is not None:
+            response = profiler.finish(request, response)
+        query_log = get_query_log()
+        if query_log is not None:
+            query_log.record(request, response, time.time() - request.started)
+        return response
+
 
 class Index(CubesView):
     renderer_classes = (TemplateHTMLRenderer,)
@@ -190,34 +322,32 @@ class ListCubes(CubesView):
 
     def get(self, request):
         self.initialize_slicer()
-        cube_list = self.workspace.list_cubes(request.user)
-        return Response(cube_list)
+        cube_list, list_digest = get_model_cache(self.workspace).list_cubes()
+        if self.workspace.authorizer:
+            authorized = self.get_authorization().authorize(request.user, [cube["name"] for cube in cube_list])
+            cube_list = [cube for cube in cube_list if cube["name"] in authorized]
+            list_digest = digest(list_digest, *[cube["name"] for cube in cube_list])
+        return self.conditional_response(request, cube_list, list_digest)
 
 
 class CubeModel(CubesView):
 
     def get(self, request, cube_name):
-        cube = self.get_cube(request, cube_name)
+        self.get_cube(request, cube_name)
         if self.workspace.authorizer:
-            hier_limits = self.workspace.authorizer.hierarchy_limits(
+            hier_limits = self.get_authorization().hierarchy_limits(
                 request.user, cube_name
             )
         else:
             hier_limits = None
 
-        model = cube.to_dict(
-            expand_dimensions=True,
-            with_mappings=False,
-            full_attribute_names=True,
-            create_label=True,
-            hierarchy_limits=hier_limits
-        )
-
-        model["features"] = self.workspace.cube_features(cube)
-        return Response(model)
+        # Computed once per cube and hierarchy limits
+        model, model_digest = get_model_cache(self.workspace).model(cube_name, hier_limits)
+        return self.conditional_response(request, model, model_digest)
 
 
 class CubeAggregation(CubesView):
+    renderer_classes = RESULT_RENDERER_CLASSES
 
     def get(self, request, cube_name):
         cube = self.get_cube(request, cube_name)
@@ -225,30 +355,149 @@ class CubeAggregation(CubesView):
         self.assert_enabled_action(request, browser, 'aggregate')
 
         cell = self.get_cell(request, cube, restrict=True)
+        not_modified = self.check_not_modified(request, browser, cell)
+        if not_modified is not None:
+            return not_modified
+
+        aggregates = self.get_aggregates(request)
+        drilldown = self.get_drilldown(request)
+
+        page, page_size, downgraded = request.page, request.page_size, False
+        admission = get_admission_controller()
+        if admission is not None:
+            page, page_size, downgraded = admission.admit_aggregation(
+                request.user, browser, cell or Cell(cube),
+                Drilldown(drilldown, cell or Cell(cube)), page, page_size
+            )
+        if downgraded:
+            # The ETag identifies the full result, a page of it must not be
+            # cached or revalidated in its place
+            request.conditional = None
+
+        columnar = getattr(request.accepted_renderer, 'columnar', False)
 
-        # Aggregates
+        options = {}
+        sample = self.get_sample(request, browser)
+        if sample is not None:
+            options['sample'] = sample
+
+        split = self.get_cell(request, cube, argname='split')
+        result = browser.aggregate(
+            cell,
+            aggregates=aggregates,
+            drilldown=drilldown,
+            split=split,
+            page=page,
+            page_size=page_size,
+            order=request.order,
+            **options
+        )
+
+        data = columnar_aggregation(result) if columnar else result.to_dict()
+        if getattr(result, 'sample', None):
+            data['sample'] = result.sample
+        response = Response(data)
+        if downgraded:
+            response['X-Cubes-Admission'] = 'paginated; page_size=%d' % page_size
+        return response
+
+    def get_aggregates(self, request):
         aggregates = []
         for agg in request.QUERY_PARAMS.getlist('aggregates') or []:
             aggregates += agg.split('|')
+        return aggregates
 
+    def get_drilldown(self, request):
         drilldown = []
         ddlist = request.QUERY_PARAMS.getlist('drilldown')
         if ddlist:
             for ddstring in ddlist:
                 drilldown += ddstring.split('|')
+        return drilldown
 
-        split = self.get_cell(request, cube, argname='split')
-        result = browser.aggregate(
+    def get_sample(self, request, browser):
+        """Returns the fraction of the facts to aggregate given by the
+        ``sample`` parameter, or ``None`` to aggregate all of them."""
+        sample = request.QUERY_PARAMS.get('sample')
+        if not sample:
+            return None
+
+        if not self.get_features(browser).get('sampling'):
+            message = "Sampling is not supported by the backend of this cube"
+            logging.error(message)
+            raise ParseError(detail=message)
+
+        try:
+            sample = float(sample)
+        except ValueError:
+            sample = None
+        if sample is None or not 0 < sample <= 1:
+            message = "sample should be a fraction greater than 0 and at most 1"
+            logging.error(message)
+            raise ParseError(detail=message)
+        return sample
+
+
+class CubeAggregationStream(CubeAggregation):
+    """Aggregation of the facts in parts, sending the result of the parts
+    aggregated so far after each part as a server-sent event. See
+    `django_cubes.streaming`."""
+    renderer_classes = (ServerSentEventsRenderer, CubesJSONRenderer)
+
+    def get(self, request, cube_name):
+        cube = self.get_cube(request, cube_name)
+        browser = self.get_browser(cube)
+        self.assert_enabled_action(request, browser, 'aggregate')
+
+        if not self.get_features(browser).get('aggregate_parts'):
+            message = "Progressive aggregation is not supported by the backend of this cube"
+            logging.error(message)
+            raise ParseError(detail=message)
+
+        try:
+            parts = int(request.QUERY_PARAMS.get('parts', getattr(settings, 'SLICER_STREAM_PARTS', 10)))
+        except ValueError:
+            parts = 0
+        if not 0 < parts <= 1000:
+            message = "parts should be an integer between 1 and 1000"
+            logging.error(message)
+            raise ParseError(detail=message)
+
+        cell = self.get_cell(request, cube, restrict=True)
+        drilldown = self.get_drilldown(request)
+
+        page, page_size, downgraded = request.page, request.page_size, False
+        admission = get_admission_controller()
+        if admission is not None:
+            page, page_size, downgraded = admission.admit_aggregation(
+                request.user, browser, cell or Cell(cube),
+                Drilldown(drilldown, cell or Cell(cube)), page, page_size
+            )
+
+        results = browser.aggregate_parts(
             cell,
-            aggregates=aggregates,
+            aggregates=self.get_aggregates(request),
             drilldown=drilldown,
-            split=split,
-            page=request.page,
-            page_size=request.page_size,
-            order=request.order
+            page=page,
+            page_size=page_size,
+            parts=parts
         )
 
-        return Response(result.to_dict())
+        # The parts are aggregated after the view returns, while the events
+        # are sent, so they keep the concurrency slot until they are done
+        release = None
+        slot = getattr(request, 'admission_slot', None)
+        if slot is not None:
+            request.admission_slot = None
+            release = partial(slot[0].release, slot[1])
+
+        response = StreamingHttpResponse(aggregation_events(results, release), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Tells nginx not to buffer the events
+        response['X-Accel-Buffering'] = 'no'
+        if downgraded:
+            response['X-Cubes-Admission'] = 'paginated; page_size=%d' % page_size
+        return response
 
 
 class CubeCell(CubesView):
@@ -259,6 +508,10 @@ class CubeCell(CubesView):
         self.assert_enabled_action(request, browser, 'cell')
 
         cell = self.get_cell(request, cube, restrict=True)
+        not_modified = self.check_not_modified(request, browser, cell)
+        if not_modified is not None:
+            return not_modified
+
         details = browser.cell_details(cell)
 
         if not cell:
@@ -272,6 +525,7 @@ class CubeCell(CubesView):
 
 
 class CubeReport(CubesView):
+    renderer_classes = (CubesJSONRenderer, ) + tuple(api_settings.DEFAULT_RENDERER_CLASSES)
 
     def make_report(self, request, cube_name):
         cube = self.get_cube(request, cube_name)
@@ -298,7 +552,7 @@ class CubeReport(CubesView):
             )
 
             if self.workspace.authorizer:
-                cell = self.workspace.authorizer.restricted_cell(
+                cell = self.get_authorization().restricted_cell(
                     request.user, cube=cube, cell=cell
                 )
         else:
@@ -318,6 +572,7 @@ class CubeReport(CubesView):
 
 
 class CubeFacts(CubesView):
+    renderer_classes = RESULT_RENDERER_CLASSES
 
     def get(self, request, cube_name):
         cube = self.get_cube(request, cube_name)
@@ -333,6 +588,11 @@ class CubeFacts(CubesView):
 
         fields = [attr.ref() for attr in attributes]
         cell = self.get_cell(request, cube, restrict=True)
+        not_modified = self.check_not_modified(request, browser, cell)
+        if not_modified is not None:
+            return not_modified
+
+        columnar = getattr(request.accepted_renderer, 'columnar', False)
 
         # Get the result
         facts = browser.facts(
@@ -343,7 +603,7 @@ class CubeFacts(CubesView):
             order=request.order
         )
 
-        return Response(facts)
+        return Response(columnar_facts(facts, attributes) if columnar else facts)
 
 
 class CubeFact(CubesView):
@@ -357,6 +617,7 @@ class CubeFact(CubesView):
 
 
 class CubeMembers(CubesView):
+    renderer_classes = RESULT_RENDERER_CLASSES
 
     def get(self, request, cube_name, dimension_name):
         cube = self.get_cube(request, cube_name)
@@ -393,6 +654,10 @@ class CubeMembers(CubesView):
             depth = len(hierarchy)
 
         cell = self.get_cell(request, cube, restrict=True)
+        not_modified = self.check_not_modified(request, browser, cell)
+        if not_modified is not None:
+            return not_modified
+
         values = browser.members(
             cell,
             dimension,
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from django.apps import AppConfig
+from django.conf import settings
+
+__all__ = ['CubesConfig']
+
+
+class CubesConfig(AppConfig):
+    name = 'django_cubes'
+    verbose_name = 'Cubes'
+
+    def ready(self):
+        """Warms up the slicer when ``settings.SLICER_WARMUP`` is set, see
+        `django_cubes.warmup`."""
+        if not getattr(settings, 'SLICER_WARMUP', False):
+            return
+
+        from .warmup import warm_up
+        try:
+            warm_up()
+        except Exception:
+            logging.exception("Could not warm up the slicer")
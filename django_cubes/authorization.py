@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Cached authorization of the slicer views.
+
+Every request to a cube asks the authorizer of the workspace whether the
+user may access the cube and for the cuts restricting the cell of the user,
+and the ``/model/`` and ``/cubes/`` views ask it for the hierarchy limits
+and the authorized cubes. Authorizers backed by rights files and group
+lookups do that work again for each of them, so `AuthorizationCache` keeps
+their answers per user and cube for ``settings.SLICER_AUTHORIZATION_TTL``
+seconds (60 unless set, ``0`` to ask the authorizer every time). At most
+``settings.SLICER_AUTHORIZATION_CACHE_SIZE`` answers are kept (10000 unless
+set), the least recently used ones are dropped first, and expired answers
+are dropped when they are looked up.
+
+The restriction of a cube is the cell returned by the authorizer for no
+cell, as the authorizer would restrict an empty request. It is combined
+with the cell of each request exactly as `cubes.auth.SimpleAuthorizer`
+does, so the restricted cell, and the ETag of the results computed from it
+(see `django_cubes.conditional`), are the same as without the cache. This
+requires the restriction to be independent of the requested cell, as it is
+for the authorizers of cubes.
+
+Answers are kept for the authorizer that gave them: they are dropped when
+the workspace gets a new authorizer, when the authorizer has a
+``rights_version()`` method and its value changes, and by `invalidate()`,
+which should be called after the rights configuration is reloaded in
+place. Denials raised by the authorizer, like `NotAuthorized` for unknown
+users, are not cached.
+"""
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+
+__all__ = ['AuthorizationCache', 'get_authorization_cache']
+
+DEFAULT_TTL = 60
+DEFAULT_SIZE = 10000
+
+
+class AuthorizationCache(object):
+    """Answers of the authorizer of `workspace`, kept for `ttl` seconds per
+    user and cube, at most `max_size` of them."""
+
+    def __init__(self, workspace, ttl=None, max_size=None):
+        self.workspace = workspace
+        if ttl is None:
+            ttl = getattr(settings, 'SLICER_AUTHORIZATION_TTL', DEFAULT_TTL)
+        if max_size is None:
+            max_size = getattr(settings, 'SLICER_AUTHORIZATION_CACHE_SIZE', DEFAULT_SIZE)
+        self.ttl = ttl
+        self.max_size = max_size
+        self.lock = Lock()
+        self.authorizer = None
+        self.rights_version = None
+        self.entries = OrderedDict()
+
+    def invalidate(self):
+        """Drops all the answers, to be called when the rights of the
+        authorizer change."""
+        with self.lock:
+            self.entries = OrderedDict()
+
+    def _current_rights(self):
+        """Returns the authorizer of the workspace, dropping the answers of
+        a previous authorizer or rights version."""
+        authorizer = self.workspace.authorizer
+        rights_version = getattr(authorizer, 'rights_version', None)
+        if rights_version is not None:
+            rights_version = rights_version()
+        if authorizer is not self.authorizer or rights_version != self.rights_version:
+            with self.lock:
+                self.entries = OrderedDict()
+                self.authorizer = authorizer
+                self.rights_version = rights_version
+        return authorizer
+
+    def _get(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None or entry[0] <= time.time():
+                return None
+            self.entries[key] = entry
+            return entry
+
+    def _set(self, key, value):
+        if self.ttl and self.max_size:
+            with self.lock:
+                self.entries.pop(key, None)
+                self.entries[key] = (time.time() + self.ttl, value)
+                while len(self.entries) > self.max_size:
+                    self.entries.popitem(last=False)
+        return value
+
+    def authorize(self, user, cube_names):
+        """Returns the names of `cube_names` that `user` may access, in the
+        same order. The authorizer is asked once for all the cubes whose
+        authorization is not cached."""
+        authorizer = self._current_rights()
+        if authorizer is None:
+            return list(cube_names)
+
+        allowed = {}
+        missing = []
+        for name in cube_names:
+            entry = self._get(('authorize', user, name))
+            if entry is None:
+                missing.append(name)
+            else:
+                allowed[name] = entry[1]
+        if missing:
+            authorized = set(str(name) for name in authorizer.authorize(user, missing))
+            for name in missing:
+                allowed[name] = self._set(('authorize', user, name), name in authorized)
+        return [name for name in cube_names if allowed[name]]
+
+    def restriction(self, user, cube):
+        """Returns the cell restricting `cube` for `user`, or ``None`` if
+        the authorizer does not restrict it."""
+        authorizer = self._current_rights()
+        if authorizer is None:
+            return None
+
+        key = ('restriction', user, cube.name)
+        entry = self._get(key)
+        if entry is None:
+            return self._set(key, authorizer.restricted_cell(user, cube=cube, cell=None))
+        return entry[1]
+
+    def restricted_cell(self, user, cube, cell=None):
+        """Returns `cell` of `cube` restricted for `user`, as
+        `Authorizer.restricted_cell()`."""
+        if self.workspace.authorizer is None:
+            return cell
+        restriction = self.restriction(user, cube)
+        if restriction is None:
+            return cell
+        return cell & restriction if cell else restriction
+
+    def hierarchy_limits(self, user, cube_name):
+        """Returns the hierarchy limits of the cube `cube_name` for `user`,
+        or ``None`` if the workspace has no authorizer."""
+        authorizer = self._current_rights()
+        if authorizer is None:
+            return None
+
+        key = ('hierarchy_limits', user, cube_name)
+        entry = self._get(key)
+        if entry is None:
+            return self._set(key, authorizer.hierarchy_limits(user, cube_name))
+        return entry[1]
+
+
+def get_authorization_cache(workspace):
+    """Returns the `AuthorizationCache` of `workspace`."""
+    cache = getattr(workspace, 'authorization_cache', None)
+    if cache is None:
+        cache = workspace.authorization_cache = AuthorizationCache(workspace)
+    return cache
@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+
+__all__ = ['register_extensions']
+
+
+def register_extensions():
+    """Lets cubes import the ``django`` store and browser when a workspace
+    first uses them, instead of requiring `DjangoStore` and `DjangoBrowser`
+    to be imported beforehand."""
+    from cubes.extensions import _default_modules
+
+    _default_modules["store"].setdefault("django", "django_cubes.backends.django_orm.store")
+    _default_modules["browser"].setdefault("django", "django_cubes.backends.django_orm.browser")
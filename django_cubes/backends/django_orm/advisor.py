@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import re
+from collections import namedtuple, OrderedDict
+
+from django.db import connections
+from django.db.models.fields import FieldDoesNotExist
+from six.moves.urllib.parse import urlparse, parse_qs
+
+from cubes.logging import get_logger
+from cubes.browser import Cell, Drilldown, RangeCut, cuts_from_string
+from cubes.calendar import CalendarMemberConverter
+
+__all__ = ['IndexAdvisor', 'IndexProposal', 'QueryShape', 'shapes_from_urls']
+
+
+RE_CUBE_URL = re.compile(r'/cube/(?P<cube_name>[^/]+)/(?P<action>\w+)/')
+
+QueryShape = namedtuple('QueryShape', ['equality', 'ranges', 'drilldown'])
+IndexProposal = namedtuple('IndexProposal', ['table', 'columns', 'hits', 'sources'])
+
+
+def shapes_from_urls(workspace, cube, urls):
+    """Returns a list of `QueryShape` for every recorded slicer request URL in
+    `urls` that targets `cube`. A shape holds the lists of logical level keys
+    used by equality cuts (point and set), range cuts and drilldowns, each in
+    hierarchy-prefix order.
+
+    Requests for other cubes and requests that can not be parsed are skipped.
+    """
+    logger = get_logger()
+    converters = {
+        "time": CalendarMemberConverter(workspace.calendar)
+    }
+
+    shapes = []
+    for url in urls:
+        url = url.strip()
+        parsed = urlparse(url)
+        match = RE_CUBE_URL.search(parsed.path)
+        if not match or match.group('cube_name') != cube.name:
+            continue
+
+        params = parse_qs(parsed.query)
+        try:
+            cuts = []
+            for cut_string in params.get('cut', []):
+                cuts += cuts_from_string(cube, cut_string, role_member_converters=converters)
+            cell = Cell(cube, cuts)
+
+            drilldown = []
+            for ddstring in params.get('drilldown', []):
+                drilldown += ddstring.split('|')
+            drilldown = Drilldown(drilldown, cell)
+        except Exception as e:
+            logger.warn("skipping unparseable request %s: %s" % (url, e))
+            continue
+
+        equality, ranges = [], []
+        for cut in cell.cuts:
+            hier = cube.dimension(cut.dimension).hierarchy(cut.hierarchy)
+            keys = [level.key for level in hier[0:cut.level_depth()]]
+            if isinstance(cut, RangeCut):
+                ranges += keys
+            else:
+                equality += keys
+
+        grouped = []
+        for item in drilldown:
+            grouped += [level.key for level in item.levels]
+
+        shapes.append(QueryShape(equality, ranges, grouped))
+
+    return shapes
+
+
+class IndexAdvisor(object):
+    """Proposes composite indexes for the fact model of a django backed cube.
+
+    Candidate column lists are derived from the query shapes recorded for the
+    cube or, when there are none, from the hierarchies of its dimensions.
+    Columns are laid out in the order that lets one index serve the most
+    queries: equality cuts first (non-time dimensions before time-role
+    dimensions), then range cuts and finally the drilldown levels, each in
+    hierarchy-prefix order. Candidates that are a prefix of an existing index
+    or of another candidate are folded into it.
+    """
+
+    def __init__(self, browser, max_columns=4):
+        self.browser = browser
+        self.cube = browser.cube
+        self.model = browser.model
+        self.max_columns = max_columns
+        self.using = browser.db_for_read()
+        self.connection = connections[self.using]
+
+    def column(self, attribute):
+        """Returns the database column of the fact model for the logical
+        `attribute` or ``None`` when the attribute is not stored in the fact
+        table itself (e.g. a mapping that follows a relation)."""
+        field_name = self.browser.mapper.field_name(attribute)
+        if '__' in field_name:
+            return None
+        try:
+            return self.model._meta.get_field(field_name).column
+        except FieldDoesNotExist:
+            return None
+
+    def existing_indexes(self):
+        """Returns a list of column tuples of the indexes present in the
+        database for the fact table, including the primary key."""
+        introspection = self.connection.introspection
+        table = self.model._meta.db_table
+        cursor = self.connection.cursor()
+        try:
+            if not hasattr(introspection, 'get_constraints'):
+                # Django < 1.7 only knows single column indexes
+                return [(column, ) for column in introspection.get_indexes(cursor, table)]
+            constraints = introspection.get_constraints(cursor, table)
+        finally:
+            cursor.close()
+
+        return [
+            tuple(info['columns']) for info in constraints.values()
+            if info['columns'] and (info['index'] or info['primary_key'] or info['unique'])
+        ]
+
+    def _columns(self, attributes):
+        columns = []
+        for attribute in attributes:
+            column = self.column(attribute)
+            if column and column not in columns:
+                columns.append(column)
+        return columns
+
+    def model_shapes(self):
+        """Returns shapes for drilling down each hierarchy of the cube, time
+        hierarchies included. Used when no queries were recorded."""
+        shapes = []
+        for dim in self.cube.dimensions:
+            for hier in dim.hierarchies:
+                shapes.append(QueryShape([], [], [level.key for level in hier.levels]))
+        return shapes
+
+    def candidate(self, shape):
+        time_keys, other_keys = [], []
+        time_names = set(
+            level.key.ref() for dim in self.cube.dimensions if dim.role == 'time'
+            for level in dim.levels
+        )
+        for key in shape.equality:
+            (time_keys if key.ref() in time_names else other_keys).append(key)
+
+        columns = self._columns(other_keys + time_keys + shape.ranges + shape.drilldown)
+        return tuple(columns[:self.max_columns])
+
+    def propose(self, shapes=None):
+        """Returns a list of `IndexProposal` sorted by the number of recorded
+        queries served, most used first."""
+        if not shapes:
+            shapes = self.model_shapes()
+
+        counts = OrderedDict()
+        for shape in shapes:
+            columns = self.candidate(shape)
+            if columns:
+                counts[columns] = counts.get(columns, 0) + 1
+
+        existing = self.existing_indexes()
+        candidates = sorted(counts.keys(), key=len, reverse=True)
+        proposals = OrderedDict()
+
+        for columns in candidates:
+            if any(index[:len(columns)] == columns for index in existing):
+                continue
+
+            covering = [longer for longer in proposals if longer[:len(columns)] == columns]
+            if covering:
+                proposals[covering[0]]['hits'] += counts[columns]
+                proposals[covering[0]]['sources'].append(columns)
+            else:
+                proposals[columns] = {'hits': counts[columns], 'sources': [columns]}
+
+        table = self.model._meta.db_table
+        result = [
+            IndexProposal(table, columns, info['hits'], info['sources'])
+            for columns, info in proposals.items()
+        ]
+        return sorted(result, key=lambda proposal: proposal.hits, reverse=True)
+
+    def index_name(self, columns):
+        """Returns the name of the index of `columns`, shortened with a
+        digest of the columns to the maximum name length of the database."""
+        name = '%s_%s_cubes' % (self.model._meta.db_table, '_'.join(columns))
+        max_length = self.connection.ops.max_name_length()
+        if max_length and len(name) > max_length:
+            digest = hashlib.md5(name.encode('utf-8')).hexdigest()[:8]
+            name = '%s_%s' % (name[:max_length - 9], digest)
+        return name
+
+    def create_sql(self, proposal):
+        """Returns a ``CREATE INDEX`` statement for `proposal`."""
+        quote_name = self.connection.ops.quote_name
+        return 'CREATE INDEX %s ON %s (%s)' % (
+            quote_name(self.index_name(proposal.columns)),
+            quote_name(proposal.table),
+            ', '.join(quote_name(column) for column in proposal.columns),
+        )
+
+    def drop_sql(self, proposal):
+        """Returns a ``DROP INDEX`` statement reverting `create_sql()`."""
+        quote_name = self.connection.ops.quote_name
+        sql = 'DROP INDEX %s' % quote_name(self.index_name(proposal.columns))
+        if self.connection.vendor == 'mysql':
+            sql += ' ON %s' % quote_name(proposal.table)
+        return sql
@@ -1,32 +1,93 @@
 # -*- coding: utf-8 -*-
+import copy
+import itertools
+import time
+from contextlib import contextmanager
+from functools import partial
+from threading import local
+
+from django.db import connections
 from django.db.models import get_model
-from django.db.models import Count, Max, Min, Sum, Avg
+from django.db.models import Count, Max, Min, Sum, Avg, StdDev, Variance
 
+from cubes.errors import ArgumentError, NoSuchAttributeError
 from cubes.logging import get_logger
-from cubes.browser import AggregationBrowser, AggregationResult, Cell, Facts
+from cubes.browser import AggregationBrowser, AggregationResult, Cell, Drilldown, Facts
 from cubes.statutils import calculators_for_aggregates, available_calculators
 
+from . import functions  # NOQA, statistical aggregates on SQLite
+from .cost import CostEstimator
+from .databases import parse_aliases
 from .mapper import DjangoMapper
+from .partials import PartialAggregation, key_ranges, merge_sorted, row_key, run_parallel, sorts_nulls_last, top_rows
+from .partitions import parse_partitions, parse_shards, prune
+from .preaggregates import Preaggregate
+from .predicates import CutPlans
+from .rows import Rows
+from .sampling import Sampler
+from .sketches import HyperLogLog, TDigest, merge_sketches
+from .sqlcache import CompiledQuery, get_query_cache, lookup_field
+from .timeouts import current_deadline, statement_timeout
+from ...versions import data_version, track_data_version
 
 
 __all__ = ['DjangoBrowser', ]
 
 
+# Browser actions that can be given their own `<action>_timeout`
+TIMED_ACTIONS = ('aggregate', 'facts', 'report')
+
 _aggregate_functions = {
     'count': {
         'aggregate_fn': Count,
+        'merge': 'sum',
     },
     'sum': {
         'aggregate_fn': Sum,
+        'merge': 'sum',
     },
     'max': {
         'aggregate_fn': Max,
+        'merge': 'max',
     },
     'min': {
         'aggregate_fn': Min,
+        'merge': 'min',
     },
     'avg': {
         'aggregate_fn': Avg,
+        'merge': 'avg',
+    },
+    'count_distinct': {
+        'aggregate_fn': partial(Count, distinct=True),
+    },
+    # Sample standard deviation and variance, like the SQL stddev() and
+    # variance() of PostgreSQL
+    'stddev': {
+        'aggregate_fn': partial(StdDev, sample=True),
+    },
+    'stddev_samp': {
+        'aggregate_fn': partial(StdDev, sample=True),
+    },
+    'stddev_pop': {
+        'aggregate_fn': partial(StdDev, sample=False),
+    },
+    'variance': {
+        'aggregate_fn': partial(Variance, sample=True),
+    },
+    'var_samp': {
+        'aggregate_fn': partial(Variance, sample=True),
+    },
+    'var_pop': {
+        'aggregate_fn': partial(Variance, sample=False),
+    },
+    # Estimated from mergeable sketches of the measure values, see
+    # `sketches` and `preaggregates`
+    'approx_count_distinct': {
+        'sketch': HyperLogLog,
+    },
+    'approx_percentile': {
+        'sketch': TDigest,
     },
 }
 
@@ -59,6 +120,46 @@ class DjangoBrowser(AggregationBrowser):
         {
             "name": "safe_labels",
             "type": "bool"
+        },
+        {
+            "name": "timeout",
+            "type": "float"
+        },
+        {
+            "name": "aggregate_timeout",
+            "type": "float"
+        },
+        {
+            "name": "facts_timeout",
+            "type": "float"
+        },
+        {
+            "name": "report_timeout",
+            "type": "float"
+        },
+        {
+            "name": "parallel",
+            "type": "int"
+        },
+        {
+            "name": "partition_column",
+            "type": "string"
+        },
+        {
+            "name": "database",
+            "type": "string"
+        },
+        {
+            "name": "replicas",
+            "type": "string"
+        },
+        {
+            "name": "replica_selection",
+            "type": "string"
+        },
+        {
+            "name": "primary_after_write",
+            "type": "float"
         }
     ]
 
@@ -84,9 +185,59 @@ class DjangoBrowser(AggregationBrowser):
         # Whether to ignore cells where at least one aggregate is NULL
         self.exclude_null_agregates = options.get("exclude_null_agregates", True)
 
+        # Seconds after which queries are cancelled, per action
+        self.timeout = options.get("timeout")
+        self.timeouts = dict(
+            (action, options.get("%s_timeout" % action, self.timeout))
+            for action in TIMED_ACTIONS
+        )
+
         self.mapper = DjangoMapper(self.cube, self.class_name, self.locale)
+        # Lookups filtering the cuts of each dimension, hierarchy and depth
+        self.cut_plans = CutPlans(self.cube, self.mapper)
+
+        # Models of the facts partitioned by ranges of an attribute, the
+        # first one stands for the cube model, see `partitions`
+        self.partitions = parse_partitions(self, options.get("partitions"))
+        if not self.class_name and self.partitions:
+            self.class_name = self.mapper.class_name = self.partitions[0].class_name
         self.model = get_model(*self.class_name.split('.'))
 
+        # Shards are partitions of the cube model on several databases
+        shards = parse_shards(self, options.get("shards"))
+        if shards and self.partitions:
+            raise ArgumentError("Cube '%s' can not have both partitions and shards" % self.cube.name)
+        self.partitions = self.partitions or shards
+
+        # Database aliases of the queries, see `databases`
+        self.databases = store.database_selector(
+            options.get("database"), parse_aliases(options.get("replicas")),
+            options.get("replica_selection"), options.get("primary_after_write")
+        )
+        self._reads = local()
+
+        # Writes through the ORM bump the data version of the models, see
+        # `data_version()`
+        for model in self.data_models():
+            track_data_version(model)
+
+        # Number of ranges of the `partition_field` aggregated concurrently,
+        # see `parallel_aggregation()`
+        self.parallel = options.get("parallel") or 1
+        self.partition_field = 'pk'
+        if options.get("partition_column"):
+            try:
+                attribute = self.cube.attribute(options["partition_column"])
+                self.partition_field = self.mapper.field_name(attribute)
+            except NoSuchAttributeError:
+                self.partition_field = options["partition_column"]
+
+        # Tables of sketches used by the approximate aggregates
+        self.preaggregates = [
+            Preaggregate(self, item['class_name'], item['attributes'])
+            for item in options.get("preaggregates") or []
+        ]
+
     def features(self):
         """
         Return SQL features. Currently they are all the same for every
@@ -97,7 +248,10 @@ class DjangoBrowser(AggregationBrowser):
         return {
             "actions": ["aggregate", "facts", "cell"],
             "aggregate_functions": sorted(available_aggregate_functions()),
-            "post_aggregate_functions": sorted(available_calculators())
+            "post_aggregate_functions": sorted(available_calculators()),
+            # Samples are not merged across partitions
+            "sampling": not self.partitions,
+            "aggregate_parts": True
         }
 
     def is_builtin_function(self, function_name, aggregate):
@@ -108,48 +262,308 @@ class DjangoBrowser(AggregationBrowser):
         """
         return function_name in available_aggregate_functions()
 
+    def data_models(self):
+        """Returns the models holding the facts of the cube."""
+        models = [self.model]
+        for partition in self.partitions:
+            if partition.model not in models:
+                models.append(partition.model)
+        return models
+
+    def data_version(self):
+        """Returns the (`version`, `timestamp`) tuple of the data of the
+        cube, from the data versions of its models. The timestamp is the
+        time of the last write, ``None`` if it is not known, and the version
+        is ``None`` if the version of a model is not known."""
+        versions = [data_version(model) for model in self.data_models()]
+        if any(version is None for version, timestamp in versions):
+            return None, None
+        timestamps = [timestamp for version, timestamp in versions if timestamp is not None]
+        version = ','.join('%s@%r' % item for item in versions)
+        return version, max(timestamps) if timestamps else None
+
+    def db_for_read(self):
+        """Returns the alias of the database read by the queries of the
+        browser, the one chosen for the current `reading()` if any. Outside
+        of `reading()` the turns of the replicas are not taken."""
+        alias = getattr(self._reads, 'aliases', {}).get((self.model, self.databases))
+        return alias or self.databases.choose(self.model, advance=False)
+
+    @contextmanager
+    def reading(self):
+        """Context manager running the queries of the current thread on the
+        same database, chosen by the database selector of the browser."""
+        aliases = self._reads.__dict__.setdefault('aliases', {})
+        key = (self.model, self.databases)
+        if key in aliases:
+            yield aliases[key]
+            return
+
+        alias = aliases[key] = self.databases.choose(self.model)
+        try:
+            with self.databases.reading(alias):
+                yield alias
+        finally:
+            del aliases[key]
+
+    def query_deadline(self, action):
+        """Returns the time the queries of `action` started now must be done
+        by, within the current `statement_timeout()` block if any, or
+        ``None`` if they are not limited. It is passed to the workers running
+        parts of the queries on other threads."""
+        timeout = self.timeouts.get(action)
+        limits = [current_deadline(), time.time() + timeout if timeout else None]
+        limits = [limit for limit in limits if limit is not None]
+        return min(limits) if limits else None
+
+    @contextmanager
+    def statement_timeout(self, action, deadline=None):
+        """Returns a context manager reading one database and cancelling the
+        queries of `action` that run past its timeout, or past `deadline`,
+        with `QueryTimeoutError`."""
+        with self.reading() as alias:
+            with statement_timeout(connections[alias], self.timeouts.get(action), deadline):
+                yield
+
+    def aggregate(self, *args, **kwargs):
+        with self.statement_timeout('aggregate'):
+            return super(DjangoBrowser, self).aggregate(*args, **kwargs)
+
+    def report(self, cell, queries):
+        # Queries of the report are also bound by their own action timeouts
+        with self.statement_timeout('report'):
+            return super(DjangoBrowser, self).report(cell, queries)
+
+    def cell_filters(self, cell):
+        """Returns the list of (`lookup`, `values`) tuples filtering the facts
+        of `cell`, sorted by lookup."""
+        return self.cut_plans.filters(cell)
+
     def _build_cell_cut_qset(self, cell):
-        filter_kwargs = {}
-        for cut in cell.cuts:
-            path = cut.path
-            depth = cut.level_depth()
-            dim = self.cube.dimension(cut.dimension)
-            hier = dim.hierarchy(cut.hierarchy)
-            keys = [level.key for level in hier[0:depth]]
-            for key in keys:
-                filter_kwargs[u'%s__in' % key.name] = path
-
-        return self.model.objects.filter(**filter_kwargs)
+        qset = self.model.objects.using(self.db_for_read())
+        # One lookup at a time, in a fixed order, so that the SQL parameters
+        # follow the order of `cell_filters()`
+        for lookup, values in self.cell_filters(cell):
+            qset = qset.filter(**{lookup: values})
+        return qset
+
+    def run_compiled(self, shape, cell, compile_query):
+        """Returns the rows of the query of `shape` filtering `cell`, running
+        the SQL cached for the shape with the values of the cell filters.
+
+        On cache misses `compile_query()` returns the `CompiledQuery` of the
+        shape, or ``None`` if the query has to be run by the ORM, in which case
+        ``None`` is returned. See `django_cubes.backends.django_orm.sqlcache`.
+        """
+        cache = get_query_cache()
+        if not cache.max_size:
+            return None
+
+        using = self.db_for_read()
+        connection = connections[using]
+        filters = self.cell_filters(cell)
+        key = (using, self.model._meta.db_table, shape, tuple((lookup, len(values)) for lookup, values in filters))
+
+        params = []
+        for lookup, values in filters:
+            params += lookup_field(self.model, lookup).get_db_prep_lookup('in', values, connection)
+
+        compiled = cache.get(key)
+        if compiled is None:
+            compiled = compile_query()
+            if compiled is None:
+                return None
+            if compiled.params == params:
+                cache.set(key, compiled)
+            else:
+                # The ORM changed the values, keep compiling this shape
+                params = compiled.params
+
+        return compiled.execute(connection, params)
+
+    def _page_bounds(self, page, page_size):
+        """Returns start and end offsets of the 1-based `page`."""
+        start = max(page - 1, 0) * page_size
+        return start, start + page_size
 
     def build_query(self, cell, attributes, page=None, page_size=None, order=None, include_fact_key=False):
+        """Returns a queryset of the facts of `cell` as tuples of the
+        `attributes` values, preceded by the fact key with
+        `include_fact_key`."""
         qset = self._build_cell_cut_qset(cell)
         if order:
-            order_fields = [item[0].name for item in order]
+            order_fields = [self.mapper.field_name(item[0]) for item in order]
             qset = qset.order_by(*order_fields)
         if page and page_size:
-            start = (page - 1) * page_size
-            end = start + page_size
+            start, end = self._page_bounds(page, page_size)
             qset = qset[start:end]
-        return qset.values()
-
-    def build_aggregation(self, cell, aggregates, drilldown, summary_only=False):
-        args, kwargs = [], {}
-        qset = self._build_cell_cut_qset(cell)
 
+        fields = [self.mapper.field_name(attribute) for attribute in attributes]
+        if include_fact_key:
+            fields.insert(0, self.model._meta.pk.name)
+        return qset.values_list(*fields)
+
+    def aggregate_fields(self, aggregates):
+        """Returns (`name`, `function`, `field`) tuples of the `aggregates`."""
+        return [
+            (item.name, item.function, self.mapper.field_name(self.cube.measure(item.measure)) if item.measure else 'pk')
+            for item in aggregates
+        ]
+
+    def split_aggregates(self, aggregates):
+        """Returns the list of the `aggregates` computed by the database and
+        the list of those estimated from sketches."""
+        built_in, sketched = [], []
         for item in aggregates:
-            measure = item.measure if item.measure else 'pk'
-            function = _aggregate_functions[item.function]['aggregate_fn']
-            kwargs[item.name] = function(measure)
-
-        if summary_only:
-            result = qset.aggregate(*args, **kwargs)
+            if 'sketch' in _aggregate_functions.get(item.function, {}):
+                sketched.append(item)
+            else:
+                built_in.append(item)
+        return built_in, sketched
+
+    def sketch_specs(self, aggregates):
+        """Returns the distinct (`field`, `sketch_class`) tuples of the
+        sketches needed by the sketch `aggregates`."""
+        specs = []
+        for name, function, field in self.aggregate_fields(aggregates):
+            sketch_class = _aggregate_functions.get(function, {}).get('sketch')
+            if sketch_class and (field, sketch_class) not in specs:
+                specs.append((field, sketch_class))
+        return specs
+
+    def fact_sketches(self, cell, fields, specs):
+        """Returns dictionaries of the sketches of `specs` by the tuple of the
+        `fields` values, built reading the facts of `cell` once. The sketches
+        of partitioned cubes are built for each partition and merged."""
+        if self.partitions:
+            def partition_sketches(partition):
+                return self.partition_browser(partition).fact_sketches(cell, fields, specs)
+
+            partitions = self.cell_partitions(cell)
+            return merge_sketches(run_parallel(partition_sketches, partitions, self.db_for_read(), len(partitions)))
+
+        measures = sorted(set(field for field, sketch_class in specs))
+        width = len(fields)
+        positions = [(spec, width + measures.index(spec[0])) for spec in specs]
+
+        sketches = {}
+        qset = self._build_cell_cut_qset(cell).values_list(*(list(fields) + measures))
+        for row in qset.iterator():
+            key = row[:width]
+            cell_sketches = sketches.get(key)
+            if cell_sketches is None:
+                cell_sketches = sketches[key] = dict((spec, spec[1]()) for spec in specs)
+            for spec, position in positions:
+                cell_sketches[spec].add(row[position])
+        return sketches
+
+    def sketch_preaggregate(self, cell, aggregates, fields):
+        """Returns the first pre-aggregate having the `fields` and the fields
+        of the filters of `cell`, or ``None``. The facts of several partitions
+        are not read to estimate the sketch `aggregates`: `ArgumentError` is
+        raised instead when a partitioned cube has no such pre-aggregate."""
+        needed = list(fields) + [lookup.rsplit('__', 1)[0] for lookup, values in self.cell_filters(cell)]
+        for preaggregate in self.preaggregates:
+            if preaggregate.covers(needed):
+                return preaggregate
+        if self.partitions:
+            raise ArgumentError(
+                "Aggregates %s of cube '%s' can be estimated across partitions only from a pre-aggregate "
+                "by %s" % (', '.join(item.name for item in aggregates), self.cube.name, ', '.join(needed))
+            )
+        return None
+
+    def sketch_keys(self, drilldown):
+        """Returns the fields of the level keys of `drilldown`, telling apart
+        the cells of the sketch aggregates."""
+        return [self.mapper.field_name(level.key) for item in drilldown or [] for level in item.levels]
+
+    def sketch_rows(self, cell, aggregates, drilldown, fields, rows):
+        """Returns `rows`, tuples of the values of the drilldown `fields`
+        first, followed by the values of the sketch `aggregates`."""
+        keys = self.sketch_keys(drilldown)
+        positions = [fields.index(key) for key in keys]
+        values = self.sketch_aggregation(cell, aggregates, keys)
+        missing = dict.fromkeys(item.name for item in aggregates)
+        return [
+            row + tuple(
+                values.get(tuple(row[position] for position in positions), missing)[item.name]
+                for item in aggregates
+            )
+            for row in rows
+        ]
+
+    def sketch_aggregation(self, cell, aggregates, fields):
+        """Returns dictionaries of the values of the sketch `aggregates` by
+        the tuple of the `fields` values. Sketches are merged from a
+        pre-aggregate, see `sketch_preaggregate()`, or else built from the
+        facts."""
+        specs = self.sketch_specs(aggregates)
+        preaggregate = self.sketch_preaggregate(cell, aggregates, fields)
+        if preaggregate is not None:
+            self.logger.debug("merging sketches of %r" % preaggregate)
+            sketches = preaggregate.sketches(self.cell_filters(cell), fields, specs)
         else:
-            args = [item.name for item in drilldown.all_attributes()]
-            result = qset.values(*args).annotate(**kwargs).order_by(*args)
+            sketches = self.fact_sketches(cell, fields, specs)
+
+        values = {}
+        for key, cell_sketches in sketches.items():
+            values[key] = {}
+            for aggregate, (name, function, field) in zip(aggregates, self.aggregate_fields(aggregates)):
+                sketch = cell_sketches.get((field, _aggregate_functions[function]['sketch']))
+                values[key][name] = sketch.value(aggregate) if sketch is not None else None
+        return values
+
+    def build_aggregation(self, cell, aggregates, drilldown, summary_only=False, sampler=None):
+        """Returns the summary dictionary or, with a drilldown, a queryset of
+        the cells as tuples of the drilldown attributes followed by the
+        aggregates computed by the database. With a `sampler` the queryset is
+        restricted to the sample and followed by the aggregates needed by its
+        estimates, see `Sampler.moments()`."""
+        aggregates, sketched = self.split_aggregates(aggregates)
+        fields = self.aggregate_fields(aggregates)
+        expressions = [
+            (name, _aggregate_functions[function]['aggregate_fn'](field))
+            for name, function, field in fields
+        ]
+        if sampler is not None:
+            expressions += sampler.moments(fields)
 
-        return result
-
-    def provide_aggregate(self, cell, aggregates, drilldown, split, order, page, page_size, **options):
+        if summary_only:
+            summary = {}
+            if sampler is not None:
+                if expressions:
+                    values = sampler.summary(sampler.filter(self._build_cell_cut_qset(cell)), expressions)
+                    names = [name for name, function, field in fields] + sampler.interval_names(fields)
+                    summary = dict(zip(names, sampler.estimate(values, fields)))
+            elif expressions:
+                row = self.run_compiled(
+                    ('summary', tuple(self.aggregate_fields(aggregates))), cell,
+                    lambda: CompiledQuery.summary(self._build_cell_cut_qset(cell), expressions)
+                )
+                if row is None:
+                    summary = self._build_cell_cut_qset(cell).aggregate(**dict(expressions))
+                else:
+                    summary = dict(zip([name for name, expression in expressions], row[0]))
+            if sketched:
+                values = self.sketch_aggregation(cell, sketched, [])
+                summary.update(values.get((), dict.fromkeys(item.name for item in sketched)))
+            return summary
+
+        args = [self.mapper.field_name(item) for item in drilldown.all_attributes()]
+        result = self._build_cell_cut_qset(cell)
+        if sampler is not None:
+            result = sampler.filter(result)
+        result = result.values_list(*args)
+        # One annotation at a time keeps the columns in the aggregates order
+        for name, expression in expressions:
+            result = result.annotate(**{name: expression})
+        if not expressions:
+            result = result.distinct()
+        return result.order_by(*args)
+
+    def provide_aggregate(self, cell, aggregates, drilldown, split, order, page, page_size, sample=None,
+                          **options):
         """
         Return aggregated result.
 
@@ -176,9 +590,23 @@ class DjangoBrowser(AggregationBrowser):
             be ``None``.
         * `include_summary`: if ``True`` (default) then summary is computed,
             otherwise it will be ``None``
+        * `sample`: fraction of the facts to aggregate. Counts and sums are
+            scaled and the summary and cells get the bounds of the estimates,
+            see `django_cubes.backends.django_orm.sampling`. The result gets a
+            `sample` dictionary describing the sample. The total cell count
+            is the number of cells of the sample, it is not scaled.
 
         Result is paginated by `page_size` and ordered by `order`.
 
+        With the `parallel` browser option and aggregates that can be merged
+        from parts, the facts are aggregated in ranges of the
+        `partition_column`, the primary key by default, on concurrent
+        connections. See `parallel_aggregation()`.
+
+        The facts of partitioned or sharded cubes are aggregated in the
+        partitions that may hold facts of the cell only, and the merged cells
+        are sorted by `order`. See `partitioned_aggregation()`.
+
         Number of database queries:
 
         * without drill-down: 1 – summary
@@ -189,11 +617,40 @@ class DjangoBrowser(AggregationBrowser):
 
         * measures can be only in the fact table
         """
+        partial_aggregation = None
+        if self.partitions:
+            partitions = self.cell_partitions(cell)
+            if len(partitions) == 1:
+                return self.partition_browser(partitions[0]).provide_aggregate(
+                    cell, aggregates, drilldown, split, order, page, page_size, sample=sample, **options
+                )
+            partial_aggregation = self.partitioned_aggregation(cell, aggregates, drilldown, split, sample, partitions)
+        elif self.parallel > 1 and sample is None and not split:
+            partial_aggregation = self.parallel_aggregation(
+                cell, [item for item in aggregates if item.function in _aggregate_functions], drilldown
+            )
+        if partial_aggregation is not None:
+            if drilldown and not (page_size and page is not None):
+                self.assert_low_cardinality(cell, drilldown)
+            result = self.partial_result(
+                cell, aggregates, drilldown, partial_aggregation, page, page_size, order,
+                self.split_aggregates(aggregates)[1]
+            )
+            if result.cells is not None and self.exclude_null_agregates:
+                afuncs = available_aggregate_functions()
+                result.exclude_if_null = [str(agg) for agg in aggregates if not agg.function or agg.function in afuncs]
+            return result
+
         result = AggregationResult(cell=cell, aggregates=aggregates)
 
+        sampler = None
+        if sample is not None:
+            sampler = Sampler(self, sample, self.db_for_read())
+            result.sample = sampler.to_dict()
+
         ## Summary
         ## -------
-        result.summary = self.build_aggregation(cell, aggregates, drilldown, summary_only=True)
+        result.summary = self.build_aggregation(cell, aggregates, drilldown, summary_only=True, sampler=sampler)
 
         # Drill-down
         # ----------
@@ -212,13 +669,58 @@ class DjangoBrowser(AggregationBrowser):
                 self.cube, aggregates, drilldown, split, available_aggregate_functions()
             )
 
-            query = self.build_aggregation(cell, aggregates, drilldown)
-            result.cells = self.result_iterator(query)
-            if result.cells:
-                result.labels = result.cells[0].keys()
-
-            if self.include_cell_count:
-                result.total_cell_count = query.count()
+            bounds = None
+            if page_size and page is not None:
+                bounds = self._page_bounds(page, page_size)
+
+            # The queryset is only built when its SQL is not cached
+            queries = {}
+
+            def query():
+                if 'query' not in queries:
+                    queries['query'] = self.build_aggregation(cell, aggregates, drilldown, sampler=sampler)
+                return queries['query']
+
+            def page_query():
+                return query()[bounds[0]:bounds[1]] if bounds else query()
+
+            fields = [self.mapper.field_name(item) for item in drilldown.all_attributes()]
+            built_in, sketched = self.split_aggregates(aggregates)
+            aggregate_fields = self.aggregate_fields(built_in)
+            shape = (tuple(fields), tuple(aggregate_fields))
+
+            if sampler is not None:
+                # Sampled queries are not cached, their estimates follow the
+                # drilldown attributes
+                width = len(fields)
+                names = [name for name, function, field in aggregate_fields]
+                names += [name for name, expression in sampler.moments(aggregate_fields)]
+                rows = [
+                    row[:width] + tuple(sampler.estimate(dict(zip(names, row[width:])), aggregate_fields))
+                    for row in sampler.rows(page_query())
+                ]
+            else:
+                rows = self.run_compiled(('drilldown', shape, bounds), cell, lambda: CompiledQuery.rows(page_query()))
+                if rows is None:
+                    rows = list(page_query())
+
+            # Sketch aggregates follow the aggregates computed by the database
+            if sketched:
+                rows = self.sketch_rows(cell, sketched, drilldown, fields, rows)
+
+            reverse_mappings = self.mapper.reverse_mappings
+            result.labels = [reverse_mappings.get(field, field) for field in fields]
+            result.labels += [item.name for item in built_in]
+            if sampler is not None:
+                result.labels += sampler.interval_names(aggregate_fields)
+            result.labels += [item.name for item in sketched]
+            result.cells = Rows(result.labels, rows)
+
+            if self.include_cell_count and sampler is not None:
+                result.total_cell_count = sampler.count(query())
+            elif self.include_cell_count:
+                count = self.run_compiled(('count', shape), cell, lambda: CompiledQuery.count(query()))
+                result.total_cell_count = query().count() if count is None else count[0][0]
 
         elif result.summary is not None:
             # Do calculated measures on summary if no drilldown or split
@@ -240,10 +742,193 @@ class DjangoBrowser(AggregationBrowser):
 
         return result
 
+    def part_rows(self, cell, fields, partial_aggregation, lookup):
+        """Returns the rows of the `fields` values followed by the values of
+        the expressions of `partial_aggregation`, for the facts of `cell`
+        matching the `lookup` filter keywords."""
+        qset = self._build_cell_cut_qset(cell).filter(**lookup)
+        expressions = partial_aggregation.expressions()
+        if not fields:
+            values = qset.aggregate(**dict(expressions))
+            return [tuple(values[name] for name, expression in expressions)]
+
+        qset = qset.values_list(*fields)
+        for name, expression in expressions:
+            qset = qset.annotate(**{name: expression})
+        return list(qset.order_by())
+
+    def partial_result(self, cell, aggregates, drilldown, partial_aggregation, page=None, page_size=None,
+                       order=None, sketched=None):
+        """Returns the `AggregationResult` of the aggregates merged by
+        `partial_aggregation` so far, followed by the `sketched` aggregates.
+        The cells are sorted by the drilldown attributes, or by `order`,
+        keeping the top ones up to the end of the page."""
+        result = AggregationResult(cell=cell, aggregates=aggregates)
+        result.summary = partial_aggregation.summary()
+        if sketched:
+            values = self.sketch_aggregation(cell, sketched, [])
+            result.summary.update(values.get((), dict.fromkeys(item.name for item in sketched)))
+        calculators = calculators_for_aggregates(
+            self.cube, aggregates, drilldown, None, available_aggregate_functions()
+        )
+        if not drilldown:
+            for calc in calculators:
+                calc(result.summary)
+            return result
+
+        result.levels = drilldown.result_levels()
+        result.calculators = calculators
+        reverse_mappings = self.mapper.reverse_mappings
+        fields = [self.mapper.field_name(item) for item in drilldown.all_attributes()]
+        result.labels = [reverse_mappings.get(field, field) for field in fields]
+        result.labels += [name for name, function, field in partial_aggregation.fields]
+
+        rows = partial_aggregation.rows()
+        result.total_cell_count = len(rows)
+        start, end = self._page_bounds(page, page_size) if page_size and page is not None else (0, None)
+        columns = [
+            (result.labels.index(attribute.ref()), direction == 'desc')
+            for attribute, direction in order or [] if attribute.ref() in result.labels
+        ]
+        if columns:
+            rows = top_rows(rows, columns, end)
+        rows = rows[start:end]
+        if sketched:
+            rows = self.sketch_rows(cell, sketched, drilldown, fields, rows)
+            result.labels += [item.name for item in sketched]
+        result.cells = Rows(result.labels, rows)
+        return result
+
+    def parallel_aggregation(self, cell, aggregates, drilldown):
+        """Returns the `PartialAggregation` of the `aggregates` of `cell` by
+        `drilldown`, aggregating `parallel` ranges of the `partition_field`
+        concurrently, or ``None`` if the aggregates can not be merged from
+        parts or the `partition_field` can not be split in ranges. The ranges
+        are given the time left to the aggregation."""
+        try:
+            partial_aggregation = PartialAggregation(self.aggregate_fields(aggregates), _aggregate_functions)
+        except ArgumentError:
+            return None
+        fields = [self.mapper.field_name(item) for item in drilldown.all_attributes()]
+        deadline = self.query_deadline('aggregate')
+
+        def aggregate_range(lookup):
+            with self.statement_timeout('aggregate', deadline):
+                return self.part_rows(cell, fields, partial_aggregation, lookup)
+
+        with self.statement_timeout('aggregate', deadline):
+            try:
+                ranges = key_ranges(self._build_cell_cut_qset(cell), self.parallel, self.partition_field)
+            except ArgumentError as error:
+                self.logger.warn("aggregating in a single query: %s" % error)
+                return None
+        for rows in run_parallel(aggregate_range, ranges, self.db_for_read(), self.parallel):
+            partial_aggregation.add(rows, len(fields))
+        return partial_aggregation
+
+    def partition_browser(self, partition):
+        """Returns a copy of the browser querying the model of
+        `partition`."""
+        browser = copy.copy(self)
+        browser.class_name = partition.class_name
+        browser.model = partition.model
+        browser.partitions = []
+        if partition.database:
+            browser.databases = self.store.database_selector(partition.database)
+        return browser
+
+    def cell_partitions(self, cell):
+        """Returns the partitions that may hold facts of `cell`, pruned by the
+        cuts of the cell, see `django_cubes.backends.django_orm.partitions`."""
+        partitions = prune(self.partitions, self.cell_filters(cell))
+        self.logger.debug("querying %d of %d partitions" % (len(partitions), len(self.partitions)))
+        return partitions
+
+    def partitioned_aggregation(self, cell, aggregates, drilldown, split, sample, partitions):
+        """Returns the `PartialAggregation` of the `aggregates` of `cell` by
+        `drilldown` merged from each of `partitions`, aggregated concurrently.
+        The aggregates must be mergeable, and splits and samples are not
+        supported across partitions. Sketch aggregates are left to
+        `partial_result()`, which merges them from a pre-aggregate."""
+        if split or sample is not None:
+            raise ArgumentError(
+                "Cube '%s' can not be split or sampled across partitions, cut it to a single one" % self.cube.name
+            )
+        built_in, sketched = self.split_aggregates(aggregates)
+        if sketched:
+            # Fails before the partitions are read
+            self.sketch_preaggregate(cell, sketched, self.sketch_keys(drilldown))
+        built_in = [item for item in built_in if item.function in _aggregate_functions]
+        partial_aggregation = PartialAggregation(self.aggregate_fields(built_in), _aggregate_functions)
+        fields = [self.mapper.field_name(item) for item in drilldown.all_attributes()]
+        deadline = self.query_deadline('aggregate')
+
+        def aggregate_partition(partition):
+            browser = self.partition_browser(partition)
+            with browser.statement_timeout('aggregate', deadline):
+                return browser.part_rows(cell, fields, partial_aggregation, {})
+
+        for rows in run_parallel(aggregate_partition, partitions, self.db_for_read(), len(partitions)):
+            partial_aggregation.add(rows, len(fields))
+        return partial_aggregation
+
+    def aggregate_parts(self, cell=None, aggregates=None, drilldown=None, page=None, page_size=None, parts=10):
+        """Aggregates the facts of `cell` in at most `parts` ranges of their
+        keys, one range after the other.
+
+        Returns an iterator of the `AggregationResult` of the ranges aggregated
+        so far, after each range, with a `progress` tuple of the numbers of
+        aggregated ranges and of all the ranges. Stopping the iteration stops
+        the aggregation. Only aggregates with a ``merge`` function can be
+        aggregated in parts, see `django_cubes.backends.django_orm.partials`.
+        The parts of partitioned cubes are shared among the partitions of the
+        cell.
+        """
+        cell = cell or Cell(self.cube)
+        aggregates = self.prepare_aggregates(aggregates)
+        drilldown = Drilldown(drilldown, cell)
+
+        built_in = [item for item in aggregates if item.function in _aggregate_functions]
+        partial_aggregation = PartialAggregation(self.aggregate_fields(built_in), _aggregate_functions)
+        fields = [self.mapper.field_name(item) for item in drilldown.all_attributes()]
+
+        if self.partitions:
+            browsers = [self.partition_browser(partition) for partition in self.cell_partitions(cell)]
+        else:
+            browsers = [self]
+        ranges = []
+        # Cells outside of every partition have no ranges, and an empty result
+        browser_parts = max(parts // len(browsers), 1) if browsers else 0
+        for browser in browsers:
+            with browser.statement_timeout('aggregate'):
+                qset = browser._build_cell_cut_qset(cell)
+                ranges += [(browser, lookup) for lookup in key_ranges(qset, browser_parts, self.partition_field)]
+
+        def results():
+            for index, (browser, lookup) in enumerate(ranges):
+                with browser.statement_timeout('aggregate'):
+                    partial_aggregation.add(browser.part_rows(cell, fields, partial_aggregation, lookup), len(fields))
+                result = self.partial_result(cell, aggregates, drilldown, partial_aggregation, page, page_size)
+                result.progress = (index + 1, len(ranges))
+                yield result
+            if not ranges:
+                result = self.partial_result(cell, aggregates, drilldown, partial_aggregation, page, page_size)
+                result.progress = (0, 0)
+                yield result
+
+        return results()
+
+    def estimate_cost(self, cell, drilldown=None):
+        """Returns a `QueryCost` with the estimated number of fact rows scanned
+        and of cells returned when aggregating `cell` by `drilldown`, a
+        `Drilldown` object. No aggregation is run, see `CostEstimator`."""
+        return CostEstimator(self).estimate(cell, drilldown)
+
     def facts(self, cell=None, fields=None, order=None, page=None, page_size=None):
         """
         Return an iterable object with of all facts within cell.
-        `fields` is list of fields to be considered in the output.
+        `fields` is list of fields to be considered in the output. The facts
+        are `Rows` of the fact key and the `fields`.
 
         Subclasses overriding this method sould return a :class:`Facts` object
         and set it's `attributes` to the list of selected attributes.
@@ -251,22 +936,68 @@ class DjangoBrowser(AggregationBrowser):
 
         ## Da documentação:
         cell = cell or Cell(self.cube)
+        if self.partitions:
+            partitions = self.cell_partitions(cell)
+            if len(partitions) == 1:
+                return self.partition_browser(partitions[0]).facts(cell, fields, order, page, page_size)
+            return self.partitioned_facts(cell, fields, order, page, page_size, partitions)
+
         attributes = self.cube.get_attributes(fields)
         order = self.prepare_order(order, is_aggregate=False)
 
-        facts = self.result_iterator(
-            self.build_query(
-                cell, attributes, page=page, page_size=page_size, order=order
+        def query():
+            return self.build_query(
+                cell, attributes, page=page, page_size=page_size, order=order, include_fact_key=True
             )
+
+        shape = (
+            'facts',
+            tuple(self.mapper.field_name(attribute) for attribute in attributes),
+            tuple((self.mapper.field_name(item[0]), item[1]) for item in order or []),
+            self._page_bounds(page, page_size) if page and page_size else None
         )
-        return Facts(facts, attributes)
-
-    def result_iterator(self, cells):
-        result = []
-        for cell in cells:
-            new_cell = dict(
-                (self.mapper.reverse_mappings.get(k, k), v)
-                for k, v in cell.items()
-            )
-            result.append(new_cell)
-        return result
+        with self.statement_timeout('facts'):
+            rows = self.run_compiled(shape, cell, lambda: CompiledQuery.rows(query()))
+            if rows is None:
+                rows = list(query())
+
+        header = [self.model._meta.pk.name] + [attribute.ref() for attribute in attributes]
+        return Facts(Rows(header, rows), attributes)
+
+    def partitioned_facts(self, cell, fields, order, page, page_size, partitions):
+        """Returns the `Facts` of `cell` read concurrently from each of
+        `partitions`, sorted by `order`, then merged in that order and
+        paginated. Each partition reads at most the rows up to the end of the
+        page."""
+        attributes = self.cube.get_attributes(fields)
+        order = self.prepare_order(order, is_aggregate=False)
+        start, end = self._page_bounds(page, page_size) if page and page_size else (0, None)
+
+        order_fields = [self.mapper.field_name(item[0]) for item in order or []]
+        columns = [self.model._meta.pk.name] + [self.mapper.field_name(attribute) for attribute in attributes]
+
+        deadline = self.query_deadline('facts')
+
+        def read_partition(partition):
+            browser = self.partition_browser(partition)
+            with browser.statement_timeout('facts', deadline):
+                qset = browser._build_cell_cut_qset(cell)
+                if order_fields:
+                    qset = qset.order_by(*order_fields)
+                if end:
+                    qset = qset[:end]
+                return list(qset.values_list(*(columns + order_fields)))
+
+        parts = run_parallel(read_partition, partitions, self.db_for_read(), len(partitions))
+        width = len(columns)
+        if order_fields:
+            # Merged in the order of the database, NULL included
+            nulls_last = sorts_nulls_last(connections[self.partition_browser(partitions[0]).db_for_read()])
+            key = row_key([(width + index, False) for index in range(len(order_fields))], nulls_last)
+            rows = merge_sorted(parts, key)
+        else:
+            rows = itertools.chain(*parts)
+        rows = list(itertools.islice(rows, start, end))
+
+        header = [self.model._meta.pk.name] + [attribute.ref() for attribute in attributes]
+        return Facts(Rows(header, [row[:width] for row in rows]), attributes)
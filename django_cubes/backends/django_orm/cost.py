@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, DatabaseError
+
+from cubes.browser import PointCut, SetCut
+
+__all__ = ['CostEstimator', 'QueryCost']
+
+
+QueryCost = namedtuple('QueryCost', ['rows', 'cells'])
+
+# Share of the facts assumed to fall in a range cut
+RANGE_SELECTIVITY = 1.0 / 3
+
+
+class CostEstimator(object):
+    """Predicts how many fact rows an aggregation scans and how many cells it
+    returns, before running it.
+
+    The estimate assumes facts are evenly spread over the members of each
+    level. It needs the number of fact rows, taken from the database
+    statistics where available, and the number of members of each level
+    prefix. Both are cached in the default Django cache for
+    ``settings.SLICER_COST_CACHE_TIMEOUT`` seconds (one hour by default), per
+    database and fact table.
+
+    The rows of partitioned and sharded cubes are summed over their
+    partitions. Their members are counted in each partition and the largest
+    count is used, as partitions share members like the categories of every
+    year.
+    """
+
+    def __init__(self, browser):
+        self.browser = browser
+        self.cube = browser.cube
+        self.model = browser.model
+        self.using = browser.db_for_read()
+        self.timeout = getattr(settings, 'SLICER_COST_CACHE_TIMEOUT', 3600)
+        self.partitions = [
+            CostEstimator(browser.partition_browser(partition)) for partition in browser.partitions
+        ]
+
+    def _cache_key(self, *parts):
+        parts = (self.cube.name, self.using, self.model._meta.db_table) + parts
+        return u':'.join((u'cubes', u'cost') + tuple(str(part) for part in parts))
+
+    def _cached(self, key, compute):
+        value = cache.get(key)
+        if value is None:
+            value = compute()
+            cache.set(key, value, self.timeout)
+        return value
+
+    def database_row_estimate(self):
+        """Returns the number of rows of the fact table according to the
+        database statistics, or ``None`` if there are none."""
+        connection = connections[self.using]
+        table = self.model._meta.db_table
+
+        if connection.vendor == 'postgresql':
+            sql = "SELECT reltuples FROM pg_class WHERE relname = %s"
+        elif connection.vendor == 'mysql':
+            sql = "SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s"
+        elif connection.vendor == 'sqlite':
+            sql = "SELECT stat FROM sqlite_stat1 WHERE tbl = %s ORDER BY idx IS NULL DESC LIMIT 1"
+        else:
+            return None
+
+        cursor = connection.cursor()
+        try:
+            cursor.execute(sql, [table])
+            row = cursor.fetchone()
+        except DatabaseError:
+            # e.g. sqlite_stat1 does not exist until ANALYZE is run
+            return None
+        finally:
+            cursor.close()
+
+        if not row or row[0] is None:
+            return None
+        value = int(float(str(row[0]).split()[0]))
+        return value if value > 0 else None
+
+    def total_rows(self):
+        if self.partitions:
+            return sum(partition.total_rows() for partition in self.partitions)
+
+        def compute():
+            estimate = self.database_row_estimate()
+            return estimate if estimate is not None else self.model.objects.using(self.using).count()
+
+        return self._cached(self._cache_key('rows'), compute)
+
+    def member_count(self, dimension, hierarchy, depth):
+        """Returns the number of distinct members of the first `depth` levels
+        of `hierarchy`."""
+        if self.partitions:
+            return max(partition.member_count(dimension, hierarchy, depth) for partition in self.partitions)
+
+        def compute():
+            fields = [self.browser.mapper.field_name(level.key) for level in hierarchy[0:depth]]
+            return self.model.objects.using(self.using).values(*fields).distinct().count()
+
+        key = self._cache_key('members', dimension.name, hierarchy.name, depth)
+        return max(self._cached(key, compute), 1)
+
+    def selectivity(self, cut):
+        """Returns the share of facts within `cut`."""
+        dimension = self.cube.dimension(cut.dimension)
+        hierarchy = dimension.hierarchy(cut.hierarchy)
+
+        if isinstance(cut, PointCut):
+            value = 1.0 / self.member_count(dimension, hierarchy, cut.level_depth())
+        elif isinstance(cut, SetCut):
+            value = min(1.0, float(len(cut.paths)) / self.member_count(dimension, hierarchy, cut.level_depth()))
+        else:
+            value = RANGE_SELECTIVITY
+
+        return 1.0 - value if cut.invert else value
+
+    def estimate(self, cell, drilldown=None):
+        """Returns a `QueryCost` for aggregating `cell` by `drilldown`, a
+        `Drilldown` object."""
+        rows = float(self.total_rows())
+        for cut in cell.cuts:
+            rows *= self.selectivity(cut)
+
+        cells = 1.0
+        for item in drilldown or []:
+            count = float(self.member_count(item.dimension, item.hierarchy, len(item.levels)))
+            cut = cell.cut_for_dimension(item.dimension)
+            if cut is not None and not cut.invert and isinstance(cut, (PointCut, SetCut)):
+                count *= self.selectivity(cut)
+            cells *= max(count, 1.0)
+
+        if drilldown:
+            cells = min(cells, max(rows, 1.0))
+
+        return QueryCost(int(round(rows)), int(round(cells)))
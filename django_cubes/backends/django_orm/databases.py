@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Database aliases of the cube queries.
+
+The queries of a cube go to the database given by the Django routers for
+its model, unless the store or the cube browser options pin them to a
+``database`` alias or spread them over ``replicas``, a comma separated list
+of aliases::
+
+    [store]
+    type: django
+    class_name: hello_world.IrbdBalance
+    database: analytics
+    replicas: replica1, replica2
+    replica_selection: least_loaded
+    primary_after_write: 5
+
+Replicas are chosen in turns with the ``round_robin`` selection, the
+default, or with ``least_loaded`` as the one running the fewest cube queries
+in the process. With ``primary_after_write`` the queries go to the primary,
+the ``database`` or else the database routed for writes, during that many
+seconds after a write bumps the data version of the model, so that they see
+the write before the replicas catch up. See `django_cubes.versions`.
+"""
+import time
+from contextlib import contextmanager
+from threading import Lock
+
+from django.db import router
+from django.utils import six
+
+from cubes.errors import ArgumentError
+
+from ...versions import data_version
+
+__all__ = ['DatabaseSelector', 'SELECTIONS', 'parse_aliases']
+
+SELECTIONS = ('round_robin', 'least_loaded')
+
+
+def parse_aliases(value):
+    """Returns the tuple of the database aliases of `value`, a list or a
+    comma separated string."""
+    if isinstance(value, six.string_types):
+        value = value.split(',')
+    return tuple(alias.strip() for alias in value or [] if alias.strip())
+
+
+class DatabaseSelector(object):
+    """Chooses the database alias of each read of the cubes sharing the
+    `database`, `replicas`, `selection` and `primary_after_write`
+    options."""
+
+    def __init__(self, database=None, replicas=None, selection=None, primary_after_write=None):
+        selection = selection or 'round_robin'
+        if selection not in SELECTIONS:
+            raise ArgumentError(
+                "Unknown replica selection '%s', use one of: %s" % (selection, ', '.join(SELECTIONS))
+            )
+        self.database = database or None
+        self.replicas = parse_aliases(replicas)
+        self.selection = selection
+        self.primary_after_write = primary_after_write
+
+        self.lock = Lock()
+        self.turn = 0
+        self.loads = dict.fromkeys(self.replicas, 0)
+
+    def __repr__(self):
+        return '<DatabaseSelector %s>' % ', '.join(self.replicas or [self.database or 'routed'])
+
+    def primary(self, model):
+        """Returns the alias of the primary database of `model`."""
+        return self.database or router.db_for_write(model)
+
+    def recently_written(self, model):
+        """Returns whether `model` was written less than
+        `primary_after_write` seconds ago."""
+        if not self.primary_after_write:
+            return False
+        version, timestamp = data_version(model)
+        return timestamp is not None and time.time() - timestamp < self.primary_after_write
+
+    def choose(self, model, advance=True):
+        """Returns the alias of the database to read the facts of `model`
+        from. Without `advance` the alias is only peeked at, the turn of the
+        replica is not taken."""
+        if not self.replicas:
+            return self.database or router.db_for_read(model)
+        if self.recently_written(model):
+            return self.primary(model)
+
+        with self.lock:
+            start = self.turn % len(self.replicas)
+            if advance:
+                self.turn += 1
+        replicas = self.replicas[start:] + self.replicas[:start]
+        if self.selection == 'least_loaded':
+            # Ties are broken in turns
+            return min(replicas, key=lambda alias: self.loads[alias])
+        return replicas[0]
+
+    @contextmanager
+    def reading(self, alias):
+        """Counts the reads running on `alias` for the ``least_loaded``
+        selection."""
+        if alias not in self.loads:
+            yield alias
+            return
+        with self.lock:
+            self.loads[alias] += 1
+        try:
+            yield alias
+        finally:
+            with self.lock:
+                self.loads[alias] -= 1
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Statistical aggregate functions missing from SQLite.
+
+``StdDev`` and ``Variance`` compile to ``STDDEV_SAMP``, ``STDDEV_POP``,
+``VAR_SAMP`` and ``VAR_POP``, which PostgreSQL, MySQL and Oracle provide.
+They are registered here as user defined aggregates on every SQLite
+connection, so that they are still computed by the database in the same
+GROUP BY as the other aggregates.
+"""
+import math
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+__all__ = ['register_sqlite_functions']
+
+
+class VarianceAggregate(object):
+    """Welford's running variance."""
+    sample = True
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def step(self, value):
+        if value is None:
+            return
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def variance(self):
+        degrees = self.count - 1 if self.sample else self.count
+        if degrees <= 0:
+            return None
+        return self.m2 / degrees
+
+    def finalize(self):
+        return self.variance()
+
+
+class PopulationVarianceAggregate(VarianceAggregate):
+    sample = False
+
+
+class StdDevAggregate(VarianceAggregate):
+
+    def finalize(self):
+        variance = self.variance()
+        return None if variance is None else math.sqrt(variance)
+
+
+class PopulationStdDevAggregate(StdDevAggregate):
+    sample = False
+
+
+SQLITE_AGGREGATES = {
+    'VAR_SAMP': VarianceAggregate,
+    'VAR_POP': PopulationVarianceAggregate,
+    'STDDEV_SAMP': StdDevAggregate,
+    'STDDEV_POP': PopulationStdDevAggregate,
+}
+
+
+def register_sqlite_functions(sender=None, connection=None, **kwargs):
+    """Registers the statistical aggregates on `connection`, if it is a SQLite
+    connection. Connected to ``connection_created``."""
+    if connection is None or connection.vendor != 'sqlite':
+        return
+    for name, aggregate in SQLITE_AGGREGATES.items():
+        connection.connection.create_aggregate(name, 1, aggregate)
+
+
+connection_created.connect(register_sqlite_functions, dispatch_uid='django_cubes.register_sqlite_functions')
+
+# Connections opened before this module was imported
+for _connection in connections.all():
+    if _connection.connection is not None:
+        register_sqlite_functions(connection=_connection)
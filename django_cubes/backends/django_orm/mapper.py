@@ -42,6 +42,19 @@ class DjangoMapper(Mapper):
         """
         return u'{0}.{1}'.format(self.class_name, attribute.name)
 
+    def field_name(self, attribute):
+        """Returns the django field lookup for `attribute`, as used in
+        `filter()` and `values()`. Mapped attributes might follow relations
+        (``item__category``), other attributes use their name."""
+        if self.mappings:
+            return self.mappings.get(attribute.ref(), attribute.name)
+        return attribute.name
+
     @property
     def reverse_mappings(self):
-        return dict((v, k) for k, v in self.mappings.items())
+        """Attribute references of the mapped fields, computed once as
+        browsers, and their mappers, are shared by the requests."""
+        reverse_mappings = self.__dict__.get('_reverse_mappings')
+        if reverse_mappings is None:
+            reverse_mappings = self._reverse_mappings = dict((v, k) for k, v in self.mappings.items())
+        return reverse_mappings
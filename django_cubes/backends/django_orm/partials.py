@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""
+Aggregation of the facts in disjoint parts.
+
+The aggregates whose `_aggregate_functions` entry has a ``merge`` function
+can be computed for disjoint parts of the facts, like ranges of the fact key,
+and the partial values merged into the values for all the facts: counts and
+sums are added, minimums and maximums compared and averages are computed
+from merged sums and counts. `PartialAggregation` keeps the merged values of
+each drilldown cell as the parts are added.
+
+The parts are ranges of the primary key or of another numeric, date or time
+field, see `key_ranges()`. They can be aggregated concurrently, each on its
+own connection, with `run_parallel()`.
+
+Rows read from several parts are ordered centrally: `merge_sorted()` merges
+parts that are already sorted, like paginated facts, and `top_rows()` keeps
+the first rows of merged cells in the order of a query.
+"""
+import datetime
+import heapq
+from multiprocessing.pool import ThreadPool
+
+from django.db import connections
+from django.db.models import Count, Max, Min, Sum
+
+from cubes.errors import ArgumentError
+
+from .sqlcache import lookup_field
+
+__all__ = [
+    'PartialAggregation', 'key_ranges', 'merge_sorted', 'row_key', 'run_parallel', 'shares_database',
+    'sorts_nulls_last', 'top_rows'
+]
+
+
+def _merge_sum(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    return left + right
+
+
+def _merge_min(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    return min(left, right)
+
+
+def _merge_max(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    return max(left, right)
+
+
+MERGE_FUNCTIONS = {
+    'sum': _merge_sum,
+    'min': _merge_min,
+    'max': _merge_max,
+}
+
+# Internal types of the fields that can be split in ranges
+INTEGER_TYPES = (
+    'AutoField', 'IntegerField', 'BigIntegerField', 'SmallIntegerField',
+    'PositiveIntegerField', 'PositiveSmallIntegerField',
+)
+NUMERIC_TYPES = INTEGER_TYPES + ('FloatField', 'DecimalField')
+TIME_TYPES = ('DateField', 'DateTimeField')
+
+
+def key_ranges(qset, parts, field='pk'):
+    """Returns the filter keyword dictionaries of at most `parts` ranges of
+    equal width of the values of `field` in `qset`, the primary key by
+    default, covering all of its rows. The field must be a number, a date or
+    a time. Rows without a value have a range of their own."""
+    model_field = qset.model._meta.pk if field == 'pk' else lookup_field(qset.model, '%s__in' % field)
+    if model_field.get_internal_type() not in NUMERIC_TYPES + TIME_TYPES:
+        raise ArgumentError(
+            "Can not split '%s' by ranges of its field '%s'" % (qset.model._meta.db_table, field)
+        )
+
+    bounds = qset.aggregate(low=Min(field), high=Max(field))
+    low, high = bounds['low'], bounds['high']
+    ranges = []
+    if low is not None:
+        if model_field.get_internal_type() in TIME_TYPES:
+            width = (high - low) / parts
+            if isinstance(low, datetime.date) and not isinstance(low, datetime.datetime):
+                width = datetime.timedelta(days=width.days)
+        elif model_field.get_internal_type() in INTEGER_TYPES:
+            width = max((high - low) // parts, 1)
+        else:
+            width = (high - low) / parts
+
+        start = low
+        for index in range(parts - 1):
+            if not width or start + width > high:
+                break
+            ranges.append({'%s__gte' % field: start, '%s__lt' % field: start + width})
+            start += width
+        ranges.append({'%s__gte' % field: start, '%s__lte' % field: high})
+
+    if model_field.null:
+        ranges.append({'%s__isnull' % field: True})
+    return ranges
+
+
+def shares_database(connection):
+    """Returns whether other connections see the database of `connection`,
+    which is not the case of in-memory SQLite databases."""
+    if connection.vendor != 'sqlite':
+        return True
+    name = connection.settings_dict['NAME']
+    return bool(name) and name != ':memory:' and 'mode=memory' not in name
+
+
+def run_parallel(function, parts, using, workers):
+    """Returns the list of the results of `function` for each of `parts`,
+    computed by at most `workers` threads, each with its own connection to
+    the `using` database. The parts are computed in the calling thread when
+    there is a single worker or when the database can not be shared."""
+    if workers <= 1 or len(parts) <= 1 or not shares_database(connections[using]):
+        return [function(part) for part in parts]
+
+    def run(part):
+        try:
+            return function(part)
+        finally:
+            # Connections are per thread, do not leave those of this one open
+            for connection in connections.all():
+                connection.close()
+
+    pool = ThreadPool(min(workers, len(parts)))
+    try:
+        return pool.map(run, parts)
+    finally:
+        pool.close()
+        pool.join()
+
+
+class _Descending(object):
+    """Sort key of a value in descending order."""
+    __slots__ = ('value', )
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+
+def sorts_nulls_last(connection):
+    """Returns whether the database of `connection` sorts NULL after the
+    other values in ascending order, as PostgreSQL and Oracle do."""
+    return connection.vendor in ('postgresql', 'oracle')
+
+
+def row_key(columns, nulls_last=False):
+    """Returns the sort key function of rows by their values at `columns`,
+    (`position`, `descending`) tuples. Values are ordered with ``None``
+    first, or last in descending order, the other way around with
+    `nulls_last` to follow the order of the database, see
+    `sorts_nulls_last()`."""
+    def key(row):
+        values = []
+        for position, descending in columns:
+            value = ((row[position] is None) if nulls_last else (row[position] is not None), row[position])
+            values.append(_Descending(value) if descending else value)
+        return values
+    return key
+
+
+def top_rows(rows, columns, count=None):
+    """Returns `rows` sorted by their values at `columns`, see `row_key()`,
+    only the first `count` ones if given."""
+    if count is None:
+        return sorted(rows, key=row_key(columns))
+    return heapq.nsmallest(count, rows, key=row_key(columns))
+
+
+def merge_sorted(parts, key):
+    """Yields the rows of `parts`, sequences of rows each sorted by `key`,
+    in the order of `key`, reading each part as its rows are needed."""
+    heap = []
+    for index, part in enumerate(parts):
+        rows = iter(part)
+        for row in rows:
+            heap.append((key(row), index, row, rows))
+            break
+    heapq.heapify(heap)
+
+    while heap:
+        index, row, rows = heap[0][1:]
+        yield row
+        for row in rows:
+            heapq.heapreplace(heap, (key(row), index, row, rows))
+            break
+        else:
+            heapq.heappop(heap)
+
+
+class PartialAggregation(object):
+    """Merged values of aggregates computed for parts of the facts.
+
+    `fields` are the (`name`, `function`, `field`) tuples of the aggregates and
+    `functions` the aggregate functions of the browser. `expressions()` are
+    the aggregates to compute for each part, added with `add()`.
+    """
+
+    def __init__(self, fields, functions):
+        self.fields = fields
+        self.columns = []
+        for name, function, field in fields:
+            merge = functions.get(function, {}).get('merge')
+            if merge is None:
+                raise ArgumentError(
+                    "Aggregate '%s' can not be merged from parts of the facts, "
+                    "its function '%s' is not additive" % (name, function)
+                )
+            if merge == 'avg':
+                # Averages are merged as sums and counts
+                self.columns.append(('%s_sum' % name, Sum(field), 'sum', None))
+                self.columns.append(('%s_count' % name, Count(field), 'sum', 0))
+            else:
+                expression = functions[function]['aggregate_fn'](field)
+                self.columns.append((name, expression, merge, 0 if function == 'count' else None))
+        self.cells = {}
+
+    def expressions(self):
+        """Returns the (`name`, `aggregate`) tuples to compute for each
+        part."""
+        return [(name, expression) for name, expression, merge, empty in self.columns]
+
+    def add(self, rows, width):
+        """Merges `rows`, tuples of the `width` drilldown values followed by
+        the values of `expressions()`, computed for one part of the facts."""
+        merges = [MERGE_FUNCTIONS[merge] for name, expression, merge, empty in self.columns]
+        for row in rows:
+            key, values = tuple(row[:width]), row[width:]
+            merged = self.cells.get(key)
+            if merged is None:
+                self.cells[key] = list(values)
+            else:
+                self.cells[key] = [merge(left, right) for merge, left, right in zip(merges, merged, values)]
+
+    def values(self, merged):
+        """Returns the list of the aggregate values from the `merged` values of
+        the columns, ``None`` for no merged values."""
+        if merged is None:
+            merged = [empty for name, expression, merge, empty in self.columns]
+        columns = dict(zip([column[0] for column in self.columns], merged))
+
+        values = []
+        for name, function, field in self.fields:
+            if name in columns:
+                values.append(columns[name])
+                continue
+            total, count = columns['%s_sum' % name], columns['%s_count' % name]
+            values.append(float(total) / count if count else None)
+        return values
+
+    def summary(self):
+        """Returns the dictionary of the aggregate values of all the merged
+        cells."""
+        merges = [MERGE_FUNCTIONS[merge] for name, expression, merge, empty in self.columns]
+        merged = None
+        for values in self.cells.values():
+            if merged is None:
+                merged = list(values)
+            else:
+                merged = [merge(left, right) for merge, left, right in zip(merges, merged, values)]
+        return dict(zip([name for name, function, field in self.fields], self.values(merged)))
+
+    def rows(self):
+        """Returns the tuples of the drilldown values followed by the aggregate
+        values of every cell, sorted by the drilldown values."""
+        keys = sorted(self.cells, key=lambda key: [(value is not None, value) for value in key])
+        return [key + tuple(self.values(self.cells[key])) for key in keys]
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Fact models partitioned by ranges of an attribute.
+
+The facts of a cube can be split in several models with the same fields,
+like one table per year, each holding a range of values of an attribute.
+They are declared in the cube browser options, or as a JSON list in the
+``partitions`` option of the store::
+
+    "browser_options": {
+        "partitions": [
+            {"class_name": "hello_world.IrbdBalance2009", "attribute": "year", "to": 2009},
+            {"class_name": "hello_world.IrbdBalance2010", "attribute": "year", "from": 2010}
+        ]
+    }
+
+The ``from`` and ``to`` bounds are inclusive and either can be left out for
+an open range. The browser queries only the partitions whose range holds
+some value of the cuts of the cell on the attribute, see `prune()`, and
+merges their results. The partition models have the fields of the model of
+the cube, which defaults to the first partition model.
+
+Shards are partitions of the facts of the cube model on several databases
+with the same schema. The ``shards`` option is a comma separated list of
+database aliases, queried for every cell, or a JSON list of the aliases
+with the values of an attribute, like the tenant, held by each of them::
+
+    "browser_options": {
+        "shards": [
+            {"database": "shard1", "attribute": "tenant", "values": ["acme", "initech"]},
+            {"database": "shard2", "attribute": "tenant", "values": ["globex"]}
+        ]
+    }
+
+Shards whose values are not cut by the cell are skipped like partitions.
+"""
+import json
+
+from django.db.models import get_model
+from django.utils import six
+
+from cubes.errors import ArgumentError
+
+from .sqlcache import lookup_field
+
+__all__ = ['Partition', 'parse_partitions', 'parse_shards', 'prune']
+
+
+def _to_python(model_field, value):
+    try:
+        return model_field.to_python(value)
+    except Exception:
+        # Compared as given
+        return value
+
+
+class Partition(object):
+    """Model `class_name` holding the facts whose `field` value is between
+    `low` and `high`, both inclusive and ``None`` for no bound, or is one of
+    `values`. The facts are read from the `database` alias, if given."""
+
+    def __init__(self, class_name, field, low=None, high=None, values=None, database=None):
+        self.class_name = class_name
+        self.model = get_model(*class_name.split('.'))
+        self.field = field
+        self.low = low
+        self.high = high
+        self.values = values
+        self.database = database
+
+    def __repr__(self):
+        if self.values is not None:
+            return '<Partition %s@%s %s in %r>' % (self.class_name, self.database, self.field, self.values)
+        return '<Partition %s@%s %s in [%s, %s]>' % (
+            self.class_name, self.database, self.field, self.low, self.high
+        )
+
+    def contains(self, value):
+        """Returns whether `value` of the field belongs to the partition."""
+        if self.values is not None:
+            return value in self.values
+        if value is None:
+            return self.low is None and self.high is None
+        if self.low is not None and value < self.low:
+            return False
+        if self.high is not None and value > self.high:
+            return False
+        return True
+
+    def matches(self, filters):
+        """Returns whether some facts matching the (`lookup`, `values`)
+        `filters` may belong to the partition."""
+        values = dict(filters).get('%s__in' % self.field) if self.field else None
+        if values is None:
+            return True
+        model_field = lookup_field(self.model, '%s__in' % self.field)
+        if self.values is not None:
+            members = set(_to_python(model_field, value) for value in self.values)
+            return any(_to_python(model_field, value) in members for value in values)
+        return any(self.contains(_to_python(model_field, value)) for value in values)
+
+
+def parse_partitions(browser, value):
+    """Returns the `Partition` objects of `value`, a list of dictionaries or
+    its JSON, for the cube of `browser`."""
+    if isinstance(value, six.string_types):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            raise ArgumentError("Partitions of cube '%s' are not a JSON list" % browser.cube.name)
+
+    partitions = []
+    for item in value or []:
+        if 'class_name' not in item or 'attribute' not in item:
+            raise ArgumentError(
+                "Partitions of cube '%s' need a 'class_name' and an 'attribute'" % browser.cube.name
+            )
+        field = browser.mapper.field_name(browser.cube.attribute(item['attribute']))
+        partitions.append(Partition(item['class_name'], field, item.get('from'), item.get('to')))
+    return partitions
+
+
+def parse_shards(browser, value):
+    """Returns the `Partition` objects of the model of `browser` on each
+    shard of `value`, a comma separated list of database aliases, or a list
+    of dictionaries or its JSON."""
+    if isinstance(value, six.string_types):
+        if value.strip().startswith('['):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                raise ArgumentError("Shards of cube '%s' are not a JSON list" % browser.cube.name)
+        else:
+            value = [{'database': alias.strip()} for alias in value.split(',') if alias.strip()]
+
+    shards = []
+    for item in value or []:
+        if 'database' not in item:
+            raise ArgumentError("Shards of cube '%s' need a 'database'" % browser.cube.name)
+        field = None
+        if item.get('attribute'):
+            field = browser.mapper.field_name(browser.cube.attribute(item['attribute']))
+        shards.append(Partition(browser.class_name, field, values=item.get('values'), database=item['database']))
+    return shards
+
+
+def prune(partitions, filters):
+    """Returns the `partitions` that may hold facts matching the (`lookup`,
+    `values`) `filters`."""
+    return [partition for partition in partitions if partition.matches(filters)]
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Pre-aggregate tables of measure sketches.
+
+A pre-aggregate is a model with one row per combination of the values of
+some cube attributes, holding the serialized sketches of the measures of the
+facts of that combination. They are declared in the cube browser options::
+
+    "browser_options": {
+        "preaggregates": [
+            {
+                "class_name": "hello_world.IrbdBalanceSketch",
+                "attributes": ["item.category", "item.subcategory", "year"]
+            }
+        ]
+    }
+
+The model has a field per attribute, named after the field of the attribute
+in the fact model with ``__`` replaced by ``_``, and a text field per sketch,
+named after the measure field followed by the sketch suffix: ``amount_hll``
+for ``approx_count_distinct`` and ``amount_tdigest`` for
+``approx_percentile`` of the ``amount`` measure.
+
+Pre-aggregates are filled by the ``cubes_preaggregate`` command. The browser
+computes the approximate aggregates of a query by merging the sketches of a
+pre-aggregate having all the drilldown and cut attributes, instead of reading
+the facts.
+"""
+from django.db.models import get_model
+
+from cubes.browser import Cell
+
+__all__ = ['Preaggregate', 'preaggregate_column', 'sketch_column']
+
+
+def preaggregate_column(field):
+    """Returns the pre-aggregate field of the fact `field` lookup."""
+    return field.replace('__', '_')
+
+
+def sketch_column(field, sketch_class):
+    """Returns the pre-aggregate field holding the `sketch_class` sketches of
+    the measure `field`."""
+    return '%s_%s' % (preaggregate_column(field), sketch_class.suffix)
+
+
+class Preaggregate(object):
+    """Pre-aggregate of the facts browsed by `browser`, grouped by
+    `attributes`."""
+
+    def __init__(self, browser, class_name, attributes):
+        self.browser = browser
+        self.class_name = class_name
+        self.model = get_model(*class_name.split('.'))
+        self.attributes = browser.cube.get_attributes(attributes)
+        self.fields = [browser.mapper.field_name(attribute) for attribute in self.attributes]
+
+    def __repr__(self):
+        return '<Preaggregate %s by %s>' % (self.class_name, ', '.join(self.fields))
+
+    def covers(self, fields):
+        """Returns whether the sketches can be grouped and filtered by the fact
+        `fields`."""
+        return set(fields) <= set(self.fields)
+
+    def _filter(self, filters):
+        qset = self.model.objects.all()
+        for lookup, values in filters:
+            field, operator = lookup.rsplit('__', 1)
+            qset = qset.filter(**{'%s__%s' % (preaggregate_column(field), operator): values})
+        return qset
+
+    def sketches(self, filters, fields, specs):
+        """Returns the sketches of `specs`, a list of (`field`, `sketch_class`)
+        tuples, by the tuple of the `fields` values of the rows matching
+        `filters`, merging the rows grouped by other attributes."""
+        columns = [preaggregate_column(field) for field in fields]
+        columns += [sketch_column(field, sketch_class) for field, sketch_class in specs]
+        qset = self._filter(filters).values_list(*columns)
+
+        width = len(fields)
+        sketches = {}
+        for row in qset.iterator():
+            key = row[:width]
+            merged = sketches.get(key)
+            for index, (field, sketch_class) in enumerate(specs):
+                data = row[width + index]
+                if not data:
+                    continue
+                sketch = sketch_class.deserialize(data)
+                if merged is None:
+                    merged = sketches[key] = {}
+                if (field, sketch_class) in merged:
+                    merged[(field, sketch_class)].merge(sketch)
+                else:
+                    merged[(field, sketch_class)] = sketch
+        return sketches
+
+    def build(self, cell=None, merge=False):
+        """Writes the sketches of the cube sketch aggregates for the facts of
+        `cell`, replacing the rows of the table. With `merge` the sketches are
+        merged into the existing rows instead, like when adding a partition of
+        new facts. Returns the number of rows written."""
+        specs = self.browser.sketch_specs(self.browser.cube.aggregates)
+        sketches = self.browser.fact_sketches(cell or Cell(self.browser.cube), self.fields, specs)
+        columns = [preaggregate_column(field) for field in self.fields]
+
+        if not merge:
+            self.model.objects.all().delete()
+            self.model.objects.bulk_create([
+                self.model(**self._values(columns, key, cell_sketches, specs))
+                for key, cell_sketches in sketches.items()
+            ])
+            return len(sketches)
+
+        for key, cell_sketches in sketches.items():
+            lookup = dict(zip(columns, key))
+            row = self.model.objects.filter(**lookup).first()
+            if row is None:
+                self.model.objects.create(**self._values(columns, key, cell_sketches, specs))
+                continue
+            for field, sketch_class in specs:
+                column = sketch_column(field, sketch_class)
+                if getattr(row, column):
+                    cell_sketches[(field, sketch_class)].merge(sketch_class.deserialize(getattr(row, column)))
+                setattr(row, column, cell_sketches[(field, sketch_class)].serialize())
+            row.save()
+        return len(sketches)
+
+    @staticmethod
+    def _values(columns, key, cell_sketches, specs):
+        values = dict(zip(columns, key))
+        for field, sketch_class in specs:
+            values[sketch_column(field, sketch_class)] = cell_sketches[(field, sketch_class)].serialize()
+        return values
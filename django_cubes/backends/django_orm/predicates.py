@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Cut translation plans of a cube.
+
+The filters of a point cut only depend on its dimension, its hierarchy and
+the depth of its path: the cut filters the fields of the keys of the levels
+of the hierarchy down to that depth. `CutPlans` computes the field lookups
+of every dimension, hierarchy and depth of a cube once, when the browser is
+created, so that translating the cuts of a cell is a dictionary lookup per
+cut followed by binding the path as the values of the lookups.
+
+Plans are keyed by the names of the dimension and the hierarchy, ``None``
+standing for the default hierarchy. Cuts that are not planned, like paths
+deeper than their hierarchy, are translated the slow way on their first
+use and planned from then on, and unknown dimensions or hierarchies raise
+the errors of the model.
+"""
+from threading import Lock
+
+__all__ = ['CutPlans']
+
+
+class CutPlans(object):
+    """Field lookups filtering the cuts of `cube`, with the fields of
+    `mapper`."""
+
+    def __init__(self, cube, mapper):
+        self.cube = cube
+        self.mapper = mapper
+        self.lock = Lock()
+        self.plans = {}
+        for dimension in cube.dimensions:
+            for hierarchy in dimension.hierarchies:
+                names = [hierarchy.name]
+                if hierarchy is dimension.hierarchy():
+                    names.append(None)
+                for depth in range(1, len(hierarchy) + 1):
+                    lookups = self.plan_lookups(hierarchy, depth)
+                    for name in names:
+                        self.plans[(dimension.name, name, depth)] = lookups
+
+    def plan_lookups(self, hierarchy, depth):
+        """Returns the ``__in`` lookups of the keys of the levels of
+        `hierarchy` down to `depth`."""
+        return tuple(u'%s__in' % self.mapper.field_name(level.key) for level in hierarchy[0:depth])
+
+    def lookups(self, cut):
+        """Returns the lookups filtered by the path of the point `cut`."""
+        hierarchy = str(cut.hierarchy) if cut.hierarchy else None
+        key = (str(cut.dimension), hierarchy, cut.level_depth())
+        lookups = self.plans.get(key)
+        if lookups is None:
+            dimension = self.cube.dimension(cut.dimension)
+            lookups = self.plan_lookups(dimension.hierarchy(cut.hierarchy), key[2])
+            with self.lock:
+                self.plans[key] = lookups
+        return lookups
+
+    def filters(self, cell):
+        """Returns the list of (`lookup`, `values`) tuples filtering the facts
+        of `cell`, sorted by lookup."""
+        filter_kwargs = {}
+        for cut in cell.cuts:
+            for lookup in self.lookups(cut):
+                filter_kwargs[lookup] = cut.path
+        return sorted(filter_kwargs.items())
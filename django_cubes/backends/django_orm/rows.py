@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from six.moves import zip
+
+__all__ = ['Rows']
+
+
+class Rows(object):
+    """Rows of a result kept as the tuples returned by ``values_list()``,
+    sharing one `header` with the names of their values.
+
+    Iterating yields a new dictionary per row. The dictionaries are not kept,
+    so consumers of the rows as dictionaries (`AggregationResult.table_rows`,
+    post-aggregation calculators) only hold one at a time, while consumers of
+    the values can use `header` and `rows` directly.
+    """
+
+    def __init__(self, header, rows):
+        self.header = tuple(header)
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        header = self.header
+        for row in self.rows:
+            yield dict(zip(header, row))
+
+    def __repr__(self):
+        return '<Rows %r: %d rows>' % (self.header, len(self.rows))
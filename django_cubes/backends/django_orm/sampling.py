@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Aggregation over a sample of the facts.
+
+A `Sampler` restricts the aggregation queries to about `fraction` of the
+fact rows, each row being kept independently of the others:
+
+* on PostgreSQL 9.5 and later with ``TABLESAMPLE BERNOULLI``, repeatable so
+  that the pages of a drilldown come from the same sample;
+* elsewhere with a hash of the primary key,
+  ``((pk % 1000003) * 2654435761) % 1000000``, which keeps the same rows for
+  the same fraction. The key is reduced first so that the product fits in 64
+  bit integers.
+
+Counts and sums are scaled by ``1 / fraction``. Counts, sums and averages
+get the bounds of their `CONFIDENCE` interval, in ``<aggregate>_low`` and
+``<aggregate>_high``, from the variance of the measure in the sample. Other
+aggregates are computed on the sample as they are and have no bounds.
+
+The ``total_cell_count`` of a sampled drilldown is the number of cells with
+sampled facts. It is not scaled, as cells are not spread like facts: cells
+whose facts were all left out are missing, so it is a lower bound of the
+number of cells of all the facts.
+"""
+import math
+
+from django.db import connections
+from django.db.models import AutoField, Count, IntegerField, Variance
+
+from cubes.errors import ArgumentError
+
+from .sqlcache import CompiledQuery
+
+__all__ = ['CONFIDENCE', 'Sampler']
+
+# Confidence level of the intervals and its two-sided normal quantile
+CONFIDENCE = 0.95
+Z_SCORE = 1.959964
+
+HASH_MODULUS = 1000003
+HASH_MULTIPLIER = 2654435761
+HASH_BUCKETS = 1000000
+
+# Aggregate functions estimated from the sample, with bounds
+SCALED_FUNCTIONS = ('count', 'sum')
+ESTIMATED_FUNCTIONS = SCALED_FUNCTIONS + ('avg', )
+
+
+def _moment_names(field):
+    field = field.replace('__', '_')
+    return 'sample_count_%s' % field, 'sample_var_%s' % field
+
+
+class Sampler(object):
+    """Runs the aggregation queries of `browser` over a sample of `fraction`
+    of the facts."""
+
+    def __init__(self, browser, fraction, using):
+        if not 0 < fraction <= 1:
+            raise ArgumentError("Sample fraction must be greater than 0 and at most 1")
+
+        self.model = browser.model
+        self.connection = connections[using]
+        self.tablesample = (
+            self.connection.vendor == 'postgresql' and getattr(self.connection, 'pg_version', 0) >= 90500
+        )
+        if self.tablesample:
+            self.fraction = fraction
+            self.method = 'tablesample'
+        else:
+            if not isinstance(self.model._meta.pk, (AutoField, IntegerField)):
+                raise ArgumentError("Sampling '%s' needs an integer primary key" % self.model._meta.db_table)
+            self.threshold = max(int(round(fraction * HASH_BUCKETS)), 1)
+            self.fraction = float(self.threshold) / HASH_BUCKETS
+            self.method = 'hash'
+
+    def to_dict(self):
+        return {'fraction': self.fraction, 'method': self.method, 'confidence': CONFIDENCE}
+
+    def filter(self, qset):
+        """Returns `qset` restricted to the sampled rows, when sampling is not
+        done by the database."""
+        if self.tablesample:
+            return qset
+        qn = self.connection.ops.quote_name
+        column = '%s.%s' % (qn(self.model._meta.db_table), qn(self.model._meta.pk.column))
+        key = self.connection.ops.combine_expression('%%', [column, str(HASH_MODULUS)])
+        predicate = self.connection.ops.combine_expression(
+            '%%', ['((%s) * %d)' % (key, HASH_MULTIPLIER), str(HASH_BUCKETS)]
+        )
+        return qset.extra(where=['%s < %%s' % predicate], params=[self.threshold])
+
+    def _execute(self, compiled):
+        if compiled is None:
+            return None
+        table = ' FROM %s' % self.connection.ops.quote_name(self.model._meta.db_table)
+        sql = compiled.sql.replace(
+            table, '%s TABLESAMPLE BERNOULLI (%r) REPEATABLE (0)' % (table, self.fraction * 100), 1
+        )
+        return CompiledQuery(sql, compiled.params, compiled.converters).execute(self.connection, compiled.params)
+
+    def summary(self, qset, expressions):
+        """Returns the dictionary of the aggregation of `qset` by
+        `expressions`, a list of (name, aggregate) tuples."""
+        if not self.tablesample:
+            return qset.aggregate(**dict(expressions))
+        rows = self._execute(CompiledQuery.summary(qset, expressions))
+        values = rows[0] if rows else [None] * len(expressions)
+        return dict(zip([name for name, expression in expressions], values))
+
+    def rows(self, qset):
+        """Returns the rows of a ``values_list()`` queryset."""
+        if not self.tablesample:
+            return list(qset)
+        rows = self._execute(CompiledQuery.rows(qset))
+        return [] if rows is None else rows
+
+    def count(self, qset):
+        """Returns the number of rows of a ``values_list()`` queryset, not
+        scaled."""
+        if not self.tablesample:
+            return qset.count()
+        rows = self._execute(CompiledQuery.count(qset))
+        return rows[0][0] if rows else 0
+
+    @staticmethod
+    def moments(fields):
+        """Returns the names and the expressions of the aggregates of the
+        sample needed for the bounds of `fields`, a list of (`name`,
+        `function`, `field`) tuples."""
+        expressions = []
+        for field in sorted(set(field for name, function, field in fields if function in ('sum', 'avg'))):
+            count_name, variance_name = _moment_names(field)
+            expressions.append((count_name, Count(field)))
+            expressions.append((variance_name, Variance(field, sample=False)))
+        return expressions
+
+    def interval_names(self, fields):
+        """Returns the names of the bounds of the estimated aggregates."""
+        names = []
+        for name, function, field in fields:
+            if function in ESTIMATED_FUNCTIONS:
+                names += ['%s_low' % name, '%s_high' % name]
+        return names
+
+    def estimate(self, values, fields):
+        """Returns the list of the estimates of the aggregates of `fields`
+        followed by their bounds, from the `values` of the aggregates of the
+        sample and of their `moments()`."""
+        fraction = self.fraction
+        estimates, bounds = [], []
+        for name, function, field in fields:
+            value = values[name]
+            if function not in ESTIMATED_FUNCTIONS:
+                estimates.append(value)
+                continue
+            if value is None:
+                estimates.append(None)
+                bounds += [None, None]
+                continue
+
+            if function == 'count':
+                estimate = int(round(value / fraction))
+                error = math.sqrt(value * (1 - fraction)) / fraction
+            else:
+                count_name, variance_name = _moment_names(field)
+                count = values[count_name] or 0
+                variance = float(values[variance_name] or 0)
+                if function == 'sum':
+                    # Horvitz-Thompson variance of the scaled sum
+                    squares = count * variance + float(value) ** 2 / count if count else 0
+                    estimate = float(value) / fraction
+                    error = math.sqrt((1 - fraction) * squares) / fraction
+                else:
+                    estimate = value
+                    error = math.sqrt(variance / (count - 1) * (1 - fraction)) if count > 1 else 0
+            estimates.append(estimate)
+            bounds += [float(estimate) - Z_SCORE * error, float(estimate) + Z_SCORE * error]
+        return estimates + bounds
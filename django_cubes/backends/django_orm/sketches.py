@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+Mergeable sketches of the values of a measure.
+
+`HyperLogLog` estimates the number of distinct values and `TDigest` the
+percentiles of the values, in a bounded size. Two sketches of the same kind
+merge into the sketch of the union of their values, so that sketches kept in
+a pre-aggregate table can be rolled up to coarser drilldowns or combined
+across partitions without reading the facts again. Sketches are stored as
+ASCII strings, see `serialize()` and `deserialize()`.
+"""
+import base64
+import bisect
+import hashlib
+import json
+import math
+import struct
+import zlib
+
+import six
+
+__all__ = ['HyperLogLog', 'TDigest', 'merge_sketches']
+
+
+def _hash64(value):
+    """Returns a 64 bit hash of the text of `value`."""
+    if not isinstance(value, six.binary_type):
+        value = six.text_type(value).encode('utf-8')
+    return struct.unpack('>Q', hashlib.sha1(value).digest()[:8])[0]
+
+
+def _encode(data):
+    return base64.b64encode(zlib.compress(data)).decode('ascii')
+
+
+def _decode(data):
+    return zlib.decompress(base64.b64decode(data))
+
+
+def merge_sketches(tables):
+    """Returns the dictionary of the sketches of `tables`, dictionaries of
+    the sketches by key, merging the sketches of the same key. The sketches
+    of the first tables are merged into."""
+    merged = {}
+    for table in tables:
+        for key, sketches in table.items():
+            into = merged.get(key)
+            if into is None:
+                merged[key] = dict(sketches)
+                continue
+            for spec, sketch in sketches.items():
+                if spec in into:
+                    into[spec].merge(sketch)
+                else:
+                    into[spec] = sketch
+    return merged
+
+
+class HyperLogLog(object):
+    """Estimates the number of distinct values added, with a relative
+    standard error of ``1.04 / sqrt(2 ** precision)`` (1.6% with the default
+    precision) in ``2 ** precision`` bytes."""
+    suffix = 'hll'
+
+    def __init__(self, precision=12):
+        if not 4 <= precision <= 16:
+            raise ValueError("HyperLogLog precision must be between 4 and 16")
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, value):
+        if value is None:
+            return
+        hashed = _hash64(value)
+        width = 64 - self.precision
+        index = hashed >> width
+        rank = width - (hashed & ((1 << width) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("Can not merge HyperLogLog sketches of different precisions")
+        self.registers = bytearray(max(pair) for pair in zip(self.registers, other.registers))
+        return self
+
+    def count(self):
+        size = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size * size / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(b'\x00')
+        if estimate <= 2.5 * size and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = size * math.log(float(size) / zeros)
+        return int(round(estimate))
+
+    def value(self, aggregate):
+        return self.count()
+
+    def serialize(self):
+        return _encode(struct.pack('B', self.precision) + bytes(self.registers))
+
+    @classmethod
+    def deserialize(cls, data):
+        data = _decode(data)
+        sketch = cls(struct.unpack('B', data[:1])[0])
+        sketch.registers = bytearray(data[1:])
+        return sketch
+
+
+class TDigest(object):
+    """Estimates percentiles of the values added, keeping at most about
+    `compression` centroids. Estimates are more accurate near the extremes
+    than around the median."""
+    suffix = 'tdigest'
+
+    def __init__(self, compression=100):
+        self.compression = compression
+        self.centroids = []
+        self.unmerged = []
+        self.count = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value, weight=1):
+        if value is None:
+            return
+        value = float(value)
+        self.unmerged.append((value, weight))
+        self.count += weight
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        if len(self.unmerged) > 10 * self.compression:
+            self.compress()
+
+    def merge(self, other):
+        if not other.count:
+            return self
+        self.unmerged.extend(other.centroids)
+        self.unmerged.extend(other.unmerged)
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self.compress()
+        return self
+
+    def _scale(self, quantile):
+        quantile = min(max(quantile, 0.0), 1.0)
+        return self.compression / (2 * math.pi) * math.asin(2 * quantile - 1)
+
+    def compress(self):
+        """Merges the buffered values into the centroids."""
+        if not self.unmerged:
+            return
+        points = sorted(self.centroids + self.unmerged)
+        self.unmerged = []
+
+        total = float(self.count)
+        centroids = []
+        mean, weight = points[0]
+        cumulative = 0
+        lower = self._scale(0)
+        for point_mean, point_weight in points[1:]:
+            if self._scale((cumulative + weight + point_weight) / total) - lower <= 1:
+                weight += point_weight
+                mean += (point_mean - mean) * point_weight / weight
+            else:
+                centroids.append((mean, weight))
+                cumulative += weight
+                lower = self._scale(cumulative / total)
+                mean, weight = point_mean, point_weight
+        centroids.append((mean, weight))
+        self.centroids = centroids
+
+    def quantile(self, quantile):
+        """Returns the estimate of the value at `quantile`, between 0 and 1,
+        or ``None`` if no values were added."""
+        self.compress()
+        if not self.centroids:
+            return None
+        if len(self.centroids) == 1:
+            return self.centroids[0][0]
+
+        target = quantile * self.count
+        # Each centroid is placed at the middle of its weight, between the
+        # minimum at 0 and the maximum at `count`
+        centers = []
+        cumulative = 0
+        for mean, weight in self.centroids:
+            centers.append(cumulative + weight / 2.0)
+            cumulative += weight
+        points = [(0.0, self.min)] + list(zip(centers, [mean for mean, weight in self.centroids]))
+        points.append((float(self.count), self.max))
+
+        index = bisect.bisect_right([position for position, value in points], target)
+        if index >= len(points):
+            return self.max
+        (left, left_value), (right, right_value) = points[index - 1], points[index]
+        if right == left:
+            return right_value
+        return left_value + (right_value - left_value) * (target - left) / (right - left)
+
+    def value(self, aggregate):
+        """Returns the percentile of `aggregate`, given by its
+        ``info["percentile"]``, the median by default."""
+        percentile = (aggregate.info or {}).get('percentile', 50)
+        return self.quantile(float(percentile) / 100)
+
+    def serialize(self):
+        self.compress()
+        return _encode(json.dumps({
+            'compression': self.compression,
+            'min': self.min,
+            'max': self.max,
+            'centroids': self.centroids,
+        }).encode('ascii'))
+
+    @classmethod
+    def deserialize(cls, data):
+        data = json.loads(_decode(data).decode('ascii'))
+        sketch = cls(data['compression'])
+        sketch.centroids = [tuple(centroid) for centroid in data['centroids']]
+        sketch.count = sum(weight for mean, weight in sketch.centroids)
+        sketch.min = data['min']
+        sketch.max = data['max']
+        return sketch
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Cache of the SQL compiled for each query shape.
+
+The SQL of the browser queries depends only on their shape: the filtered
+fields with the number of values of each filter, the drilldown, the
+aggregates, the order and the page. `CompiledQuery` keeps the SQL compiled by
+the ORM for a shape together with the conversions the ORM applies to the
+returned values, and runs it again on a cursor with the parameters of a later
+query of the same shape.
+
+The cache is kept per process, holding the ``settings.SLICER_SQL_CACHE_SIZE``
+(512 by default) most recently used shapes. Setting it to 0 disables it.
+"""
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+from django.db.models.sql.datastructures import EmptyResultSet
+
+__all__ = ['CompiledQuery', 'QueryCache', 'get_query_cache', 'lookup_field']
+
+
+def lookup_field(model, lookup):
+    """Returns the model field filtered by `lookup`, a filter keyword like
+    ``item__category__in``."""
+    names = lookup.split('__')[:-1]
+    opts = model._meta
+    for name in names[:-1]:
+        opts = opts.get_field(name).rel.to._meta
+    return opts.get_field(names[-1])
+
+
+class CompiledQuery(object):
+    """SQL of a query with one converter per returned column, ``None`` for
+    the columns returned as they are."""
+
+    def __init__(self, sql, params, converters):
+        self.sql = sql
+        self.params = list(params)
+        self.converters = converters
+
+    @classmethod
+    def compile(cls, query, using, converters):
+        """Returns the `CompiledQuery` of `query` or ``None`` if it can not be
+        run without the ORM."""
+        compiler = query.get_compiler(using)
+        if hasattr(compiler, 'resolve_columns'):
+            # The backend converts every column itself (MySQL, Oracle)
+            return None
+        try:
+            sql, params = compiler.as_sql()
+        except EmptyResultSet:
+            return None
+        return cls(sql, params, converters)
+
+    @classmethod
+    def rows(cls, queryset):
+        """Compiles a ``values_list()`` queryset, optionally annotated."""
+        query = queryset.query
+        width = len(query.extra_select) + len(query.select)
+        converters = [None] * width + [
+            cls._aggregate_converter(query, aggregate) for aggregate in query.aggregate_select.values()
+        ]
+        return cls.compile(query, queryset.db, converters)
+
+    @classmethod
+    def summary(cls, queryset, aggregates):
+        """Compiles the aggregation of `queryset` by `aggregates`, a list of
+        (name, aggregate) tuples, like `QuerySet.aggregate()` does."""
+        query = queryset.query.clone()
+        for name, aggregate in aggregates:
+            query.add_aggregate(aggregate, queryset.model, name, is_summary=True)
+        query.select = []
+        query.default_cols = False
+        query.remove_inherited_models()
+        query.clear_ordering(True)
+        query.clear_limits()
+        query.related_select_cols = []
+
+        return cls.compile(query, queryset.db, [
+            cls._aggregate_converter(query, aggregate) for aggregate in query.aggregate_select.values()
+        ])
+
+    @classmethod
+    def count(cls, queryset):
+        """Compiles the count of the rows of a ``values_list()`` queryset."""
+        query = queryset.query.clone()
+        query.clear_ordering(True)
+        query.clear_limits()
+        compiled = cls.compile(query, queryset.db, [lambda value, connection: int(value)])
+        if compiled is not None:
+            compiled.sql = 'SELECT COUNT(*) FROM (%s) subquery' % compiled.sql
+        return compiled
+
+    @staticmethod
+    def _aggregate_converter(query, aggregate):
+        def convert(value, connection):
+            return query.resolve_aggregate(value, aggregate, connection)
+        return convert
+
+    def execute(self, connection, params):
+        """Returns the converted rows returned for `params`."""
+        cursor = connection.cursor()
+        try:
+            cursor.execute(self.sql, params)
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+
+        converters = [
+            (index, converter) for index, converter in enumerate(self.converters) if converter is not None
+        ]
+        if not converters:
+            return [tuple(row) for row in rows]
+
+        result = []
+        for row in rows:
+            row = list(row)
+            for index, converter in converters:
+                row[index] = converter(row[index], connection)
+            result.append(tuple(row))
+        return result
+
+
+class QueryCache(object):
+    """Least recently used cache of `CompiledQuery` objects."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.queries = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            compiled = self.queries.pop(key, None)
+            if compiled is None:
+                self.misses += 1
+                return None
+            self.queries[key] = compiled
+            self.hits += 1
+            return compiled
+
+    def set(self, key, compiled):
+        if not self.max_size:
+            return
+        with self.lock:
+            self.queries.pop(key, None)
+            self.queries[key] = compiled
+            while len(self.queries) > self.max_size:
+                self.queries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.queries.clear()
+            self.hits = self.misses = 0
+
+
+_cache = QueryCache(0)
+
+
+def get_query_cache():
+    """Returns the process wide `QueryCache`, sized by
+    ``settings.SLICER_SQL_CACHE_SIZE``."""
+    _cache.max_size = getattr(settings, 'SLICER_SQL_CACHE_SIZE', 512)
+    return _cache
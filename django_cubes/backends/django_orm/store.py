@@ -1,6 +1,10 @@
 # -*- coding: utf-8 -*-
+from threading import Lock
+
 from cubes.stores import Store
 
+from .databases import DatabaseSelector, parse_aliases
+
 
 __all__ = ['DjangoStore', ]
 
@@ -12,6 +16,14 @@ class DjangoStore(Store):
     [store]
     type: django
     class_name: hello_world.IrbdBalance
+
+    The facts can be partitioned in several models by ranges of an attribute,
+    given as a JSON list in the ``partitions`` option, or in several databases
+    given in the ``shards`` option, see
+    `django_cubes.backends.django_orm.partitions`.
+
+    The queries can be pinned to a ``database`` alias or spread over
+    ``replicas``, see `django_cubes.backends.django_orm.databases`.
     """
     default_browser_name = "django"
 
@@ -21,8 +33,52 @@ class DjangoStore(Store):
             "type": "string",
             "description": "Name of the model used for queries"
         },
+        {
+            "name": "partitions",
+            "type": "string",
+            "description": "JSON list of the models of the fact partitions"
+        },
+        {
+            "name": "shards",
+            "type": "string",
+            "description": "Database aliases of the shards of the facts, or their JSON list"
+        },
+        {
+            "name": "database",
+            "type": "string",
+            "description": "Database alias of the queries"
+        },
+        {
+            "name": "replicas",
+            "type": "string",
+            "description": "Comma separated database aliases of the replicas read by the queries"
+        },
+        {
+            "name": "replica_selection",
+            "type": "string",
+            "description": "How replicas are chosen: round_robin or least_loaded"
+        },
+        {
+            "name": "primary_after_write",
+            "type": "float",
+            "description": "Seconds after a write during which the queries read the primary"
+        },
     ]
 
-    def __init__(self, class_name=None, **options):
+    def __init__(self, class_name=None, partitions=None, shards=None, **options):
         super(DjangoStore, self).__init__(**options)
         self.class_name = class_name
+        self.partitions = partitions
+        self.shards = shards
+        self.selectors = {}
+        self.selectors_lock = Lock()
+
+    def database_selector(self, database=None, replicas=None, selection=None, primary_after_write=None):
+        """Returns the `DatabaseSelector` shared by the browsers of the cubes
+        with the same database options, keeping the turns and loads of the
+        replicas across queries."""
+        key = (database, parse_aliases(replicas), selection, primary_after_write)
+        with self.selectors_lock:
+            if key not in self.selectors:
+                self.selectors[key] = DatabaseSelector(*key)
+            return self.selectors[key]
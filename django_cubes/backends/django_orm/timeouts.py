@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+import time
+from contextlib import contextmanager
+from threading import local
+
+from django.db import DatabaseError
+
+from cubes.errors import BackendError
+
+__all__ = ['QueryTimeoutError', 'current_deadline', 'statement_timeout']
+
+
+# Number of SQLite virtual machine instructions between deadline checks
+SQLITE_PROGRESS_STEPS = 1000
+
+_state = local()
+
+
+class QueryTimeoutError(BackendError):
+    """Raised when a query was cancelled because it ran out of time."""
+
+
+def _apply(connection, deadline):
+    """Makes the database cancel statements of `connection` running past
+    `deadline`, or lifts the limit when `deadline` is ``None``."""
+    vendor = connection.vendor
+    remaining = None if deadline is None else max(int((deadline - time.time()) * 1000), 1)
+
+    if vendor == 'sqlite':
+        connection.ensure_connection()
+        if deadline is None:
+            connection.connection.set_progress_handler(None, 0)
+        else:
+            connection.connection.set_progress_handler(
+                lambda: 1 if time.time() > deadline else 0, SQLITE_PROGRESS_STEPS
+            )
+    elif vendor in ('postgresql', 'mysql'):
+        if vendor == 'postgresql':
+            sql = 'SET statement_timeout = %s' % (remaining or 'DEFAULT')
+        else:
+            sql = 'SET SESSION max_execution_time = %s' % (remaining or 'DEFAULT')
+        cursor = connection.cursor()
+        try:
+            cursor.execute(sql)
+        finally:
+            cursor.close()
+
+
+def current_deadline():
+    """Returns the time the statements of the current thread must be done
+    by, or ``None`` outside of `statement_timeout()` blocks."""
+    return getattr(_state, 'deadline', None)
+
+
+@contextmanager
+def statement_timeout(connection, seconds, deadline=None):
+    """Cancels the statements executed on `connection` within the block that
+    are still running `seconds` after the block started, or after the time
+    `deadline` if it comes first, raising `QueryTimeoutError`. Blocks of
+    other threads, like the workers of a query, get the deadline of the
+    thread starting them as `deadline`.
+
+    The limit is enforced by the database: ``statement_timeout`` on
+    PostgreSQL, ``max_execution_time`` on MySQL 5.7+ and a progress handler on
+    SQLite. Other databases are not limited. On SQLite the deadline bounds all
+    the statements of the block together, while PostgreSQL and MySQL limit
+    each statement to the time left when the block started.
+
+    Blocks can be nested, on the same connection or on others: the inner
+    block can only shorten the time left by the outer one, and the limit of
+    its connection is restored when it exits.
+    """
+    outer = getattr(_state, 'deadline', None)
+    if not seconds and deadline is None:
+        yield
+        return
+
+    start = time.time()
+    deadline = min(
+        limit for limit in (start + seconds if seconds else None, outer, deadline) if limit is not None
+    )
+
+    # Deadlines applied to each connection of the thread
+    applied = _state.__dict__.setdefault('applied', {})
+    previous = applied.get(connection.alias)
+
+    _state.deadline = applied[connection.alias] = deadline
+    _apply(connection, deadline)
+    try:
+        yield
+    except DatabaseError:
+        if time.time() >= deadline:
+            raise QueryTimeoutError("Query cancelled after running out of its %g seconds" % (deadline - start))
+        raise
+    finally:
+        _state.deadline = outer
+        if previous is None:
+            applied.pop(connection.alias, None)
+        else:
+            applied[connection.alias] = previous
+        try:
+            _apply(connection, previous)
+        except DatabaseError:
+            # The connection is unusable after a failed transaction, it is
+            # reset by Django anyway
+            pass
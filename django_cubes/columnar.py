@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar representation of aggregation results and facts.
+
+Instead of a list of dictionaries repeating every attribute name on every row,
+the columnar representation has a ``header`` with the attribute names and
+``columns`` with one array of values per attribute, in the header order.
+
+Browsers keeping their rows as tuples, like the Django browser with its
+`Rows`, return cells and facts with `header` and `rows` attributes, which are
+used as they are. The dictionaries returned by other browsers are transposed.
+"""
+from six.moves import zip
+
+__all__ = ['columns', 'columnar_aggregation', 'columnar_facts']
+
+
+def columns(rows, width):
+    """Returns the transposition of `rows`, sequences of `width` values."""
+    if not rows:
+        return [[] for _ in range(width)]
+    return [list(column) for column in zip(*rows)]
+
+
+def columnar_aggregation(result):
+    """Returns the dictionary of an `AggregationResult` with its cells
+    replaced by ``header`` and ``columns``."""
+    data = result.to_dict()
+    cells = data.pop('cells', None)
+    if cells is None:
+        return data
+
+    if hasattr(cells, 'header') and hasattr(cells, 'rows'):
+        header, rows = cells.header, cells.rows
+    else:
+        rows = list(cells)
+        header = list(result.labels or [])
+        if rows:
+            # Post-aggregation calculators add their own keys
+            header += [name for name in rows[0] if name not in header]
+        rows = [[cell.get(name) for name in header] for cell in rows]
+
+    data['header'] = list(header)
+    data['columns'] = columns(rows, len(header))
+    return data
+
+
+def columnar_facts(facts, attributes):
+    """Returns ``header`` and ``columns`` of the `facts` of a browser,
+    fetched for the list of `attributes`."""
+    rows = getattr(facts, 'facts', facts)
+    if hasattr(rows, 'header') and hasattr(rows, 'rows'):
+        header, rows = rows.header, rows.rows
+    else:
+        header = [attribute.ref() for attribute in attributes]
+        rows = [
+            [fact.get(attribute.ref(), fact.get(attribute.name)) for attribute in attributes]
+            for fact in rows
+        ]
+
+    return {
+        'header': list(header),
+        'columns': columns(rows, len(header)),
+    }
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Conditional requests of the slicer views.
+
+Responses that carry an ``ETag`` can be answered with ``304 Not Modified``
+when the client sends the same tag in ``If-None-Match``. Tags are computed
+from a digest of the content and the format of the response, so that each
+representation of a resource has its own strong tag.
+
+The results of the ``/aggregate/``, ``/facts/``, ``/members/`` and
+``/cell/`` views only change with the data of the cube, so their tags are
+computed before querying it, from the data version given by the browser,
+the query and the cell restricted by the authorizer. They are enabled by
+the ``settings.SLICER_HTTP_CACHE`` dictionary, whose keys are optional:
+
+* ``cache_control`` – the ``Cache-Control`` header of the results (default
+  ``private, max-age=0, must-revalidate``)
+
+Browsers provide the data version with a ``data_version()`` method
+returning a (`version`, `timestamp`) tuple, see `django_cubes.versions`;
+results of other browsers, and results whose version is ``None`` because
+it is not known, are not tagged. Neither are aggregations paginated by
+admission control, the tag identifies the full result.
+"""
+import hashlib
+
+from django.conf import settings
+from django.utils.http import parse_http_date_safe, urlencode
+
+__all__ = [
+    'DEFAULT_CACHE_CONTROL', 'digest', 'etag_matches', 'get_http_cache', 'make_etag', 'modified_since',
+    'normalized_query',
+]
+
+DEFAULT_CACHE_CONTROL = 'private, max-age=0, must-revalidate'
+
+
+def digest(*parts):
+    """Returns the hexadecimal SHA-1 digest of the text `parts`."""
+    value = hashlib.sha1()
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = part.encode('utf-8')
+        value.update(part)
+        value.update(b'\0')
+    return value.hexdigest()
+
+
+def make_etag(content_digest, format):
+    """Returns the quoted strong ETag of a response of the `format` with a
+    content of `content_digest`."""
+    return '"%s-%s"' % (content_digest, format)
+
+
+def etag_matches(request, etag):
+    """Returns whether `etag` is one of the tags of the ``If-None-Match``
+    header of `request`. Weak tags match their strong tag, as the header is
+    compared weakly."""
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(',')]
+    return '*' in tags or any((tag[2:] if tag.startswith('W/') else tag) == etag for tag in tags)
+
+
+def modified_since(request, timestamp):
+    """Returns whether data last modified at `timestamp` may be newer than
+    the ``If-Modified-Since`` header of `request`."""
+    since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return since is None or timestamp is None or int(timestamp) > since
+
+
+def normalized_query(request):
+    """Returns the query string of `request` with its parameters sorted by
+    name, keeping the order of the values of each parameter."""
+    return urlencode(sorted(request.GET.lists()), doseq=True)
+
+
+def get_http_cache():
+    """Returns the dictionary of ``settings.SLICER_HTTP_CACHE``, or ``None``
+    when conditional results are disabled."""
+    config = getattr(settings, 'SLICER_HTTP_CACHE', None)
+    if config is None:
+        return None
+    config = dict(config)
+    config.setdefault('cache_control', DEFAULT_CACHE_CONTROL)
+    return config
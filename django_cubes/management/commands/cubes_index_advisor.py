@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import io
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from cubes.workspace import Workspace
+
+from django_cubes.backends.django_orm.advisor import IndexAdvisor, shapes_from_urls
+from django_cubes.backends.django_orm.browser import DjangoBrowser
+from django_cubes.querylog import entry_url, read_query_log
+
+
+class Command(BaseCommand):
+    help = (
+        "Proposes composite indexes for the fact models of django backed cubes, "
+        "based on the cube model and on recorded slicer requests."
+    )
+    args = '[cube_name cube_name ...]'
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--config', dest='config', default=None,
+            help='Slicer configuration file. Defaults to settings.SLICER_CONFIG_FILE'
+        ),
+        make_option(
+            '--queries', dest='queries', default=None,
+            help='Query log recorded with settings.SLICER_QUERY_LOG, or a file with one request URL per line'
+        ),
+        make_option(
+            '--max-columns', dest='max_columns', type='int', default=4,
+            help='Maximum number of columns of a proposed index'
+        ),
+        make_option(
+            '--migration', action='store_true', dest='migration', default=False,
+            help='Write a migration creating the proposed indexes in the app of each fact model'
+        ),
+    )
+
+    def handle(self, *cube_names, **options):
+        try:
+            config = options['config'] or settings.SLICER_CONFIG_FILE
+            cubes_root = settings.SLICER_MODELS_DIR
+        except AttributeError:
+            raise CommandError('settings.SLICER_CONFIG_FILE and settings.SLICER_MODELS_DIR are not set.')
+
+        workspace = Workspace(config=config, cubes_root=cubes_root)
+        cube_names = cube_names or [cube['name'] for cube in workspace.list_cubes()]
+
+        urls = []
+        if options['queries']:
+            urls = [entry_url(entry) for entry in read_query_log(options['queries'])]
+
+        for cube_name in cube_names:
+            browser = workspace.browser(cube_name)
+            if not isinstance(browser, DjangoBrowser):
+                self.stderr.write("Skipping cube '%s': not served by the django backend" % cube_name)
+                continue
+
+            advisor = IndexAdvisor(browser, max_columns=options['max_columns'])
+            shapes = shapes_from_urls(workspace, browser.cube, urls)
+            proposals = advisor.propose(shapes)
+
+            self.stdout.write("-- cube %s (%d recorded queries)" % (cube_name, len(shapes)))
+            for proposal in proposals:
+                self.stdout.write("-- serves %d queries" % proposal.hits)
+                self.stdout.write("%s;" % advisor.create_sql(proposal))
+
+            if options['migration'] and proposals:
+                path = self.write_migration(advisor, proposals)
+                self.stdout.write("-- migration written to %s" % path)
+
+    def write_migration(self, advisor, proposals):
+        try:
+            from django.db import migrations
+            from django.db.migrations.autodetector import MigrationAutodetector
+            from django.db.migrations.loader import MigrationLoader
+            from django.db.migrations.writer import MigrationWriter
+        except ImportError:
+            raise CommandError("Migrations require Django 1.7 or later, apply the printed SQL instead")
+
+        app_label = advisor.model._meta.app_label
+        loader = MigrationLoader(None, ignore_no_migrations=True)
+        if app_label not in loader.migrated_apps:
+            raise CommandError(
+                "App '%s' has no migrations, apply the printed SQL instead" % app_label
+            )
+
+        leaves = loader.graph.leaf_nodes(app_label)
+        number = max([MigrationAutodetector.parse_number(name) or 0 for _, name in leaves] or [0]) + 1
+
+        migration = migrations.Migration('%04d_cubes_indexes' % number, app_label)
+        migration.dependencies = leaves
+        migration.operations = [
+            migrations.RunSQL(advisor.create_sql(proposal), advisor.drop_sql(proposal))
+            for proposal in proposals
+        ]
+
+        writer = MigrationWriter(migration)
+        with io.open(writer.path, 'wb') as handle:
+            handle.write(writer.as_string())
+        return writer.path
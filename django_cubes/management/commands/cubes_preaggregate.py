@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from cubes.browser import Cell, cuts_from_string
+from cubes.workspace import Workspace
+
+from django_cubes.backends.django_orm.browser import DjangoBrowser
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills the pre-aggregate tables of sketches of django backed cubes, "
+        "used by the approx_count_distinct and approx_percentile aggregates."
+    )
+    args = '[cube_name cube_name ...]'
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--config', dest='config', default=None,
+            help='Slicer configuration file. Defaults to settings.SLICER_CONFIG_FILE'
+        ),
+        make_option(
+            '--cut', dest='cut', default=None,
+            help='Only read the facts of this cell, like the cut of a slicer request'
+        ),
+        make_option(
+            '--merge', action='store_true', dest='merge', default=False,
+            help='Merge the sketches into the existing rows instead of replacing the tables, '
+                 'like when adding the facts of a new partition'
+        ),
+    )
+
+    def handle(self, *cube_names, **options):
+        try:
+            config = options['config'] or settings.SLICER_CONFIG_FILE
+            cubes_root = settings.SLICER_MODELS_DIR
+        except AttributeError:
+            raise CommandError('settings.SLICER_CONFIG_FILE and settings.SLICER_MODELS_DIR are not set.')
+
+        workspace = Workspace(config=config, cubes_root=cubes_root)
+        cube_names = cube_names or [cube['name'] for cube in workspace.list_cubes()]
+
+        for cube_name in cube_names:
+            browser = workspace.browser(cube_name)
+            if not isinstance(browser, DjangoBrowser):
+                self.stderr.write("Skipping cube '%s': not served by the django backend" % cube_name)
+                continue
+
+            cell = Cell(browser.cube)
+            if options['cut']:
+                cell = Cell(browser.cube, cuts_from_string(browser.cube, options['cut']))
+
+            for preaggregate in browser.preaggregates:
+                count = preaggregate.build(cell, merge=options['merge'])
+                self.stdout.write("%s: %d rows written to %s" % (cube_name, count, preaggregate.class_name))
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from django_cubes.querylog import ClientSender, HttpSender, read_query_log, replay
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays a slicer query log, in process or against a running instance, "
+        "and reports throughput, latency percentiles and error rate."
+    )
+    args = '<query_log>'
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--concurrency', dest='concurrency', type='int', default=4,
+            help='Number of concurrent requests'
+        ),
+        make_option(
+            '--url', dest='url', default=None,
+            help='Base URL of the slicer to replay against. Requests are sent '
+                 'to this Django instance in process when not given'
+        ),
+        make_option(
+            '--auth', dest='auth', default=None,
+            help='username:password used for basic authentication with --url'
+        ),
+        make_option(
+            '--user', dest='user', default=None,
+            help='Replay every request as this user instead of the recorded one (in process only)'
+        ),
+        make_option(
+            '--limit', dest='limit', type='int', default=None,
+            help='Replay only the first LIMIT requests'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError("Usage: cubes_replay %s" % self.args)
+
+        entries = list(read_query_log(args[0]))
+        if options['limit']:
+            entries = entries[:options['limit']]
+
+        if options['url']:
+            auth = tuple(options['auth'].split(':', 1)) if options['auth'] else None
+            send = HttpSender(options['url'], auth=auth)
+        else:
+            send = ClientSender(entries, user=options['user'])
+
+        stats = replay(entries, send, concurrency=options['concurrency'])
+
+        self.stdout.write("requests:    %d in %.2f s" % (stats.requests, stats.duration))
+        self.stdout.write("throughput:  %.1f requests/s" % stats.throughput)
+        self.stdout.write("errors:      %d (%.1f%%)" % (stats.errors, stats.error_rate * 100))
+        for percent in (50, 90, 95, 99, 100):
+            latency = stats.percentile(percent)
+            if latency is not None:
+                self.stdout.write("p%-3d         %.1f ms" % (percent, latency * 1000))
+        for status, count in sorted(stats.statuses.items(), key=lambda item: str(item[0])):
+            self.stdout.write("status %s:  %d" % (status, count))
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from django_cubes.querylog import ClientSender, HttpSender, read_query_log, replay
+from django_cubes.warmup import top_entries, warm_up
+
+
+class Command(BaseCommand):
+    help = (
+        "Warms up a slicer before traffic is switched to it: builds the models and browsers "
+        "of the cubes and replays the most frequent requests of a query log."
+    )
+    args = '[query_log]'
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--top', dest='top', type='int', default=100,
+            help='Number of most frequent requests of the query log to replay'
+        ),
+        make_option(
+            '--concurrency', dest='concurrency', type='int', default=4,
+            help='Number of concurrent requests'
+        ),
+        make_option(
+            '--url', dest='url', default=None,
+            help='Base URL of the slicer to warm up. Requests are sent to this Django instance '
+                 'in process when not given, which only warms up the database and the shared caches'
+        ),
+        make_option(
+            '--auth', dest='auth', default=None,
+            help='username:password used for basic authentication with --url'
+        ),
+        make_option(
+            '--user', dest='user', default=None,
+            help='Replay every request as this user instead of the recorded one (in process only)'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) > 1:
+            raise CommandError("Usage: cubes_warmup %s" % self.args)
+
+        if not options['url']:
+            names = warm_up()
+            self.stdout.write("cubes:       %d warmed up" % len(names))
+
+        if not args:
+            return
+
+        entries = top_entries(read_query_log(args[0]), options['top'])
+        if options['url']:
+            auth = tuple(options['auth'].split(':', 1)) if options['auth'] else None
+            send = HttpSender(options['url'], auth=auth)
+        else:
+            send = ClientSender(entries, user=options['user'])
+
+        stats = replay(entries, send, concurrency=options['concurrency'])
+
+        self.stdout.write("requests:    %d in %.2f s" % (stats.requests, stats.duration))
+        self.stdout.write("errors:      %d (%.1f%%)" % (stats.errors, stats.error_rate * 100))
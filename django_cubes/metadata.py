@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Precomputed metadata of the cubes of a workspace.
+
+The list of the cubes and the model of each cube, with the features of its
+browser, only change with the model files. `ModelCache` computes them once
+per workspace: the model of a cube is kept for each hierarchy limits of the
+authorizer, together with the digest of its JSON used for the ETags of the
+``/model/`` responses. Authorization itself is checked on each request.
+
+Browsers are built once per cube as well, with their mapper and the
+models of their backend, and their features are computed once. A browser
+is kept for the cube object it was built for, so a cube loaded again by the
+workspace gets a new browser, and a new workspace gets a new `ModelCache`.
+Browsers are shared by the requests of the workspace and must not keep
+state between queries: the Django browser keeps the databases of the
+queries of each thread apart, see `DjangoBrowser.reading()`.
+
+The models of all the cubes are computed when the workspace is created,
+unless ``settings.SLICER_PRELOAD_MODELS`` is ``False``.
+"""
+import json
+import logging
+from threading import Lock
+
+from rest_framework.utils import encoders
+
+from .conditional import digest
+
+__all__ = ['ModelCache', 'get_model_cache']
+
+
+def json_digest(value):
+    """Returns the digest of the JSON of `value`, independent of the order
+    of the dictionary keys."""
+    return digest(json.dumps(value, sort_keys=True, cls=encoders.JSONEncoder))
+
+
+class ModelCache(object):
+    """Cubes, models and cube list of `workspace`, computed once."""
+
+    def __init__(self, workspace):
+        self.workspace = workspace
+        self.lock = Lock()
+        self.cubes = {}
+        self.models = {}
+        self.browsers = {}
+        self.cube_list = None
+
+    def cube(self, name):
+        """Returns the cube `name`, without authorizing it. Raises
+        `NoSuchCubeError` if there is no such cube."""
+        cube = self.cubes.get(name)
+        if cube is None:
+            cube = self.workspace.cube(name)
+            with self.lock:
+                cube = self.cubes.setdefault(name, cube)
+        return cube
+
+    def browser(self, cube):
+        """Returns the browser of `cube`, built once per cube."""
+        entry = self.browsers.get(cube.name)
+        if entry is None or entry[0] is not cube:
+            browser = self.workspace.browser(cube)
+            with self.lock:
+                entry = self.browsers.get(cube.name)
+                if entry is None or entry[0] is not cube:
+                    entry = self.browsers[cube.name] = (cube, browser, browser.features())
+        return entry[1]
+
+    def features(self, browser):
+        """Returns the features of `browser`, computed once for the browsers
+        returned by `browser()`."""
+        entry = self.browsers.get(browser.cube.name)
+        if entry is not None and entry[1] is browser:
+            return entry[2]
+        return browser.features()
+
+    def list_cubes(self):
+        """Returns the list of the metadata of all the cubes, as
+        `Workspace.list_cubes()`, with the digest of its JSON."""
+        if self.cube_list is None:
+            cube_list = self.workspace.namespace.list_cubes(recursive=True)
+            self.cube_list = (cube_list, json_digest(cube_list))
+        return self.cube_list
+
+    def model(self, name, hierarchy_limits=None):
+        """Returns the model dictionary of the cube `name` with its
+        `features`, limited to `hierarchy_limits`, and the digest of its
+        JSON."""
+        key = (name, json.dumps(hierarchy_limits, sort_keys=True, default=str))
+        model = self.models.get(key)
+        if model is None:
+            cube = self.cube(name)
+            data = cube.to_dict(
+                expand_dimensions=True,
+                with_mappings=False,
+                full_attribute_names=True,
+                create_label=True,
+                hierarchy_limits=hierarchy_limits
+            )
+            data["features"] = self.features(self.browser(cube))
+            with self.lock:
+                model = self.models.setdefault(key, (data, json_digest(data)))
+        return model
+
+    def preload(self):
+        """Computes the list of the cubes and the model of every cube without
+        hierarchy limits. Cubes that fail are logged and left to be computed
+        on their first request."""
+        cube_list, list_digest = self.list_cubes()
+        for item in cube_list:
+            try:
+                self.model(item["name"])
+            except Exception:
+                logging.exception("Could not preload the model of cube '%s'" % item["name"])
+
+
+def get_model_cache(workspace):
+    """Returns the `ModelCache` of `workspace`."""
+    cache = getattr(workspace, 'model_cache', None)
+    if cache is None:
+        cache = workspace.model_cache = ModelCache(workspace)
+    return cache
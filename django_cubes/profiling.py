@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+On-demand profiling of single slicer requests.
+
+A staff user adding ``profile=1`` to a request gets it run under `cProfile`
+and, when available (Python 3.4+), `tracemalloc`. The profile covers the
+request from right after authentication to the rendered response: workspace
+lookup, cut parsing, browser execution and rendering.
+
+If ``settings.SLICER_PROFILE_DIR`` is set the pstats dump is written there and
+its file name is returned in the ``X-Cubes-Profile`` header of the regular
+response. Otherwise the response is replaced by a plain text pstats report
+with the ``settings.SLICER_PROFILE_LIMIT`` (40 by default) most expensive
+functions.
+"""
+import cProfile
+import os
+import pstats
+import time
+
+from django.conf import settings
+from django.http import HttpResponse
+from six import StringIO
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+__all__ = ['RequestProfiler', 'profiling_requested']
+
+
+def profiling_requested(request):
+    """Returns `True` when `request` asks for a profile and its user is
+    allowed to get one."""
+    value = request.QUERY_PARAMS.get('profile')
+    return value not in (None, '', '0', 'false') and request.user.is_staff
+
+
+class RequestProfiler(object):
+    """Profiles the current thread between `start()` and `finish()`.
+
+    Note that tracemalloc traces the whole process, so the peak memory also
+    accounts for requests served concurrently by other threads."""
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.started_tracing = False
+
+    def start(self):
+        if tracemalloc is not None:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.started_tracing = True
+            elif hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+        peak = None
+        if tracemalloc is not None and tracemalloc.is_tracing():
+            peak = tracemalloc.get_traced_memory()[1]
+            if self.started_tracing:
+                tracemalloc.stop()
+        return peak
+
+    def finish(self, request, response):
+        """Renders `response`, stops profiling and returns either `response`
+        with the profile headers or a plain text profile report."""
+        try:
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+        finally:
+            peak = self.stop()
+
+        directory = getattr(settings, 'SLICER_PROFILE_DIR', None)
+        if directory:
+            name = '%d-%s.prof' % (time.time() * 1000, request.path.strip('/').replace('/', '-'))
+            self.profile.dump_stats(os.path.join(directory, name))
+            response['X-Cubes-Profile'] = name
+            if peak is not None:
+                response['X-Cubes-Profile-Peak-Memory'] = str(peak)
+            return response
+
+        stream = StringIO()
+        if peak is not None:
+            stream.write('Peak traced memory: %d bytes\n\n' % peak)
+        stats = pstats.Stats(self.profile, stream=stream)
+        stats.sort_stats('cumulative').print_stats(getattr(settings, 'SLICER_PROFILE_LIMIT', 40))
+        return HttpResponse(stream.getvalue(), content_type='text/plain; charset=utf-8')
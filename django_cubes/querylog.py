@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+Capture and replay of slicer requests.
+
+When ``settings.SLICER_QUERY_LOG`` is set to a file path every request served
+by the slicer views is appended to that file as one compact JSON line::
+
+    {"t":1413478123.1,"m":"GET","p":"/cube/sales/aggregate/","q":"drilldown=year","u":"jadice","s":200,"ms":12.3}
+
+``b`` holds the parsed body of ``POST`` requests (reports). The log can be
+replayed against a test instance with ``replay()`` or the ``cubes_replay``
+management command.
+"""
+import base64
+import io
+import json
+import logging
+import math
+import time
+from collections import OrderedDict, namedtuple
+from threading import Lock, Thread
+
+import six
+from six.moves import queue
+from six.moves.urllib.error import HTTPError
+from six.moves.urllib.parse import urlparse
+from six.moves.urllib.request import Request, urlopen
+
+from django.conf import settings
+
+__all__ = [
+    'QueryLog', 'get_query_log', 'read_query_log', 'entry_url',
+    'ClientSender', 'HttpSender', 'ReplayStats', 'replay',
+]
+
+
+class QueryLog(object):
+    """Appends slicer requests to the file at `path`. Safe to be shared by
+    threads; each entry is written with a single append."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = Lock()
+
+    def record(self, request, response, duration=None):
+        user = getattr(request, 'user', None)
+        entry = OrderedDict([
+            ('t', round(time.time(), 3)),
+            ('m', request.method),
+            ('p', request.path),
+            ('q', request.META.get('QUERY_STRING', '')),
+            ('u', user.get_username() if user is not None and user.is_authenticated() else None),
+            ('s', response.status_code),
+        ])
+        if duration is not None:
+            entry['ms'] = round(duration * 1000.0, 2)
+        if request.method == 'POST':
+            try:
+                entry['b'] = request.DATA
+            except Exception:
+                entry['b'] = None
+
+        line = json.dumps(entry, separators=(',', ':'), default=six.text_type)
+        with self.lock:
+            with io.open(self.path, 'a', encoding='utf-8') as handle:
+                handle.write(six.text_type(line) + u'\n')
+
+
+_query_logs = {}
+_query_logs_lock = Lock()
+
+
+def get_query_log():
+    """Returns the `QueryLog` configured by ``settings.SLICER_QUERY_LOG`` or
+    ``None`` when requests are not recorded."""
+    path = getattr(settings, 'SLICER_QUERY_LOG', None)
+    if not path:
+        return None
+
+    with _query_logs_lock:
+        if path not in _query_logs:
+            _query_logs[path] = QueryLog(path)
+        return _query_logs[path]
+
+
+def read_query_log(path):
+    """Yields the entries recorded in the query log at `path`. Lines that are
+    not JSON are taken as plain request URLs, so lists of URLs copied from an
+    access log can be used as well."""
+    with io.open(path, encoding='utf-8') as handle:
+        for line in handle:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('{'):
+                yield json.loads(line)
+            else:
+                url = urlparse(line)
+                yield {'m': 'GET', 'p': url.path, 'q': url.query}
+
+
+def entry_url(entry):
+    """Returns the path and the query string of a recorded entry."""
+    if entry.get('q'):
+        return '%s?%s' % (entry['p'], entry['q'])
+    return entry['p']
+
+
+class ClientSender(object):
+    """Sends recorded requests to the views of this Django instance, in
+    process. Requests are authenticated as the recorded user or as `user`
+    when given; users are looked up once, before the replay starts."""
+
+    def __init__(self, entries, user=None):
+        from django.contrib.auth import get_user_model
+        from rest_framework.test import APIRequestFactory
+
+        self.factory = APIRequestFactory()
+        User = get_user_model()
+
+        self.users = {}
+        for entry in entries:
+            username = user or entry.get('u')
+            if username and username not in self.users:
+                self.users[username] = User._default_manager.get_by_natural_key(username)
+        self.user = user
+
+    def __call__(self, entry):
+        from django.core.urlresolvers import resolve
+        from rest_framework.test import force_authenticate
+
+        if entry.get('m') == 'POST':
+            request = self.factory.post(entry_url(entry), entry.get('b') or {}, format='json')
+        else:
+            request = self.factory.get(entry_url(entry))
+
+        username = self.user or entry.get('u')
+        if username:
+            force_authenticate(request, user=self.users[username])
+
+        match = resolve(entry['p'])
+        response = match.func(request, *match.args, **match.kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response.status_code
+
+
+class HttpSender(object):
+    """Sends recorded requests over HTTP to `base_url`, for example a local
+    WSGI server. `auth` is an optional ``(username, password)`` tuple used for
+    basic authentication."""
+
+    def __init__(self, base_url, auth=None):
+        self.base_url = base_url.rstrip('/')
+        self.headers = {}
+        if auth:
+            token = ('%s:%s' % auth).encode('utf-8')
+            self.headers['Authorization'] = 'Basic %s' % base64.b64encode(token).decode('ascii')
+
+    def __call__(self, entry):
+        data = None
+        headers = dict(self.headers)
+        if entry.get('m') == 'POST':
+            data = json.dumps(entry.get('b') or {}).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+
+        request = Request(self.base_url + entry_url(entry), data=data, headers=headers)
+        try:
+            response = urlopen(request)
+            response.read()
+            return response.getcode()
+        except HTTPError as e:
+            return e.code
+
+
+class ReplayStats(namedtuple('ReplayStats', ['requests', 'errors', 'duration', 'latencies', 'statuses'])):
+    """Outcome of a replay. `latencies` are sorted, in seconds."""
+
+    @property
+    def throughput(self):
+        return self.requests / self.duration if self.duration else 0.0
+
+    @property
+    def error_rate(self):
+        return float(self.errors) / self.requests if self.requests else 0.0
+
+    def percentile(self, percent):
+        """Returns the latency percentile `percent` (0-100), nearest rank."""
+        if not self.latencies:
+            return None
+        index = int(math.ceil(percent / 100.0 * len(self.latencies))) - 1
+        return self.latencies[max(0, min(index, len(self.latencies) - 1))]
+
+
+def replay(entries, send, concurrency=1):
+    """Sends every entry with `send` from `concurrency` threads and returns
+    `ReplayStats`. `send` returns the status code of the response; responses
+    with a status of 400 or more and exceptions count as errors."""
+    tasks = queue.Queue()
+    for entry in entries:
+        tasks.put(entry)
+    count = tasks.qsize()
+
+    results = []
+    results_lock = Lock()
+
+    def worker():
+        from django.db import connections
+
+        try:
+            while True:
+                try:
+                    entry = tasks.get_nowait()
+                except queue.Empty:
+                    return
+
+                start = time.time()
+                try:
+                    status = send(entry)
+                except Exception:
+                    logging.exception("Replay of %s failed" % entry_url(entry))
+                    status = None
+                latency = time.time() - start
+
+                with results_lock:
+                    results.append((latency, status))
+        finally:
+            for connection in connections.all():
+                connection.close()
+
+    threads = [Thread(target=worker) for _ in range(max(1, concurrency))]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.time() - start
+
+    statuses = {}
+    for _, status in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    errors = sum(1 for _, status in results if status is None or status >= 400)
+
+    return ReplayStats(count, errors, duration, sorted(latency for latency, _ in results), statuses)
@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+"""
+Renderers for aggregation, facts and members results.
+
+Cube results are mostly long lists of rows sharing the same keys, holding
+numbers, strings, dates and the `Decimal` values returned by ``Sum`` and
+``Avg``. The renderers here encode such rows directly into a buffer, with the
+row keys encoded once per result, and fall back to DRF's encoder for anything
+else.
+
+Results can be rendered as JSON (``format=json``, the default), as JSON with
+one array per column (``format=columnar``), as CSV (``format=csv``) and as
+JSON lines, one row per line (``format=jsonl``). Renderers with the
+`columnar` flag expect the view to provide columnar data, see
+`django_cubes.columnar`.
+
+Rows kept as tuples with a shared header, like the Django browser `Rows`, are
+encoded from the tuples without building dictionaries.
+"""
+import csv
+import datetime
+import decimal
+import json
+
+import six
+from six.moves import zip
+from django.http.multipartparser import parse_header
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils import encoders
+
+from cubes.browser import Facts
+
+__all__ = [
+    'CubesJSONRenderer', 'ColumnarJSONRenderer', 'CubesCSVRenderer', 'CubesJSONLinesRenderer',
+    'ResultEncoder', 'result_rows',
+]
+
+encode_string = json.encoder.encode_basestring_ascii
+
+
+def encode_float(value):
+    if value != value:
+        return 'NaN'
+    if value in (float('inf'), float('-inf')):
+        return 'Infinity' if value > 0 else '-Infinity'
+    return repr(value)
+
+
+def encode_datetime(value):
+    # Same representation as DRF's JSONEncoder
+    representation = value.isoformat()
+    if value.microsecond:
+        representation = representation[:23] + representation[26:]
+    if representation.endswith('+00:00'):
+        representation = representation[:-6] + 'Z'
+    return encode_string(representation)
+
+
+def encode_decimal(value):
+    return encode_float(float(value))
+
+
+if isinstance(encoders.JSONEncoder().default(decimal.Decimal('1')), six.string_types):
+    # DRF before 3.0 encodes decimals as strings
+    def encode_decimal(value):  # NOQA
+        return encode_string(str(value))
+
+
+SCALAR_ENCODERS = {
+    type(None): lambda value: 'null',
+    bool: lambda value: 'true' if value else 'false',
+    float: encode_float,
+    decimal.Decimal: encode_decimal,
+    datetime.datetime: encode_datetime,
+    datetime.date: lambda value: encode_string(value.isoformat()),
+}
+for _type in six.integer_types:
+    SCALAR_ENCODERS[_type] = str
+for _type in (six.text_type, str):
+    SCALAR_ENCODERS[_type] = encode_string
+
+
+class ResultEncoder(object):
+    """Writes the JSON representation of a value into a list of strings.
+
+    Lists of dictionaries are written as rows: the keys of the first
+    dictionary are encoded once and reused for every following dictionary
+    with the same keys.
+    """
+
+    def __init__(self):
+        self.fallback = encoders.JSONEncoder()
+
+    def encode(self, value):
+        buffer = []
+        self.write(value, buffer.append)
+        return ''.join(buffer)
+
+    def write(self, value, write):
+        encode = SCALAR_ENCODERS.get(type(value))
+        if encode is not None:
+            write(encode(value))
+        elif isinstance(value, dict):
+            self.write_dict(value, write)
+        elif isinstance(value, (list, tuple)):
+            self.write_list(value, write)
+        elif isinstance(value, Facts):
+            self.write(value.facts, write)
+        elif hasattr(value, 'header') and hasattr(value, 'rows'):
+            self.write_table(value.header, value.rows, write)
+        elif isinstance(value, six.string_types):
+            write(encode_string(value))
+        elif isinstance(value, six.integer_types):
+            write(str(int(value)))
+        elif isinstance(value, float):
+            write(encode_float(float(value)))
+        else:
+            self.write(self.fallback.default(value), write)
+
+    def write_dict(self, value, write):
+        separator = '{'
+        for key, item in value.items():
+            write(separator)
+            write(encode_string(key if isinstance(key, six.string_types) else six.text_type(key)))
+            write(':')
+            self.write(item, write)
+            separator = ','
+        write('}' if separator == ',' else '{}')
+
+    def write_list(self, value, write):
+        if not value:
+            write('[]')
+            return
+        if isinstance(value[0], dict):
+            self.write_rows(value, write)
+            return
+
+        separator = '['
+        for item in value:
+            write(separator)
+            self.write(item, write)
+            separator = ','
+        write(']')
+
+    def write_rows(self, rows, write):
+        keys = list(rows[0].keys())
+        prefixes = [',%s:' % encode_string(key) for key in keys]
+        if prefixes:
+            prefixes[0] = '{' + prefixes[0][1:]
+
+        separator = '['
+        for row in rows:
+            write(separator)
+            separator = ','
+            if not isinstance(row, dict) or len(row) != len(keys) or not all(key in row for key in keys):
+                self.write(row, write)
+                continue
+            for prefix, key in zip(prefixes, keys):
+                write(prefix)
+                value = row[key]
+                encode = SCALAR_ENCODERS.get(type(value))
+                if encode is not None:
+                    write(encode(value))
+                else:
+                    self.write(value, write)
+            write('}' if keys else '{}')
+        write(']')
+
+    def write_table(self, header, rows, write):
+        """Writes `rows`, sequences of values in the `header` order, as a
+        list of objects."""
+        prefixes = [',%s:' % encode_string(name) for name in header]
+        if prefixes:
+            prefixes[0] = '{' + prefixes[0][1:]
+        end = '}' if prefixes else '{}'
+
+        separator = '['
+        for row in rows:
+            write(separator)
+            separator = ','
+            for prefix, value in zip(prefixes, row):
+                write(prefix)
+                encode = SCALAR_ENCODERS.get(type(value))
+                if encode is not None:
+                    write(encode(value))
+                else:
+                    self.write(value, write)
+            write(end)
+        write('[]' if separator == '[' else ']')
+
+
+class CubesJSONRenderer(JSONRenderer):
+    """Renders cube results to compact JSON with `ResultEncoder`. Indented
+    output, as requested by the browsable API, is left to DRF."""
+
+    def indent(self, accepted_media_type, renderer_context):
+        """Returns the indent given by the ``indent`` parameter of the media
+        type or by the renderer context, like the browsable API does."""
+        indent = renderer_context.get('indent')
+        if accepted_media_type:
+            params = parse_header(accepted_media_type.encode('ascii'))[1]
+            try:
+                indent = max(min(int(params['indent']), 8), 0) or None
+            except (KeyError, ValueError, TypeError):
+                pass
+        return indent
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return bytes()
+        if self.indent(accepted_media_type, renderer_context or {}) is not None:
+            return super(CubesJSONRenderer, self).render(data, accepted_media_type, renderer_context)
+        return ResultEncoder().encode(data).encode('ascii')
+
+
+class ColumnarJSONRenderer(CubesJSONRenderer):
+    """JSON renderer selected by ``format=columnar``. Views rendered by it
+    return their rows as one array per column, see `django_cubes.columnar`."""
+    format = 'columnar'
+    columnar = True
+
+
+def result_rows(data):
+    """Returns a tuple (`header`, `rows`) with the rows of a rendered cube
+    result, `rows` being sequences of values in the `header` order."""
+    if isinstance(data, dict):
+        if 'columns' in data:
+            return data['header'], zip(*data['columns'])
+        rows = data.get('cells', data.get('data'))
+    else:
+        rows = data
+
+    rows = getattr(rows, 'facts', rows)
+    if hasattr(rows, 'header') and hasattr(rows, 'rows'):
+        return rows.header, rows.rows
+    rows = list(rows or [])
+
+    if not rows:
+        return [], []
+
+    header = list(rows[0].keys())
+    if isinstance(data, dict) and data.get('aggregates'):
+        aggregates = [name for name in data['aggregates'] if name in rows[0]]
+        header = sorted(name for name in header if name not in aggregates) + aggregates
+    return header, ([row.get(name) for name in header] for row in rows)
+
+
+def csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        return repr(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if six.PY2 and isinstance(value, six.text_type):
+        return value.encode('utf-8')
+    return value
+
+
+class CubesCSVRenderer(BaseRenderer):
+    """Renders the rows of cube results as CSV with a header line. Summaries
+    and other metadata are left out."""
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+    columnar = True
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return bytes()
+
+        header, rows = result_rows(data)
+        stream = six.BytesIO() if six.PY2 else six.StringIO()
+        writer = csv.writer(stream)
+        writer.writerow([csv_value(name) for name in header])
+        for row in rows:
+            writer.writerow([csv_value(value) for value in row])
+
+        output = stream.getvalue()
+        return output if six.PY2 else output.encode(self.charset)
+
+
+class CubesJSONLinesRenderer(BaseRenderer):
+    """Renders the rows of cube results as JSON lines, one object per row.
+    Summaries and other metadata are left out."""
+    media_type = 'application/x-ndjson'
+    format = 'jsonl'
+    charset = None
+    columnar = True
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return bytes()
+
+        header, rows = result_rows(data)
+        encoder = ResultEncoder()
+        prefixes = ['%s%s:' % ('{' if index == 0 else ',', encode_string(name)) for index, name in enumerate(header)]
+
+        buffer = []
+        write = buffer.append
+        for row in rows:
+            for prefix, value in zip(prefixes, row):
+                write(prefix)
+                encoder.write(value, write)
+            write('}\n' if prefixes else '{}\n')
+        return ''.join(buffer).encode('ascii')
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Server-sent events of progressive aggregation results.
+
+The ``/aggregate/stream/`` endpoint aggregates the facts in parts, see
+`DjangoBrowser.aggregate_parts()`, and sends an event after each part:
+
+* ``partial`` with the result of the parts aggregated so far and its
+  ``progress``, ``{"parts": 3, "total": 10}``;
+* ``complete`` with the result of all the parts, instead of the last
+  ``partial``;
+* ``error`` with the ``detail`` of an error that stopped the aggregation, or
+  of an error of the request.
+
+Closing the connection stops the aggregation before the next part, as the
+server then closes the iterator of the events.
+"""
+import logging
+
+from rest_framework.renderers import BaseRenderer
+
+from cubes.errors import CubesError
+
+from .renderers import ResultEncoder
+
+__all__ = ['ServerSentEventsRenderer', 'aggregation_events', 'server_sent_event']
+
+
+def server_sent_event(event, data):
+    """Returns the text of the event named `event` with the JSON of
+    `data`."""
+    return 'event: %s\ndata: %s\n\n' % (event, ResultEncoder().encode(data))
+
+
+def aggregation_events(results, release=None):
+    """Yields the server-sent events of an iterator of partial
+    `AggregationResult` objects having a `progress` tuple. `release` is
+    called once the events are sent or their iteration is closed, to release
+    the admission slot of the request."""
+    try:
+        for result in results:
+            parts, total = result.progress
+            data = result.to_dict()
+            data['progress'] = {'parts': parts, 'total': total}
+            yield server_sent_event('complete' if parts == total else 'partial', data)
+    except CubesError as error:
+        logging.error(str(error))
+        yield server_sent_event('error', {'detail': str(error)})
+    finally:
+        if release is not None:
+            release()
+
+
+class ServerSentEventsRenderer(BaseRenderer):
+    """Renders the responses of the streaming views that are not streamed,
+    like errors, as a single event."""
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get('response')
+        event = 'error' if response is not None and response.status_code >= 400 else 'complete'
+        return server_sent_event(event, data).encode(self.charset)
@@ -1,4 +1,25 @@
 # -*- coding: utf-8 -*-
 
+from .test_admission import *  # NOQA
 from .test_api import *  # NOQA
+from .test_authorization import *  # NOQA
+from .test_columnar import *  # NOQA
+from .test_conditional import *  # NOQA
+from .test_databases import *  # NOQA
+from .test_imports import *  # NOQA
+from .test_index_advisor import *  # NOQA
+from .test_metadata import *  # NOQA
+from .test_profiling import *  # NOQA
+from .test_parallel import *  # NOQA
+from .test_partitions import *  # NOQA
+from .test_predicates import *  # NOQA
+from .test_querylog import *  # NOQA
+from .test_renderers import *  # NOQA
+from .test_sampling import *  # NOQA
+from .test_shards import *  # NOQA
+from .test_sketches import *  # NOQA
+from .test_sqlcache import *  # NOQA
+from .test_streaming import *  # NOQA
+from .test_timeouts import *  # NOQA
+from .test_warmup import *  # NOQA
 from .validate_django_orm_backend import *  # NOQA
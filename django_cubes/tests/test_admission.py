@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+from mock import Mock
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+from rest_framework.exceptions import ParseError, Throttled
+
+from django_cubes.admission import AdmissionController
+from django_cubes.backends.django_orm.cost import QueryCost
+
+from .test_api import BaseCubesAPITest, load_json
+
+__all__ = ['AdmissionControllerTest', 'AdmissionAPITest']
+
+
+class AdmissionControllerTest(SimpleTestCase):
+
+    def setUp(self):
+        super(AdmissionControllerTest, self).setUp()
+        self.user = Mock(pk=1)
+        self.user.is_authenticated.return_value = True
+        self.browser = Mock()
+        self.browser.estimate_cost.return_value = QueryCost(rows=1000, cells=500)
+        self.drilldown = ['item']
+
+    def test_concurrency_limit(self):
+        admission = AdmissionController(max_concurrent=1)
+        key = admission.acquire(self.user)
+        self.assertRaises(Throttled, admission.acquire, self.user)
+        admission.release(key)
+        admission.release(admission.acquire(self.user))
+
+    def test_cheap_aggregation_is_admitted(self):
+        admission = AdmissionController(max_rows=1000, max_cells=500)
+        self.assertEquals(
+            admission.admit_aggregation(self.user, self.browser, None, self.drilldown, None, None),
+            (None, None, False)
+        )
+
+    def test_too_many_rows_are_rejected(self):
+        admission = AdmissionController(max_rows=999)
+        self.assertRaises(
+            ParseError, admission.admit_aggregation, self.user, self.browser, None, self.drilldown, None, None
+        )
+
+    def test_too_many_cells_are_paginated(self):
+        admission = AdmissionController(max_cells=100, page_size=50)
+        self.assertEquals(
+            admission.admit_aggregation(self.user, self.browser, None, self.drilldown, None, None),
+            (1, 50, True)
+        )
+        self.assertEquals(
+            admission.admit_aggregation(self.user, self.browser, None, self.drilldown, 3, 20),
+            (3, 20, False)
+        )
+
+    def test_too_many_cells_are_rejected(self):
+        admission = AdmissionController(max_cells=100, policy='reject')
+        self.assertRaises(
+            ParseError, admission.admit_aggregation, self.user, self.browser, None, self.drilldown, None, None
+        )
+
+    def test_rows_per_minute_budget(self):
+        admission = AdmissionController(max_rows_per_minute=2500)
+        admission.admit_aggregation(self.user, self.browser, None, self.drilldown, None, None)
+        admission.admit_aggregation(self.user, self.browser, None, self.drilldown, None, None)
+        self.assertRaises(
+            Throttled, admission.admit_aggregation, self.user, self.browser, None, self.drilldown, None, None
+        )
+
+    def test_rejected_aggregations_are_not_charged(self):
+        admission = AdmissionController(max_rows_per_minute=1000, max_cells=100, policy='reject')
+        self.assertRaises(
+            ParseError, admission.admit_aggregation, self.user, self.browser, None, self.drilldown, None, None
+        )
+        self.assertEquals(
+            admission.admit_aggregation(self.user, self.browser, None, [], None, None), (None, None, False)
+        )
+
+
+class AdmissionAPITest(BaseCubesAPITest):
+    url_name = 'cube_aggregation'
+    url_args = {'cube_name': 'irbd_balance'}
+    method = 'get'
+
+    @override_settings(SLICER_ADMISSION={'max_concurrent': 0})
+    def test_requests_over_the_concurrency_limit_are_throttled(self):
+        self.login()
+        response = self.make_request()
+        self.assertEquals(response.status_code, 429)
+        self.assertEquals(
+            load_json(response.content),
+            {'detail': 'Too many concurrent requests, at most 0 are allowed'}
+        )
+
+    @override_settings(SLICER_ADMISSION={'max_concurrent': 1})
+    def test_slots_are_released(self):
+        self.login()
+        self.assertEquals(self.make_request().status_code, 200)
+        self.assertEquals(self.make_request().status_code, 200)
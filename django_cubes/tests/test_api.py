@@ -5,8 +5,11 @@ from django.test import TransactionTestCase
 from django.contrib.auth import get_user_model
 
 from cubes.backends.sql.browser import SnowflakeBrowser, available_aggregate_functions, available_calculators
+from cubes.errors import ArgumentError
 from rest_framework.reverse import reverse
 
+from django_cubes import api
+
 User = get_user_model()
 
 __all__ = [
@@ -31,6 +34,10 @@ class BaseCubesAPITest(TransactionTestCase):
 
     def setUp(self):
         super(BaseCubesAPITest, self).setUp()
+        # Browsers and their features are cached by the workspace of the
+        # thread, tests patching them need a new one
+        if hasattr(api.data, 'workspace'):
+            del api.data.workspace
         self.username = 'jadice'
         self.password = 'teste'
         self.user = User.objects.create(
@@ -542,6 +549,13 @@ class CubeAggregationAPI(BaseCubesAPITest):
             'total_cell_count': 3
         })
 
+    @patch.object(SnowflakeBrowser, 'aggregate', Mock(side_effect=ArgumentError('Sampling is not supported')))
+    def test_invalid_arguments(self):
+        self.login()
+        response = self.make_request()
+        self.assertEquals(response.status_code, 400)
+        self.assertEquals(load_json(response.content), {'detail': 'Sampling is not supported'})
+
 
 class CubeCellAPI(BaseCubesAPITest):
     url_name = 'cube_cell'
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+from mock import Mock, patch
+from cubes import Cell, PointCut, Workspace
+from cubes.auth import Authorizer
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from django_cubes import api
+from django_cubes.authorization import AuthorizationCache, get_authorization_cache
+
+from example.hello_world.models import IrbdBalance
+
+from .test_api import BaseCubesAPITest, load_json
+
+__all__ = ['AuthorizationCacheTest', 'CachedAuthorizationAPI']
+
+
+class RestrictingAuthorizer(Authorizer):
+
+    def authorize(self, token, cubes):
+        return [cube for cube in cubes if cube != 'denied']
+
+    def restricted_cell(self, token, cube, cell=None):
+        restriction = Cell(cube, [PointCut('year', ['2010'], hidden=True)])
+        return cell & restriction if cell else restriction
+
+    def hierarchy_limits(self, token, cube):
+        return [('item', 'default', 'category')]
+
+
+class AuthorizationCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        super(AuthorizationCacheTest, self).setUp()
+        self.workspace = Workspace(config=settings.SLICER_CONFIG_FILE, cubes_root=settings.SLICER_MODELS_DIR)
+        self.workspace.authorizer = RestrictingAuthorizer()
+        self.cube = self.workspace.cube('irbd_balance')
+        self.cache = AuthorizationCache(self.workspace, ttl=60)
+
+    def test_answers_are_cached_per_user(self):
+        with patch.object(RestrictingAuthorizer, 'authorize', autospec=True,
+                          side_effect=RestrictingAuthorizer.authorize) as authorize:
+            self.assertEquals(self.cache.authorize('jadice', ['irbd_balance', 'denied']), ['irbd_balance'])
+            self.assertEquals(self.cache.authorize('jadice', ['denied', 'irbd_balance']), ['irbd_balance'])
+            self.assertEquals(authorize.call_count, 1)
+            self.cache.authorize('other', ['irbd_balance'])
+            self.assertEquals(authorize.call_count, 2)
+
+        with patch.object(RestrictingAuthorizer, 'hierarchy_limits', return_value=[]) as hierarchy_limits:
+            self.assertEquals(self.cache.hierarchy_limits('jadice', 'irbd_balance'), [])
+            self.assertEquals(self.cache.hierarchy_limits('jadice', 'irbd_balance'), [])
+            self.assertEquals(hierarchy_limits.call_count, 1)
+
+    def test_restricted_cell_is_unchanged(self):
+        authorizer = self.workspace.authorizer
+        cell = Cell(self.cube, [PointCut('item', ['a'])])
+        with patch.object(RestrictingAuthorizer, 'restricted_cell', autospec=True,
+                          side_effect=RestrictingAuthorizer.restricted_cell) as restricted_cell:
+            for _ in range(2):
+                self.assertEquals(
+                    self.cache.restricted_cell('jadice', self.cube, cell).to_str(),
+                    authorizer.restricted_cell('jadice', self.cube, cell).to_str()
+                )
+                self.assertEquals(self.cache.restricted_cell('jadice', self.cube).to_str(), 'year:2010')
+            # Once by the cache, twice by the comparison
+            self.assertEquals(restricted_cell.call_count, 3)
+        self.assertEquals(cell.to_str(), 'item:a')
+
+    def test_invalidation(self):
+        self.cache.hierarchy_limits('jadice', 'irbd_balance')
+        self.assertTrue(self.cache.entries)
+        self.cache.invalidate()
+        self.assertFalse(self.cache.entries)
+
+        self.cache.hierarchy_limits('jadice', 'irbd_balance')
+        self.workspace.authorizer = RestrictingAuthorizer()
+        self.cache.authorize('jadice', ['irbd_balance'])
+        self.assertEquals(list(self.cache.entries), [('authorize', 'jadice', 'irbd_balance')])
+
+        self.workspace.authorizer.rights_version = Mock(return_value=1)
+        self.cache.authorize('jadice', ['irbd_balance'])
+        self.assertEquals(self.cache.authorize('jadice', ['irbd_balance']), ['irbd_balance'])
+        self.workspace.authorizer.rights_version.return_value = 2
+        self.cache.hierarchy_limits('jadice', 'irbd_balance')
+        self.assertEquals(list(self.cache.entries), [('hierarchy_limits', 'jadice', 'irbd_balance')])
+
+    def test_expiration(self):
+        cache = AuthorizationCache(self.workspace, ttl=0)
+        with patch.object(RestrictingAuthorizer, 'hierarchy_limits', return_value=[]) as hierarchy_limits:
+            cache.hierarchy_limits('jadice', 'irbd_balance')
+            cache.hierarchy_limits('jadice', 'irbd_balance')
+        self.assertEquals(hierarchy_limits.call_count, 2)
+        self.assertEquals(cache.authorize('jadice', ['irbd_balance', 'denied']), ['irbd_balance'])
+
+        with patch('django_cubes.authorization.time.time', return_value=0):
+            self.cache.hierarchy_limits('jadice', 'irbd_balance')
+        self.assertIsNone(self.cache._get(('hierarchy_limits', 'jadice', 'irbd_balance')))
+        self.assertFalse(self.cache.entries)
+
+        self.workspace.authorizer = None
+        self.assertEquals(self.cache.authorize('jadice', ['denied']), ['denied'])
+        self.assertIsNone(self.cache.restricted_cell('jadice', self.cube))
+
+    def test_size_is_bounded(self):
+        cache = AuthorizationCache(self.workspace, ttl=60, max_size=2)
+        cache.authorize('jadice', ['irbd_balance'])
+        cache.authorize('other', ['irbd_balance'])
+        cache.authorize('jadice', ['irbd_balance'])
+        cache.authorize('third', ['irbd_balance'])
+        self.assertEquals(list(cache.entries), [
+            ('authorize', 'jadice', 'irbd_balance'),
+            ('authorize', 'third', 'irbd_balance'),
+        ])
+
+
+class CachedAuthorizationAPI(BaseCubesAPITest):
+    fixtures = ['irbdbalance.json']
+    url_name = 'cube_aggregation'
+    url_args = {'cube_name': 'irbd_balance'}
+    method = 'get'
+
+    def test_restricted_requests(self):
+        self.login()
+        self.make_request()
+        workspace = api.data.workspace
+        workspace.authorizer = RestrictingAuthorizer()
+        try:
+            with patch.object(RestrictingAuthorizer, 'restricted_cell', autospec=True,
+                              side_effect=RestrictingAuthorizer.restricted_cell) as restricted_cell:
+                for _ in range(2):
+                    response = self.make_request(data={'cut': 'item:a'})
+                    self.assertEquals(response.status_code, 200)
+                    self.assertEquals(
+                        load_json(response.content)['summary']['record_count'],
+                        IrbdBalance.objects.filter(category='a', year=2010).count()
+                    )
+            self.assertEquals(restricted_cell.call_count, 1)
+
+            response = self.make_request(url='/cubes/')
+            self.assertEquals([cube['name'] for cube in load_json(response.content)], ['irbd_balance'])
+        finally:
+            workspace.authorizer = None
+            get_authorization_cache(workspace).invalidate()
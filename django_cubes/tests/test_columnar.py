@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from rest_framework.reverse import reverse
+
+from .test_api import BaseCubesAPITest, load_json
+
+__all__ = ['ColumnarAggregationAPI', 'ColumnarFactsAPI']
+
+
+class ColumnarAggregationAPI(BaseCubesAPITest):
+    url_name = 'cube_aggregation'
+    url_args = {'cube_name': 'irbd_balance'}
+    method = 'get'
+
+    def test_columnar_drilldown(self):
+        self.login()
+        base_url = reverse(self.url_name, kwargs=self.url_args)
+        response = self.make_request("%s?drilldown=item&format=columnar" % base_url)
+        self.assertEquals(response.status_code, 200)
+        content = load_json(response.content)
+        self.assertNotIn('cells', content)
+        self.assertEquals(content['summary'], {'record_count': 62, 'amount_sum': 1116860})
+
+        header, columns = content['header'], content['columns']
+        self.assertEquals(len(header), len(columns))
+        self.assertEquals(columns[header.index('item.category')], ['a', 'e', 'l'])
+        self.assertEquals(columns[header.index('amount_sum')], [558430, 77592, 480838])
+        self.assertEquals(columns[header.index('record_count')], [32, 8, 22])
+
+    def test_columnar_summary(self):
+        self.login()
+        base_url = reverse(self.url_name, kwargs=self.url_args)
+        response = self.make_request("%s?format=columnar" % base_url)
+        self.assertEquals(response.status_code, 200)
+        content = load_json(response.content)
+        self.assertEquals(content['summary'], {'record_count': 62, 'amount_sum': 1116860})
+        self.assertEquals(content['columns'], [])
+
+
+class ColumnarFactsAPI(BaseCubesAPITest):
+    url_name = 'cube_facts'
+    url_args = {'cube_name': 'irbd_balance'}
+    method = 'get'
+
+    def test_columnar_facts(self):
+        self.login()
+        base_url = reverse(self.url_name, kwargs=self.url_args)
+        response = self.make_request("%s?fields=item.category,amount&cut=item:e&format=columnar" % base_url)
+        self.assertEquals(response.status_code, 200)
+        content = load_json(response.content)
+        self.assertEquals(content['header'], ['item.category', 'amount'])
+        self.assertEquals(content['columns'][0], ['e'] * 8)
+        self.assertEquals(sum(content['columns'][1]), 77592)
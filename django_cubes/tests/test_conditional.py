@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+from os import path
+
+from mock import Mock, patch
+from cubes import Workspace
+from cubes.backends.sql.browser import SnowflakeBrowser
+from django.conf import settings
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase
+from django.test.utils import override_settings
+from django.utils.http import http_date
+from rest_framework.reverse import reverse
+
+from django_cubes.admission import AdmissionController
+from django_cubes.backends.django_orm.browser import DjangoBrowser  # NOQA
+from django_cubes.backends.django_orm.store import DjangoStore  # NOQA
+from django_cubes.conditional import get_http_cache, modified_since, normalized_query
+from django_cubes.versions import bump_data_version, data_version
+
+from example.hello_world.models import IrbdBalance
+
+from .test_api import BaseCubesAPITest
+
+__all__ = ['ConditionalTest', 'DataVersionTest', 'ConditionalResultsAPI']
+
+MODIFIED = 1413478123.0
+
+
+class ConditionalTest(SimpleTestCase):
+
+    def test_normalized_query(self):
+        request = RequestFactory().get('/', {'order': ['b', 'a'], 'cut': 'year:2010', 'drilldown': 'item'})
+        self.assertEquals(normalized_query(request), 'cut=year%3A2010&drilldown=item&order=b&order=a')
+
+    def test_modified_since(self):
+        request = RequestFactory().get('/', HTTP_IF_MODIFIED_SINCE=http_date(MODIFIED))
+        self.assertFalse(modified_since(request, MODIFIED))
+        self.assertTrue(modified_since(request, MODIFIED + 1))
+        self.assertTrue(modified_since(request, None))
+        self.assertTrue(modified_since(RequestFactory().get('/'), MODIFIED))
+
+    def test_settings(self):
+        self.assertIsNone(get_http_cache())
+        with override_settings(SLICER_HTTP_CACHE={}):
+            self.assertEquals(get_http_cache(), {'cache_control': 'private, max-age=0, must-revalidate'})
+
+
+class DataVersionTest(TransactionTestCase):
+
+    def test_writes_change_the_data_version(self):
+        cache.clear()
+        workspace = Workspace(
+            cubes_root=settings.SLICER_MODELS_DIR,
+            config=path.join(settings.SLICER_MODELS_DIR, 'slicer-django_backend.ini'),
+        )
+        browser = workspace.browser("irbd_balance")
+        version, timestamp = browser.data_version()
+        self.assertIsNone(timestamp)
+
+        IrbdBalance.objects.create(id=1000, year=2011, amount=10)
+        changed, timestamp = browser.data_version()
+        self.assertNotEqual(changed, version)
+        self.assertIsNotNone(timestamp)
+
+    def test_lost_versions_are_not_reused(self):
+        cache.clear()
+        version, timestamp = data_version(IrbdBalance)
+        self.assertEquals(bump_data_version(IrbdBalance), version + 1)
+
+        # Evicted, or lost with a restart
+        cache.clear()
+        seeded, timestamp = data_version(IrbdBalance)
+        self.assertNotIn(seeded, (version, version + 1))
+        self.assertIsNone(timestamp)
+        cache.clear()
+        self.assertNotIn(bump_data_version(IrbdBalance), (version, version + 1))
+
+    def test_unknown_versions(self):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+            self.assertEquals(data_version(IrbdBalance), (None, None))
+            self.assertIsNone(bump_data_version(IrbdBalance))
+
+
+@override_settings(SLICER_HTTP_CACHE={'cache_control': 'public, max-age=60'})
+@patch.object(SnowflakeBrowser, 'data_version', Mock(return_value=('1', MODIFIED)), create=True)
+class ConditionalResultsAPI(BaseCubesAPITest):
+    url_name = 'cube_aggregation'
+    url_args = {'cube_name': 'irbd_balance'}
+    method = 'get'
+
+    def test_result_headers(self):
+        self.login()
+        response = self.make_request(data={'drilldown': 'item'})
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response['Cache-Control'], 'public, max-age=60')
+        self.assertEquals(response['Last-Modified'], http_date(MODIFIED))
+        self.assertTrue(response['ETag'].startswith('"'))
+
+        self.assertNotEqual(self.make_request(data={'drilldown': 'year'})['ETag'], response['ETag'])
+        with override_settings(SLICER_HTTP_CACHE=None):
+            self.assertFalse(self.make_request(data={'drilldown': 'item'}).has_header('ETag'))
+
+    def test_not_modified_before_querying(self):
+        self.login()
+        etag = self.make_request(data={'drilldown': 'item'})['ETag']
+        with patch.object(SnowflakeBrowser, 'aggregate') as aggregate:
+            response = self.make_request(data={'drilldown': 'item'}, HTTP_IF_NONE_MATCH=etag)
+            self.assertEquals(response.status_code, 304)
+            self.assertEquals(response['ETag'], etag)
+
+            response = self.make_request(data={'drilldown': 'item'}, HTTP_IF_MODIFIED_SINCE=http_date(MODIFIED))
+            self.assertEquals(response.status_code, 304)
+        self.assertFalse(aggregate.called)
+
+        with patch.object(SnowflakeBrowser, 'data_version', Mock(return_value=('2', MODIFIED + 10))):
+            response = self.make_request(data={'drilldown': 'item'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, 200)
+
+    def test_unknown_data_version(self):
+        self.login()
+        with patch.object(SnowflakeBrowser, 'data_version', Mock(return_value=(None, None))):
+            response = self.make_request(data={'drilldown': 'item'}, HTTP_IF_NONE_MATCH='*')
+        self.assertEquals(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+
+    @override_settings(SLICER_ADMISSION={'max_cells': 1})
+    def test_downgraded_results_are_not_tagged(self):
+        self.login()
+        with patch.object(AdmissionController, 'admit_aggregation', Mock(return_value=(1, 10, True))):
+            response = self.make_request(data={'drilldown': 'item'})
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response['X-Cubes-Admission'], 'paginated; page_size=10')
+        self.assertFalse(response.has_header('ETag'))
+        self.assertFalse(response.has_header('Last-Modified'))
+
+    def test_facts(self):
+        self.login()
+        url = reverse('cube_facts', kwargs=self.url_args)
+        etag = self.make_request(url)['ETag']
+        self.assertEquals(self.make_request(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEquals(self.make_request(url, data={'format': 'csv'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+from os import path
+
+from mock import patch
+from cubes import Cell, Drilldown, Workspace
+from cubes.errors import ArgumentError
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase, TransactionTestCase
+
+from django_cubes.backends.django_orm.browser import DjangoBrowser  # NOQA
+from django_cubes.backends.django_orm.store import DjangoStore  # NOQA
+from django_cubes.backends.django_orm.databases import DatabaseSelector, parse_aliases
+from django_cubes.versions import bump_data_version, data_version
+
+from example.hello_world.models import IrbdBalance
+
+__all__ = ['DatabaseSelectorTest', 'DatabaseRoutingTest']
+
+
+class DatabaseSelectorTest(SimpleTestCase):
+
+    def setUp(self):
+        super(DatabaseSelectorTest, self).setUp()
+        cache.clear()
+
+    def test_pinned_database(self):
+        self.assertEquals(DatabaseSelector().choose(IrbdBalance), 'default')
+        self.assertEquals(DatabaseSelector('analytics').choose(IrbdBalance), 'analytics')
+        self.assertEquals(parse_aliases(' replica1, replica2,'), ('replica1', 'replica2'))
+        self.assertRaises(ArgumentError, DatabaseSelector, selection='random')
+
+    def test_round_robin(self):
+        selector = DatabaseSelector(replicas='replica1,replica2')
+        self.assertEquals([selector.choose(IrbdBalance) for i in range(3)], ['replica1', 'replica2', 'replica1'])
+        self.assertEquals(selector.choose(IrbdBalance, advance=False), 'replica2')
+        self.assertEquals(selector.choose(IrbdBalance), 'replica2')
+
+    def test_least_loaded(self):
+        selector = DatabaseSelector(replicas=['replica1', 'replica2', 'replica3'], selection='least_loaded')
+        with selector.reading('replica1'), selector.reading('replica2'):
+            self.assertEquals([selector.choose(IrbdBalance) for i in range(2)], ['replica3', 'replica3'])
+            with selector.reading('replica3'), selector.reading('replica3'):
+                self.assertEquals(selector.choose(IrbdBalance), 'replica1')
+        self.assertEquals(selector.loads, {'replica1': 0, 'replica2': 0, 'replica3': 0})
+
+    def test_primary_after_write(self):
+        selector = DatabaseSelector(replicas='replica1', primary_after_write=5)
+        self.assertEquals(selector.choose(IrbdBalance), 'replica1')
+        bump_data_version(IrbdBalance)
+        self.assertEquals(selector.choose(IrbdBalance), 'default')
+
+        version, timestamp = data_version(IrbdBalance)
+        with patch('time.time', return_value=timestamp + 6):
+            self.assertEquals(selector.choose(IrbdBalance), 'replica1')
+        self.assertEquals(DatabaseSelector('primary', 'replica1', primary_after_write=5).choose(IrbdBalance), 'primary')
+
+
+class DatabaseRoutingTest(TransactionTestCase):
+    multi_db = True
+
+    def setUp(self):
+        super(DatabaseRoutingTest, self).setUp()
+        cache.clear()
+        self.workspace = Workspace(
+            cubes_root=settings.SLICER_MODELS_DIR,
+            config=path.join(settings.SLICER_MODELS_DIR, 'slicer-django_backend.ini'),
+        )
+        self.cube = self.workspace.cube("irbd_balance")
+
+    def test_queries_use_the_chosen_database(self):
+        self.assertEquals(self.workspace.browser(self.cube)._build_cell_cut_qset(Cell(self.cube)).db, 'default')
+
+        self.cube.browser_options['replicas'] = 'replica1, replica2'
+        browser = self.workspace.browser(self.cube)
+        self.assertIs(self.workspace.browser(self.cube).databases, browser.databases)
+        # Queries outside of a reading do not take the turns of the replicas
+        self.assertEquals(
+            [browser._build_cell_cut_qset(Cell(self.cube)).db for i in range(2)], ['replica1', 'replica1']
+        )
+        for expected in ('replica1', 'replica2'):
+            with browser.reading() as alias:
+                self.assertEquals(alias, expected)
+                self.assertEquals(browser._build_cell_cut_qset(Cell(self.cube)).db, expected)
+                self.assertEquals(browser._build_cell_cut_qset(Cell(self.cube)).db, expected)
+
+    def test_writes_bump_the_data_version(self):
+        self.cube.browser_options['replicas'] = 'replica1'
+        self.cube.browser_options['primary_after_write'] = 10
+        browser = self.workspace.browser(self.cube)
+        self.assertEquals(browser.db_for_read(), 'replica1')
+
+        version = data_version(IrbdBalance)[0]
+        IrbdBalance.objects.create(id=1000, year=2011, amount=10)
+        self.assertEquals(data_version(IrbdBalance)[0], version + 1)
+        self.assertEquals(browser.db_for_read(), 'default')
+        IrbdBalance.objects.get(id=1000).delete()
+        self.assertEquals(data_version(IrbdBalance)[0], version + 2)
+
+    def test_costs_are_estimated_on_the_chosen_database(self):
+        IrbdBalance.objects.create(id=1000, category='a', year=2011, amount=10)
+        IrbdBalance.objects.create(id=1001, category='e', year=2011, amount=10)
+        cell = Cell(self.cube)
+        drilldown = Drilldown(['item'], cell)
+        self.assertEquals(self.workspace.browser(self.cube).estimate_cost(cell, drilldown), (2, 2))
+
+        # Estimates are cached per database
+        self.cube.browser_options['database'] = 'shard'
+        self.assertEquals(self.workspace.browser(self.cube).estimate_cost(cell, drilldown), (0, 1))
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+import json
+import subprocess
+import sys
+from os.path import abspath, dirname
+
+from django.test import SimpleTestCase
+
+from django_cubes.backends.django_orm import register_extensions
+
+__all__ = ['LazyImportTest']
+
+ROOT = dirname(dirname(dirname(abspath(__file__))))
+
+LOAD_URLS = """
+import json, sys
+from django.conf import settings
+settings.configure(
+    INSTALLED_APPS=('django.contrib.contenttypes', 'django.contrib.auth', 'django_cubes'),
+    DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+)
+import django
+if django.VERSION >= (1, 7):
+    django.setup()
+import django_cubes.urls
+print(json.dumps(sorted(name for name in sys.modules if name.split('.')[0] in ('cubes', 'rest_framework'))))
+"""
+
+
+class LazyImportTest(SimpleTestCase):
+
+    def test_urls_do_not_import_the_slicer(self):
+        output = subprocess.check_output([sys.executable, '-c', LOAD_URLS], cwd=ROOT)
+        self.assertEquals(json.loads(output.decode('utf-8')), [])
+
+    def test_extensions_are_registered(self):
+        from cubes.extensions import _default_modules
+
+        register_extensions()
+        self.assertEquals(_default_modules['store']['django'], 'django_cubes.backends.django_orm.store')
+        self.assertEquals(_default_modules['browser']['django'], 'django_cubes.backends.django_orm.browser')
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+from os import path
+
+from mock import patch
+from cubes import Workspace
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TransactionTestCase
+from django.test.utils import override_settings
+from six import StringIO
+
+# DjangoBrowser and DjangoStore must be loaded in order to be found by cubes
+from django_cubes.backends.django_orm.browser import DjangoBrowser  # NOQA
+from django_cubes.backends.django_orm.store import DjangoStore  # NOQA
+from django_cubes.backends.django_orm.advisor import IndexAdvisor, shapes_from_urls
+
+__all__ = ['IndexAdvisorTest']
+
+DJANGO_BACKEND_CONFIG = path.join(settings.SLICER_MODELS_DIR, 'slicer-django_backend.ini')
+
+
+class IndexAdvisorTest(TransactionTestCase):
+
+    def setUp(self):
+        super(IndexAdvisorTest, self).setUp()
+        self.workspace = Workspace(cubes_root=settings.SLICER_MODELS_DIR, config=DJANGO_BACKEND_CONFIG)
+        self.browser = self.workspace.browser("irbd_balance")
+        self.advisor = IndexAdvisor(self.browser)
+
+    def test_proposals_from_the_model(self):
+        proposals = self.advisor.propose()
+        self.assertEquals(
+            [(proposal.columns, proposal.hits) for proposal in proposals],
+            [(('category', 'subcategory', 'line_item'), 1), (('year',), 1)]
+        )
+
+    def test_proposals_from_recorded_queries(self):
+        urls = [
+            '/cube/irbd_balance/aggregate/?drilldown=item&cut=year:2010',
+            '/cube/irbd_balance/aggregate/?cut=year:2010|item:a',
+            '/cube/irbd_balance/aggregate/?cut=item:a,da&drilldown=year',
+            '/cube/irbd_balance/facts/?cut=item:a',
+            '/cube/another_cube/aggregate/?cut=item:a',
+        ]
+        shapes = shapes_from_urls(self.workspace, self.browser.cube, urls)
+        self.assertEquals(len(shapes), 4)
+
+        proposals = self.advisor.propose(shapes)
+        self.assertEquals(
+            [(proposal.columns, proposal.hits) for proposal in proposals],
+            [
+                (('category', 'subcategory', 'year'), 2),
+                (('year', 'category'), 1),
+                (('category', 'year'), 1),
+            ]
+        )
+
+    def test_existing_indexes_are_not_proposed(self):
+        self.assertIn(('id',), self.advisor.existing_indexes())
+        proposals = self.advisor.propose(shapes_from_urls(
+            self.workspace, self.browser.cube, ['/cube/irbd_balance/facts/?cut=year:2010']
+        ))
+        self.assertEquals([proposal.columns for proposal in proposals], [('year',)])
+
+    def test_statements(self):
+        proposal = self.advisor.propose()[1]
+        self.assertEquals(
+            self.advisor.create_sql(proposal), 'CREATE INDEX "irbd_balance_year_cubes" ON "irbd_balance" ("year")'
+        )
+        self.assertEquals(self.advisor.drop_sql(proposal), 'DROP INDEX "irbd_balance_year_cubes"')
+
+        with patch.object(self.advisor.connection.ops, 'max_name_length', return_value=20):
+            name = self.advisor.index_name(('category', 'subcategory'))
+        self.assertEquals(len(name), 20)
+        self.assertTrue(name.startswith('irbd_balanc_'))
+
+    def test_statistics_database(self):
+        self.browser.cube.browser_options['database'] = 'shard'
+        advisor = IndexAdvisor(self.workspace.browser(self.browser.cube))
+        self.assertEquals(advisor.using, 'shard')
+
+    @override_settings(SLICER_CONFIG_FILE=DJANGO_BACKEND_CONFIG)
+    def test_command_prints_create_index_statements(self):
+        out = StringIO()
+        call_command('cubes_index_advisor', 'irbd_balance', stdout=out)
+        output = out.getvalue()
+        self.assertIn('-- cube irbd_balance (0 recorded queries)', output)
+        self.assertIn('CREATE INDEX', output)
+        self.assertIn('"category", "subcategory", "line_item"', output)
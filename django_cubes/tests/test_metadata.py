@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+import copy
+
+from mock import Mock, patch
+from cubes import Workspace
+from cubes.backends.sql.browser import SnowflakeBrowser
+from cubes.errors import NoSuchCubeError
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from django_cubes.conditional import etag_matches, make_etag
+from django_cubes.metadata import ModelCache, get_model_cache
+
+from .test_api import BaseCubesAPITest, load_json
+
+__all__ = ['ModelCacheTest', 'CachedModelAPI']
+
+
+class ModelCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        super(ModelCacheTest, self).setUp()
+        self.workspace = Workspace(config=settings.SLICER_CONFIG_FILE, cubes_root=settings.SLICER_MODELS_DIR)
+
+    def test_models_are_computed_once(self):
+        models = get_model_cache(self.workspace)
+        self.assertIs(get_model_cache(self.workspace), models)
+
+        with patch.object(SnowflakeBrowser, 'features', Mock(return_value={'actions': ['aggregate']})) as features:
+            model, model_digest = models.model('irbd_balance')
+            self.assertEquals(models.model('irbd_balance'), (model, model_digest))
+            self.assertEquals(features.call_count, 1)
+
+            limited, limited_digest = models.model('irbd_balance', [('item', 'default', 'category')])
+            self.assertEquals(features.call_count, 1)
+        self.assertEquals(model['name'], 'irbd_balance')
+        self.assertEquals(model['features'], {'actions': ['aggregate']})
+        self.assertNotEqual(limited_digest, model_digest)
+        self.assertIs(models.cube('irbd_balance'), models.cube('irbd_balance'))
+        self.assertRaises(NoSuchCubeError, models.cube, 'unknown')
+
+    def test_browsers_are_built_once(self):
+        models = get_model_cache(self.workspace)
+        cube = models.cube('irbd_balance')
+        with patch.object(Workspace, 'browser', wraps=self.workspace.browser) as browser:
+            shared = models.browser(cube)
+            self.assertIs(models.browser(cube), shared)
+            self.assertEquals(browser.call_count, 1)
+        self.assertIs(models.features(shared), models.features(shared))
+        self.assertIsNot(models.features(self.workspace.browser(cube)), models.features(shared))
+
+        # A cube loaded again gets a new browser
+        reloaded = copy.copy(cube)
+        self.assertIsNot(models.browser(reloaded), shared)
+        self.assertIs(models.browser(reloaded).cube, reloaded)
+
+    def test_preload(self):
+        models = ModelCache(self.workspace)
+        models.preload()
+        self.assertEquals([key[0] for key in models.models], ['irbd_balance'])
+        self.assertEquals([cube['name'] for cube in models.list_cubes()[0]], ['irbd_balance'])
+
+    def test_etag_matches(self):
+        etag = make_etag('abc', 'json')
+        self.assertEquals(etag, '"abc-json"')
+        self.assertFalse(etag_matches(Mock(META={}), etag))
+        self.assertTrue(etag_matches(Mock(META={'HTTP_IF_NONE_MATCH': '"x", "abc-json"'}), etag))
+        self.assertTrue(etag_matches(Mock(META={'HTTP_IF_NONE_MATCH': 'W/"abc-json"'}), etag))
+        self.assertTrue(etag_matches(Mock(META={'HTTP_IF_NONE_MATCH': '*'}), etag))
+        self.assertFalse(etag_matches(Mock(META={'HTTP_IF_NONE_MATCH': '"abc-api"'}), etag))
+
+
+class CachedModelAPI(BaseCubesAPITest):
+    url_name = 'cube_model'
+    url_args = {'cube_name': 'irbd_balance'}
+    method = 'get'
+
+    def test_not_modified(self):
+        self.login()
+        response = self.make_request()
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(load_json(response.content)['name'], 'irbd_balance')
+        etag = response['ETag']
+
+        response = self.make_request(HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, 304)
+        self.assertEquals(response.content, b'')
+        self.assertEquals(response['ETag'], etag)
+
+        response = self.make_request(HTTP_IF_NONE_MATCH='"other"')
+        self.assertEquals(response.status_code, 200)
+
+    def test_unknown_cube(self):
+        self.login()
+        response = self.make_request(url='/cube/unknown/model/')
+        self.assertEquals(response.status_code, 404)
+
+    def test_cube_list(self):
+        self.login()
+        response = self.make_request(url='/cubes/')
+        self.assertEquals(response.status_code, 200)
+        response = self.make_request(url='/cubes/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEquals(response.status_code, 304)
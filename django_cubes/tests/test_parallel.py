@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from os import path
+
+from mock import Mock, patch
+from cubes import Workspace
+from cubes.model import MeasureAggregate
+from django.conf import settings
+from django.test import SimpleTestCase, TransactionTestCase
+
+from django_cubes.backends.django_orm.browser import DjangoBrowser  # NOQA
+from django_cubes.backends.django_orm.store import DjangoStore  # NOQA
+from django_cubes.backends.django_orm import partials
+from django_cubes.backends.django_orm.partials import key_ranges, run_parallel
+
+from example.hello_world.models import IrbdBalance
+
+__all__ = ['RunParallelTest', 'ParallelAggregationTest']
+
+
+class RunParallelTest(SimpleTestCase):
+
+    def test_in_memory_sqlite_is_not_shared(self):
+        self.assertFalse(partials.shares_database(Mock(vendor='sqlite', settings_dict={'NAME': ':memory:'})))
+        self.assertTrue(partials.shares_database(Mock(vendor='sqlite', settings_dict={'NAME': '/tmp/db.sqlite3'})))
+        self.assertTrue(partials.shares_database(Mock(vendor='postgresql', settings_dict={'NAME': 'cubes'})))
+
+    def test_parts_run_on_threads(self):
+        def function(part):
+            time.sleep(0.01)
+            return part, threading.current_thread().ident
+
+        with patch.object(partials, 'shares_database', Mock(return_value=True)):
+            results = run_parallel(function, list(range(8)), 'default', 4)
+        self.assertEquals([part for part, thread in results], list(range(8)))
+        threads = set(thread for part, thread in results)
+        self.assertEquals(len(threads), 4)
+        self.assertNotIn(threading.current_thread().ident, threads)
+
+        # Serially in the calling thread
+        results = run_parallel(function, list(range(8)), 'default', 4)
+        self.assertEquals(set(thread for part, thread in results), set([threading.current_thread().ident]))
+
+
+class ParallelAggregationTest(TransactionTestCase):
+    fixtures = ['irbdbalance.json']
+
+    def setUp(self):
+        super(ParallelAggregationTest, self).setUp()
+        self.workspace = Workspace(
+            cubes_root=settings.SLICER_MODELS_DIR,
+            config=path.join(settings.SLICER_MODELS_DIR, 'slicer-django_backend.ini'),
+        )
+        self.cube = self.workspace.cube("irbd_balance")
+        self.cube.aggregates = self.cube.aggregates + [
+            MeasureAggregate("amount_avg", function="avg", measure="amount"),
+            MeasureAggregate("amount_min", function="min", measure="amount"),
+            MeasureAggregate("amount_distinct", function="count_distinct", measure="amount"),
+        ]
+        self.serial = self.workspace.browser(self.cube)
+        self.cube.browser_options['parallel'] = 3
+        self.parallel = self.workspace.browser(self.cube)
+
+    def assertSameAggregation(self, browser, **kwargs):
+        kwargs.setdefault('aggregates', ['amount_sum', 'record_count', 'amount_avg', 'amount_min'])
+        expected = self.serial.aggregate(**kwargs)
+        result = browser.aggregate(**kwargs)
+        self.assertEquals(sorted(result.summary), sorted(expected.summary))
+        for name, value in expected.summary.items():
+            self.assertAlmostEqual(result.summary[name], value)
+        self.assertEquals(list(result.cells), list(expected.cells))
+        self.assertEquals(result.total_cell_count, expected.total_cell_count)
+
+    def test_key_ranges(self):
+        qset = IrbdBalance.objects.all()
+        self.assertEquals(key_ranges(qset, 3, 'year'), [
+            {'year__gte': 2009, 'year__lt': 2010}, {'year__gte': 2010, 'year__lte': 2010}, {'year__isnull': True}
+        ])
+        ranges = key_ranges(qset, 4, 'amount')
+        self.assertEquals(len(ranges), 5)
+        self.assertEquals(sum(qset.filter(**lookup).count() for lookup in ranges), 62)
+
+    def test_parallel_aggregation(self):
+        self.assertEquals(self.parallel.parallel, 3)
+        with patch.object(DjangoBrowser, 'part_rows', wraps=self.parallel.part_rows) as part_rows:
+            self.assertSameAggregation(self.parallel, drilldown=['item'])
+        self.assertEquals(part_rows.call_count, 3)
+
+        self.assertSameAggregation(self.parallel)
+        self.assertSameAggregation(self.parallel, drilldown=['item', 'year'], page=2, page_size=3)
+
+    def test_partition_column(self):
+        self.cube.browser_options['partition_column'] = 'year'
+        browser = self.workspace.browser(self.cube)
+        self.assertEquals(browser.partition_field, 'year')
+        self.assertSameAggregation(browser, drilldown=['year'])
+
+        self.cube.browser_options['partition_column'] = 'item.subcategory'
+        browser = self.workspace.browser(self.cube)
+        self.assertEquals(browser.partition_field, 'subcategory')
+        # Text can not be split in ranges, it is aggregated in a single query
+        with patch.object(DjangoBrowser, 'part_rows') as part_rows:
+            self.assertSameAggregation(browser, drilldown=['item'])
+        self.assertFalse(part_rows.called)
+
+    def test_ranges_get_the_time_left(self):
+        self.parallel.timeouts['aggregate'] = 30.0
+        with patch.object(DjangoBrowser, 'statement_timeout', autospec=True,
+                          side_effect=DjangoBrowser.statement_timeout) as statement_timeout:
+            start = time.time()
+            self.parallel.aggregate(drilldown=['item'], aggregates=['amount_sum', 'record_count'])
+        deadlines = [call[0][2] for call in statement_timeout.call_args_list if len(call[0]) > 2]
+        self.assertEquals(len(deadlines), 4)
+        self.assertEquals(len(set(deadlines)), 1)
+        self.assertLessEqual(deadlines[0], start + 30.0 + 0.01)
+
+    def test_aggregates_not_merged_from_parts(self):
+        with patch.object(DjangoBrowser, 'part_rows') as part_rows:
+            result = self.parallel.aggregate(drilldown=['item'], aggregates=['amount_distinct', 'record_count'])
+        self.assertFalse(part_rows.called)
+        self.assertEquals(result.summary['record_count'], 62)
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+import json
+from os import path
+
+from mock import patch
+from cubes import Cell, Drilldown, PointCut, Workspace
+from cubes.errors import ArgumentError
+from cubes.model import MeasureAggregate
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from django.test import SimpleTestCase, TransactionTestCase
+
+from django_cubes.backends.django_orm.browser import DjangoBrowser  # NOQA
+from django_cubes.backends.django_orm.store import DjangoStore  # NOQA
+from django_cubes.backends.django_orm.partitions import Partition, prune
+
+from example.hello_world.models import IrbdBalance, IrbdBalance2009, IrbdBalance2010
+
+__all__ = ['PartitionTest', 'PartitionedBrowserTest']
+
+PARTITIONS = [
+    {"class_name": "hello_world.IrbdBalance2009", "attribute": "year", "to": 2009},
+    {"class_name": "hello_world.IrbdBalance2010", "attribute": "year", "from": 2010},
+]
+
+
+class PartitionTest(SimpleTestCase):
+
+    def test_matches(self):
+        partition = Partition('hello_world.IrbdBalance2009', 'year', 2005, 2009)
+        self.assertIs(partition.model, IrbdBalance2009)
+        self.assertTrue(partition.matches([]))
+        self.assertTrue(partition.matches([('category__in', ['a'])]))
+        self.assertTrue(partition.matches([('year__in', ['2005'])]))
+        self.assertTrue(partition.matches([('year__in', ['2010', '2009'])]))
+        self.assertFalse(partition.matches([('year__in', ['2010'])]))
+        self.assertFalse(partition.matches([('year__in', ['2004'])]))
+
+    def test_open_ranges(self):
+        older = Partition('hello_world.IrbdBalance2009', 'year', high=2009)
+        newer = Partition('hello_world.IrbdBalance2010', 'year', low=2010)
+        self.assertEquals(prune([older, newer], [('year__in', ['1990'])]), [older])
+        self.assertEquals(prune([older, newer], [('year__in', ['2020'])]), [newer])
+        self.assertEquals(prune([older, newer], []), [older, newer])
+
+
+class PartitionedBrowserTest(TransactionTestCase):
+    fixtures = ['irbdbalance.json']
+
+    def setUp(self):
+        super(PartitionedBrowserTest, self).setUp()
+        for model in (IrbdBalance2009, IrbdBalance2010):
+            model.objects.bulk_create([
+                model(**dict((field.name, getattr(fact, field.name)) for field in IrbdBalance._meta.fields))
+                for fact in IrbdBalance.objects.filter(year=model._meta.db_table[-4:])
+            ])
+
+        self.workspace = Workspace(
+            cubes_root=settings.SLICER_MODELS_DIR,
+            config=path.join(settings.SLICER_MODELS_DIR, 'slicer-django_backend.ini'),
+        )
+        self.cube = self.workspace.cube("irbd_balance")
+        self.cube.aggregates = self.cube.aggregates + [
+            MeasureAggregate("amount_avg", function="avg", measure="amount"),
+            MeasureAggregate("amount_distinct", function="count_distinct", measure="amount"),
+        ]
+        self.whole = self.workspace.browser(self.cube)
+        self.cube.browser_options['partitions'] = PARTITIONS
+        self.browser = self.workspace.browser(self.cube)
+
+    def assertSameAggregation(self, **kwargs):
+        kwargs.setdefault('aggregates', ['amount_sum', 'record_count', 'amount_avg'])
+        expected = self.whole.aggregate(**kwargs)
+        result = self.browser.aggregate(**kwargs)
+        for name, value in expected.summary.items():
+            self.assertAlmostEqual(result.summary[name], value)
+        self.assertEquals(list(result.cells), list(expected.cells))
+        self.assertEquals(result.total_cell_count, expected.total_cell_count)
+
+    def test_partitions(self):
+        models = [partition.model for partition in self.browser.partitions]
+        self.assertEquals(models, [IrbdBalance2009, IrbdBalance2010])
+        self.assertEquals(self.browser.model, IrbdBalance)
+
+        self.cube.browser_options['partitions'] = json.dumps(PARTITIONS)
+        self.cube.browser_options['class_name'] = None
+        browser = self.workspace.browser(self.cube)
+        self.assertEquals(len(browser.partitions), 2)
+
+        self.cube.browser_options['partitions'] = '[{"class_name":'
+        self.assertRaises(ArgumentError, self.workspace.browser, self.cube)
+
+    def test_aggregation_merges_the_partitions(self):
+        with patch.object(DjangoBrowser, 'part_rows', autospec=True, side_effect=DjangoBrowser.part_rows) as part_rows:
+            self.assertSameAggregation(drilldown=['item'])
+        self.assertEquals([call[0][0].model for call in part_rows.call_args_list], [IrbdBalance2009, IrbdBalance2010])
+
+        self.assertSameAggregation()
+        self.assertSameAggregation(drilldown=['year', 'item'], page=1, page_size=4)
+
+    def test_cuts_prune_the_partitions(self):
+        cell = Cell(self.cube, [PointCut("year", ["2010"])])
+        self.assertEquals([partition.model for partition in self.browser.cell_partitions(cell)], [IrbdBalance2010])
+
+        IrbdBalance.objects.filter(year=2010).delete()
+        result = self.browser.aggregate(cell, drilldown=['item'], aggregates=['record_count', 'amount_distinct'])
+        self.assertEquals(result.summary['record_count'], 31)
+        self.assertEquals(result.total_cell_count, 3)
+
+        cell = Cell(self.cube, [PointCut("year", ["2011"])])
+        result = self.browser.aggregate(cell, aggregates=['amount_sum', 'record_count'])
+        self.assertEquals(result.summary, {'amount_sum': None, 'record_count': 0})
+
+    def test_cost_of_the_partitions(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        IrbdBalance.objects.filter(year=2010).delete()
+        cell = Cell(self.cube)
+        drilldown = Drilldown(['item'], cell)
+        self.assertEquals(self.whole.estimate_cost(cell, drilldown), (31, 3))
+        self.assertEquals(self.browser.estimate_cost(cell, drilldown), (62, 3))
+
+    def test_aggregates_not_merged_from_partitions(self):
+        self.assertRaises(ArgumentError, self.browser.aggregate, aggregates=['amount_distinct'])
+        self.assertRaises(ArgumentError, self.browser.aggregate, sample=0.5)
+
+    def test_sketches_are_merged_from_the_partitions(self):
+        self.cube.aggregates = self.cube.aggregates + [
+            MeasureAggregate("amount_approx", function="approx_count_distinct", measure="amount"),
+        ]
+        aggregates = ['amount_sum', 'amount_approx']
+        # The facts of the partitions are not read to estimate them
+        self.assertRaises(ArgumentError, self.browser.aggregate, drilldown=['item'], aggregates=aggregates)
+
+        self.cube.browser_options['preaggregates'] = [{
+            'class_name': 'hello_world.IrbdBalanceSketch',
+            'attributes': ['item.category', 'item.subcategory', 'year'],
+        }]
+        browser = self.workspace.browser(self.cube)
+        with patch.object(DjangoBrowser, 'fact_sketches', autospec=True,
+                          side_effect=DjangoBrowser.fact_sketches) as fact_sketches:
+            self.assertEquals(browser.preaggregates[0].build(), 36)
+        models = [call[0][0].model for call in fact_sketches.call_args_list[1:]]
+        self.assertEquals(models, [IrbdBalance2009, IrbdBalance2010])
+
+        expected = self.whole.aggregate(drilldown=['item'], aggregates=aggregates)
+        with patch.object(DjangoBrowser, 'fact_sketches', side_effect=AssertionError("facts read")):
+            result = browser.aggregate(drilldown=['item'], aggregates=aggregates)
+        self.assertEquals(result.cells.header, expected.cells.header)
+        self.assertEquals(list(result.cells), list(expected.cells))
+        self.assertEquals(result.summary['amount_approx'], expected.summary['amount_approx'])
+
+    def test_aggregate_parts(self):
+        results = list(self.browser.aggregate_parts(drilldown=['item'], aggregates=['amount_sum'], parts=4))
+        self.assertEquals(results[-1].progress, (4, 4))
+        # The ranges of each partition follow one another
+        total = IrbdBalance2009.objects.aggregate(Sum('amount'))['amount__sum']
+        self.assertEquals(results[1].summary['amount_sum'], total)
+        self.assertEquals(results[-1].summary['amount_sum'], 1116860)
+
+        cell = Cell(self.cube, [PointCut("year", ["2011"])])
+        results = list(self.browser.aggregate_parts(cell, aggregates=['amount_sum', 'record_count'], parts=4))
+        self.assertEquals([result.progress for result in results], [(0, 0)])
+        self.assertEquals(results[0].summary, {'amount_sum': None, 'record_count': 0})
+
+    def test_facts(self):
+        facts = self.browser.facts(fields=['year', 'amount'], order=['amount'], page=2, page_size=5)
+        expected = self.whole.facts(fields=['year', 'amount'], order=['amount'], page=2, page_size=5)
+        self.assertEquals(facts.facts.header, expected.facts.header)
+        self.assertEquals([row['amount'] for row in facts], [row['amount'] for row in expected])
+
+        # Facts without a value are merged in the order of the database
+        for model in (IrbdBalance, IrbdBalance2009, IrbdBalance2010):
+            model.objects.filter(amount__lt=-1000).update(amount=None)
+        facts = self.browser.facts(fields=['year', 'amount'], order=['amount'], page=0, page_size=10)
+        expected = self.whole.facts(fields=['year', 'amount'], order=['amount'], page=0, page_size=10)
+        self.assertIn(None, [row['amount'] for row in facts])
+        self.assertEquals([row['amount'] for row in facts], [row['amount'] for row in expected])
+
+    def test_sampling_is_not_a_feature(self):
+        self.assertTrue(self.whole.features()['sampling'])
+        self.assertFalse(self.browser.features()['sampling'])
+        self.assertEquals(len(list(self.browser.facts())), 62)
+
+        cell = Cell(self.cube, [PointCut("year", ["2009"])])
+        self.assertEquals(set(row['year'] for row in self.browser.facts(cell, fields=['year'])), set([2009]))
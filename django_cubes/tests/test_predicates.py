@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from os import path
+
+from mock import patch
+from cubes import Cell, PointCut, Workspace
+from cubes.errors import NoSuchDimensionError
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from django_cubes.backends.django_orm.browser import DjangoBrowser  # NOQA
+from django_cubes.backends.django_orm.store import DjangoStore  # NOQA
+from django_cubes.backends.django_orm.predicates import CutPlans
+
+__all__ = ['CutPlansTest']
+
+
+class CutPlansTest(SimpleTestCase):
+
+    def setUp(self):
+        super(CutPlansTest, self).setUp()
+        workspace = Workspace(
+            cubes_root=settings.SLICER_MODELS_DIR,
+            config=path.join(settings.SLICER_MODELS_DIR, 'slicer-django_backend.ini'),
+        )
+        self.browser = workspace.browser("irbd_balance")
+        self.cube = self.browser.cube
+        self.plans = self.browser.cut_plans
+
+    def test_plans(self):
+        self.assertEquals(self.plans.plans[('item', None, 2)], ('category__in', 'subcategory__in'))
+        self.assertEquals(self.plans.plans[('item', 'default', 3)], self.plans.plans[('item', None, 3)])
+        self.assertEquals(self.plans.plans[('year', None, 1)], ('year__in', ))
+
+    def test_filters(self):
+        cell = Cell(self.cube, [PointCut("item", ["a", "da"]), PointCut("year", [2009])])
+        with patch.object(type(self.cube), 'dimension') as dimension:
+            filters = self.browser.cell_filters(cell)
+        self.assertFalse(dimension.called)
+        self.assertEquals(filters, [
+            ('category__in', ['a', 'da']), ('subcategory__in', ['a', 'da']), ('year__in', [2009]),
+        ])
+        self.assertEquals(
+            self.browser.cell_filters(Cell(self.cube, [PointCut(self.cube.dimension("item"), ["a"], "default")])),
+            [('category__in', ['a'])]
+        )
+
+    def test_unplanned_cuts(self):
+        plans = CutPlans(self.cube, self.browser.mapper)
+        self.assertEquals(plans.lookups(PointCut("year", [2009, 1])), ('year__in', ))
+        self.assertEquals(plans.plans[('year', None, 2)], ('year__in', ))
+        self.assertRaises(NoSuchDimensionError, plans.lookups, PointCut("unknown", ["a"]))
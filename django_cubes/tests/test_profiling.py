@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+
+from django.test.utils import override_settings
+from rest_framework.reverse import reverse
+
+from .test_api import BaseCubesAPITest, load_json
+
+__all__ = ['RequestProfilingTest']
+
+
+class RequestProfilingTest(BaseCubesAPITest):
+    url_name = 'cube_aggregation'
+    url_args = {'cube_name': 'irbd_balance'}
+    method = 'get'
+
+    def profile_url(self):
+        return "%s?drilldown=item&profile=1" % reverse(self.url_name, kwargs=self.url_args)
+
+    def make_staff(self):
+        self.user.is_staff = True
+        self.user.save()
+
+    def test_profile_is_ignored_for_regular_users(self):
+        self.login()
+        response = self.make_request(self.profile_url())
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(load_json(response.content)['total_cell_count'], 3)
+
+    def test_inline_profile(self):
+        self.make_staff()
+        self.login()
+        response = self.make_request(self.profile_url())
+        self.assertEquals(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn(b'function calls', response.content)
+        self.assertIn(b'aggregate', response.content)
+
+    def test_profile_saved_to_directory(self):
+        self.make_staff()
+        self.login()
+        directory = tempfile.mkdtemp()
+        try:
+            with override_settings(SLICER_PROFILE_DIR=directory):
+                response = self.make_request(self.profile_url())
+            self.assertEquals(response.status_code, 200)
+            self.assertEquals(load_json(response.content)['total_cell_count'], 3)
+            self.assertEquals(os.listdir(directory), [response['X-Cubes-Profile']])
+        finally:
+            shutil.rmtree(directory)
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import tempfile
+
+from django.test.utils import override_settings
+from rest_framework.reverse import reverse
+
+from django_cubes.querylog import ClientSender, ReplayStats, read_query_log, replay
+
+from .test_api import BaseCubesAPITest
+
+__all__ = ['QueryLogTest', 'ReplayTest']
+
+
+class QueryLogTest(BaseCubesAPITest):
+    url_name = 'cube_aggregation'
+    url_args = {'cube_name': 'irbd_balance'}
+    method = 'get'
+
+    def setUp(self):
+        super(QueryLogTest, self).setUp()
+        handle, self.log_path = tempfile.mkstemp(suffix='.log')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.log_path)
+        super(QueryLogTest, self).tearDown()
+
+    def test_requests_are_not_recorded_by_default(self):
+        self.login()
+        self.make_request()
+        self.assertEquals(list(read_query_log(self.log_path)), [])
+
+    def test_requests_are_recorded(self):
+        self.login()
+        with override_settings(SLICER_QUERY_LOG=self.log_path):
+            base_url = reverse(self.url_name, kwargs=self.url_args)
+            self.make_request("%s?drilldown=item&cut=item:a" % base_url)
+            self.client.post(
+                reverse('cube_report', kwargs=self.url_args),
+                json.dumps({'queries': {}}), content_type='application/json'
+            )
+
+        entries = list(read_query_log(self.log_path))
+        self.assertEquals(len(entries), 2)
+        self.assertEquals(entries[0]['m'], 'GET')
+        self.assertEquals(entries[0]['p'], base_url)
+        self.assertEquals(entries[0]['q'], 'drilldown=item&cut=item:a')
+        self.assertEquals(entries[0]['u'], self.username)
+        self.assertEquals(entries[0]['s'], 200)
+        self.assertIn('ms', entries[0])
+        self.assertEquals(entries[1]['m'], 'POST')
+        self.assertEquals(entries[1]['b'], {'queries': {}})
+        self.assertEquals(entries[1]['s'], 400)
+
+    def test_plain_urls_are_read_as_get_requests(self):
+        with open(self.log_path, 'w') as handle:
+            handle.write('/cube/irbd_balance/aggregate/?drilldown=year\n')
+        self.assertEquals(list(read_query_log(self.log_path)), [
+            {'m': 'GET', 'p': '/cube/irbd_balance/aggregate/', 'q': 'drilldown=year'}
+        ])
+
+
+class ReplayTest(BaseCubesAPITest):
+    url_name = 'cube_aggregation'
+    url_args = {'cube_name': 'irbd_balance'}
+    method = 'get'
+
+    def test_replay_in_process(self):
+        entries = [
+            {'m': 'GET', 'p': reverse(self.url_name, kwargs=self.url_args), 'q': 'drilldown=item', 'u': self.username},
+            {'m': 'GET', 'p': reverse(self.url_name, kwargs=self.url_args), 'q': '', 'u': self.username},
+            {'m': 'GET', 'p': reverse(self.url_name, kwargs={'cube_name': 'unknown'}), 'q': '', 'u': self.username},
+        ]
+        stats = replay(entries, ClientSender(entries), concurrency=2)
+        self.assertEquals(stats.requests, 3)
+        self.assertEquals(stats.errors, 1)
+        self.assertEquals(stats.statuses, {200: 2, 404: 1})
+        self.assertEquals(len(stats.latencies), 3)
+
+    def test_percentiles(self):
+        stats = ReplayStats(4, 0, 2.0, [0.1, 0.2, 0.3, 0.4], {200: 4})
+        self.assertEquals(stats.throughput, 2.0)
+        self.assertEquals(stats.percentile(50), 0.2)
+        self.assertEquals(stats.percentile(99), 0.4)
+        self.assertEquals(stats.percentile(100), 0.4)
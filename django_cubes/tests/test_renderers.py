@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+import datetime
+import decimal
+import json
+
+from django.test import SimpleTestCase
+from rest_framework.reverse import reverse
+from rest_framework.utils import encoders
+
+from django_cubes.backends.django_orm.rows import Rows
+from django_cubes.renderers import CubesCSVRenderer, CubesJSONLinesRenderer, ResultEncoder
+
+from .test_api import BaseCubesAPITest, load_json
+
+__all__ = ['ResultEncoderTest', 'ResultRenderersAPI']
+
+
+class ResultEncoderTest(SimpleTestCase):
+
+    def assertEncodesLikeDRF(self, value):
+        self.assertEquals(
+            json.loads(ResultEncoder().encode(value)),
+            json.loads(json.dumps(value, cls=encoders.JSONEncoder))
+        )
+
+    def test_rows(self):
+        self.assertEncodesLikeDRF({
+            'summary': {'amount_sum': decimal.Decimal('10.5'), 'record_count': 3},
+            'cells': [
+                {'item': u'Équité', 'amount_sum': decimal.Decimal('1.25'), 'day': datetime.date(2010, 1, 2)},
+                {'item': 'b', 'amount_sum': None, 'day': datetime.datetime(2010, 1, 2, 3, 4, 5, 678000)},
+                {'item': 'c', 'other': True},
+                {},
+            ],
+            'aggregates': ['amount_sum'],
+            'remainder': {},
+            'cell': [],
+        })
+
+    def test_scalars(self):
+        for value in (None, True, 1, 2 ** 70, 1.5, -0.1, 'a"b\n', u' ', [], [[1, 2], (3, 4)]):
+            self.assertEncodesLikeDRF(value)
+
+    def test_tuple_rows(self):
+        rows = Rows(['item', 'amount_sum'], [(u'a', decimal.Decimal('1.5')), (u'b', None)])
+        # Decimals are numbers since DRF 3.0, strings before
+        amount = json.dumps(decimal.Decimal('1.5'), cls=encoders.JSONEncoder)
+        self.assertEquals(json.loads(ResultEncoder().encode({'cells': rows, 'empty': Rows(['item'], [])})), {
+            'cells': [{'item': 'a', 'amount_sum': json.loads(amount)}, {'item': 'b', 'amount_sum': None}],
+            'empty': [],
+        })
+        output = CubesJSONLinesRenderer().render({'cells': rows})
+        expected = '{"item":"a","amount_sum":%s}\n{"item":"b","amount_sum":null}\n' % amount
+        self.assertEquals(output, expected.encode('ascii'))
+
+    def test_csv(self):
+        output = CubesCSVRenderer().render({
+            'header': ['item', 'amount_sum'],
+            'columns': [[u'Équité', 'b'], [decimal.Decimal('1.25'), None]],
+        })
+        self.assertEquals(output.decode('utf-8'), u'item,amount_sum\r\nÉquité,1.25\r\nb,\r\n')
+
+    def test_json_lines(self):
+        output = CubesJSONLinesRenderer().render({
+            'data': [{'item.category': 'e'}, {'item.category': 'l'}],
+        })
+        self.assertEquals(output, b'{"item.category":"e"}\n{"item.category":"l"}\n')
+
+
+class ResultRenderersAPI(BaseCubesAPITest):
+    url_name = 'cube_aggregation'
+    url_args = {'cube_name': 'irbd_balance'}
+    method = 'get'
+
+    def test_aggregation_as_csv(self):
+        self.login()
+        base_url = reverse(self.url_name, kwargs=self.url_args)
+        response = self.make_request("%s?drilldown=item&format=csv" % base_url)
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response['Content-Type'], 'text/csv; charset=utf-8')
+        lines = response.content.decode('utf-8').splitlines()
+        self.assertEquals(len(lines), 4)
+        header = lines[0].split(',')
+        self.assertEquals(sorted(header), ['amount_sum', 'item.category', 'item.category_label', 'record_count'])
+        row = dict(zip(header, lines[1].split(',')))
+        self.assertEquals(row['item.category_label'], 'Assets')
+        self.assertEquals(row['amount_sum'], '558430')
+
+    def test_facts_as_json_lines(self):
+        self.login()
+        base_url = reverse('cube_facts', kwargs=self.url_args)
+        response = self.make_request("%s?fields=item.category,amount&cut=item:e&format=jsonl" % base_url)
+        self.assertEquals(response.status_code, 200)
+        facts = [load_json(line) for line in response.content.splitlines()]
+        self.assertEquals(len(facts), 8)
+        self.assertEquals(set(facts[0].keys()), set(['item.category', 'amount']))
+
+    def test_members_as_csv(self):
+        self.login()
+        base_url = reverse('cube_members', kwargs={'cube_name': 'irbd_balance', 'dimension_name': 'item'})
+        response = self.make_request("%s?level=category&cut=item:e&format=csv" % base_url)
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response.content.decode('utf-8').splitlines(), [
+            'item.category,item.category_label', 'e,Equity'
+        ])
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+from os import path
+
+from mock import Mock, patch
+from cubes import Cell, PointCut, Workspace
+from cubes.backends.sql.browser import SnowflakeBrowser
+from cubes.browser import AggregationResult
+from cubes.errors import ArgumentError
+from django.conf import settings
+from django.test import TransactionTestCase
+
+from django_cubes.backends.django_orm.browser import DjangoBrowser  # NOQA
+from django_cubes.backends.django_orm.store import DjangoStore  # NOQA
+from django_cubes.backends.django_orm.sampling import Sampler
+
+from example.hello_world.models import IrbdBalance
+
+from .test_api import BaseCubesAPITest, load_json
+
+__all__ = ['SampledAggregationTest', 'SampledAggregationAPI']
+
+
+class SampledAggregationTest(TransactionTestCase):
+    fixtures = ['irbdbalance.json']
+
+    def setUp(self):
+        super(SampledAggregationTest, self).setUp()
+        workspace = Workspace(
+            cubes_root=settings.SLICER_MODELS_DIR,
+            config=path.join(settings.SLICER_MODELS_DIR, 'slicer-django_backend.ini'),
+        )
+        self.browser = workspace.browser("irbd_balance")
+
+    def assertWithin(self, values, name, expected):
+        self.assertLessEqual(values['%s_low' % name], expected)
+        self.assertGreaterEqual(values['%s_high' % name], expected)
+
+    def test_whole_sample_is_exact(self):
+        result = self.browser.aggregate(sample=1)
+        self.assertEquals(result.summary, {
+            'amount_sum': 1116860, 'amount_sum_low': 1116860, 'amount_sum_high': 1116860,
+            'record_count': 62, 'record_count_low': 62, 'record_count_high': 62,
+        })
+        self.assertEquals(result.sample, {'fraction': 1.0, 'method': 'hash', 'confidence': 0.95})
+
+    def test_summary_estimates(self):
+        result = self.browser.aggregate(sample=0.5)
+        summary = result.summary
+        self.assertAlmostEqual(summary['record_count'], 62, delta=12)
+        self.assertLess(summary['amount_sum_low'], summary['amount_sum'])
+        self.assertWithin(summary, 'record_count', 62)
+        self.assertWithin(summary, 'amount_sum', 1116860)
+        self.assertEquals(self.browser.aggregate(sample=0.5).summary, summary)
+
+    def test_drilldown_estimates(self):
+        result = self.browser.aggregate(drilldown=["item"], sample=0.5)
+        self.assertEquals(result.cells.header, (
+            'item.category', 'item.category_label', 'amount_sum', 'record_count',
+            'amount_sum_low', 'amount_sum_high', 'record_count_low', 'record_count_high',
+        ))
+        cells = dict((cell['item.category'], cell) for cell in result.cells)
+        self.assertEquals(sorted(cells), ['a', 'e', 'l'])
+        self.assertWithin(cells['a'], 'amount_sum', 558430)
+        self.assertWithin(cells['l'], 'record_count', 22)
+        self.assertEquals(result.total_cell_count, 3)
+
+    def test_sample_of_a_cell(self):
+        cell = Cell(self.browser.cube, [PointCut("item", ["a"])])
+        sampler = Sampler(self.browser, 0.25, 'default')
+        sampled = sampler.filter(self.browser._build_cell_cut_qset(cell))
+        self.assertLess(sampled.count(), 32)
+        self.assertEquals(
+            self.browser.aggregate(cell, sample=0.25).summary['record_count'],
+            int(round(sampled.count() / sampler.fraction))
+        )
+
+    def test_large_keys(self):
+        keys = [2 ** 40 + index for index in range(20)]
+        IrbdBalance.objects.bulk_create([IrbdBalance(id=key, year=2011, amount=1) for key in keys])
+        sampler = Sampler(self.browser, 0.5, 'default')
+        sampled = sampler.filter(IrbdBalance.objects.filter(year=2011)).values_list('id', flat=True)
+        self.assertEquals(
+            sorted(sampled),
+            [key for key in keys if (key % 1000003) * 2654435761 % 1000000 < sampler.threshold]
+        )
+
+    def test_invalid_fraction(self):
+        self.assertRaises(ArgumentError, self.browser.aggregate, sample=0)
+        self.assertRaises(ArgumentError, self.browser.aggregate, sample=1.5)
+
+
+class SampledAggregationAPI(BaseCubesAPITest):
+    url_name = 'cube_aggregation'
+    url_args = {'cube_name': 'irbd_balance'}
+    method = 'get'
+
+    def test_sample_is_not_supported(self):
+        self.login()
+        response = self.make_request(data={'sample': '0.1'})
+        self.assertEquals(response.status_code, 400)
+
+    @patch.object(SnowflakeBrowser, 'features', Mock(return_value={'actions': ['aggregate'], 'sampling': True}))
+    def test_sample(self):
+        result = AggregationResult(cell=Mock(cuts=[]), aggregates=[])
+        result.summary = {'record_count': 10, 'record_count_low': 8, 'record_count_high': 12}
+        result.sample = {'fraction': 0.1, 'method': 'hash', 'confidence': 0.95}
+        self.login()
+        with patch.object(SnowflakeBrowser, 'aggregate', Mock(return_value=result)) as aggregate:
+            response = self.make_request(data={'sample': '0.1'})
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(aggregate.call_args[1]['sample'], 0.1)
+        content = load_json(response.content)
+        self.assertEquals(content['sample'], result.sample)
+        self.assertEquals(content['summary'], result.summary)
+
+        for sample in ('0', '2', 'all'):
+            response = self.make_request(data={'sample': sample})
+            self.assertEquals(response.status_code, 400)
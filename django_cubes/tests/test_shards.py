@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+from os import path
+
+from mock import Mock
+from cubes import Cell, PointCut, Workspace
+from cubes.model import MeasureAggregate
+from django.conf import settings
+from django.test import SimpleTestCase, TransactionTestCase
+
+from django_cubes.backends.django_orm.browser import DjangoBrowser  # NOQA
+from django_cubes.backends.django_orm.store import DjangoStore  # NOQA
+from django_cubes.backends.django_orm.partials import merge_sorted, row_key, sorts_nulls_last, top_rows
+
+from example.hello_world.models import IrbdBalance
+
+__all__ = ['MergeRowsTest', 'ShardedBrowserTest']
+
+
+class MergeRowsTest(SimpleTestCase):
+
+    def test_merge_sorted(self):
+        parts = [[(1, 'a'), (4, 'b')], [], [(None, 'c'), (2, 'd'), (3, 'e'), (5, 'f')]]
+        rows = list(merge_sorted(parts, row_key([(0, False)])))
+        self.assertEquals([row[1] for row in rows], ['c', 'a', 'd', 'e', 'b', 'f'])
+
+        # As sorted by PostgreSQL
+        parts = [[(1, 'a'), (4, 'b')], [(2, 'd'), (5, 'f'), (None, 'c')]]
+        rows = list(merge_sorted(parts, row_key([(0, False)], nulls_last=True)))
+        self.assertEquals([row[1] for row in rows], ['a', 'd', 'b', 'f', 'c'])
+        self.assertTrue(sorts_nulls_last(Mock(vendor='postgresql')))
+        self.assertFalse(sorts_nulls_last(Mock(vendor='sqlite')))
+
+    def test_top_rows(self):
+        rows = [('a', 3), ('b', 1), ('c', None), ('d', 3)]
+        self.assertEquals(top_rows(rows, [(1, True)]), [('a', 3), ('d', 3), ('b', 1), ('c', None)])
+        self.assertEquals(top_rows(rows, [(1, True), (0, True)], 2), [('d', 3), ('a', 3)])
+        self.assertEquals(top_rows(rows, [(1, False)], 1), [('c', None)])
+
+
+class ShardedBrowserTest(TransactionTestCase):
+    fixtures = ['irbdbalance.json']
+    multi_db = True
+
+    def setUp(self):
+        super(ShardedBrowserTest, self).setUp()
+        # One year on each shard
+        IrbdBalance.objects.using('default').filter(year=2010).delete()
+        IrbdBalance.objects.using('shard').filter(year=2009).delete()
+
+        self.workspace = Workspace(
+            cubes_root=settings.SLICER_MODELS_DIR,
+            config=path.join(settings.SLICER_MODELS_DIR, 'slicer-django_backend.ini'),
+        )
+        self.cube = self.workspace.cube("irbd_balance")
+        self.cube.aggregates = self.cube.aggregates + [
+            MeasureAggregate("amount_distinct", function="count_distinct", measure="amount"),
+        ]
+        self.cube.browser_options['shards'] = [
+            {"database": "default", "attribute": "year", "values": [2009]},
+            {"database": "shard", "attribute": "year", "values": ["2010"]},
+        ]
+        self.browser = self.workspace.browser(self.cube)
+
+    def test_aggregation_gathers_the_shards(self):
+        result = self.browser.aggregate(drilldown=['item'], aggregates=['amount_sum', 'record_count'])
+        self.assertEquals(result.summary, {'amount_sum': 1116860, 'record_count': 62})
+        self.assertEquals(
+            [(cell['item.category'], cell['amount_sum'], cell['record_count']) for cell in result.cells],
+            [('a', 558430, 32), ('e', 77592, 8), ('l', 480838, 22)]
+        )
+
+    def test_ordered_drilldown(self):
+        order = [('amount_sum', 'desc')]
+        result = self.browser.aggregate(drilldown=['item'], aggregates=['amount_sum'], order=order, page_size=2, page=1)
+        self.assertEquals([cell['item.category'] for cell in result.cells], ['a', 'l'])
+        self.assertEquals(result.total_cell_count, 3)
+
+        result = self.browser.aggregate(drilldown=['item'], aggregates=['amount_sum'], order=order, page_size=2, page=2)
+        self.assertEquals([cell['item.category'] for cell in result.cells], ['e'])
+
+    def test_cuts_skip_shards(self):
+        cell = Cell(self.cube, [PointCut("year", ["2010"])])
+        self.assertEquals([shard.database for shard in self.browser.cell_partitions(cell)], ['shard'])
+        result = self.browser.aggregate(cell, aggregates=['record_count', 'amount_distinct'])
+        self.assertEquals(result.summary['record_count'], 31)
+
+        self.cube.browser_options['shards'] = 'default, shard'
+        browser = self.workspace.browser(self.cube)
+        self.assertEquals(len(browser.cell_partitions(cell)), 2)
+        self.assertEquals(browser.aggregate(cell, aggregates=['record_count']).summary['record_count'], 31)
+
+    def test_paginated_facts(self):
+        amounts = sorted(
+            list(IrbdBalance.objects.using('default').values_list('amount', flat=True)) +
+            list(IrbdBalance.objects.using('shard').values_list('amount', flat=True))
+        )
+        facts = self.browser.facts(fields=['amount'], order=['amount'], page=3, page_size=7)
+        self.assertEquals([row['amount'] for row in facts], amounts[14:21])
+        self.assertEquals(len(list(self.browser.facts())), 62)
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+import random
+from os import path
+
+from mock import patch
+from cubes import Cell, PointCut, Workspace
+from cubes.model import MeasureAggregate
+from django.conf import settings
+from django.test import SimpleTestCase, TransactionTestCase
+
+from django_cubes.backends.django_orm.browser import DjangoBrowser  # NOQA
+from django_cubes.backends.django_orm.store import DjangoStore  # NOQA
+from django_cubes.backends.django_orm.sketches import HyperLogLog, TDigest
+
+from example.hello_world.models import IrbdBalance, IrbdBalanceSketch
+
+__all__ = ['SketchesTest', 'ApproximateAggregatesTest']
+
+
+def percentile(values, fraction):
+    # Each value is placed at the middle of its rank, like in the digest
+    values = sorted(values)
+    position = min(max(fraction * len(values) - 0.5, 0), len(values) - 1)
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class SketchesTest(SimpleTestCase):
+
+    def test_hyperloglog(self):
+        sketch = HyperLogLog()
+        for value in range(20000):
+            sketch.add(value % 10000)
+        self.assertAlmostEqual(sketch.count(), 10000, delta=500)
+
+        small = HyperLogLog()
+        for value in ['a', 'b', 'c', 'a', None]:
+            small.add(value)
+        self.assertEquals(small.count(), 3)
+
+    def test_hyperloglog_merge(self):
+        first, second = HyperLogLog(), HyperLogLog()
+        for value in range(6000):
+            first.add(value)
+            second.add(value + 3000)
+        merged = HyperLogLog.deserialize(first.serialize()).merge(second)
+        self.assertAlmostEqual(merged.count(), 9000, delta=450)
+        self.assertRaises(ValueError, merged.merge, HyperLogLog(10))
+
+    def test_tdigest(self):
+        generator = random.Random(1)
+        values = [generator.expovariate(0.01) for i in range(20000)]
+        sketch = TDigest()
+        for value in values:
+            sketch.add(value)
+        self.assertLess(len(sketch.centroids), 200)
+        for fraction in (0.01, 0.5, 0.9, 0.99):
+            # Fraction of the values below the estimate
+            rank = sum(1 for value in values if value <= sketch.quantile(fraction)) / float(len(values))
+            self.assertAlmostEqual(rank, fraction, delta=0.005)
+        self.assertEquals(sketch.quantile(0), min(values))
+        self.assertEquals(sketch.quantile(1), max(values))
+        self.assertEquals(TDigest().quantile(0.5), None)
+
+    def test_tdigest_merge(self):
+        values = list(range(1, 10001))
+        parts = [TDigest() for i in range(4)]
+        for value in values:
+            parts[value % 4].add(value)
+        merged = TDigest()
+        for part in parts:
+            merged.merge(TDigest.deserialize(part.serialize()))
+        self.assertEquals(merged.count, 10000)
+        self.assertAlmostEqual(merged.quantile(0.5), 5000.5, delta=50)
+        self.assertAlmostEqual(merged.quantile(0.95), 9500.5, delta=50)
+
+
+class ApproximateAggregatesTest(TransactionTestCase):
+    fixtures = ['irbdbalance.json']
+
+    def setUp(self):
+        super(ApproximateAggregatesTest, self).setUp()
+        self.workspace = Workspace(
+            cubes_root=settings.SLICER_MODELS_DIR,
+            config=path.join(settings.SLICER_MODELS_DIR, 'slicer-django_backend.ini'),
+        )
+        self.cube = self.workspace.cube("irbd_balance")
+        self.cube.aggregates = self.cube.aggregates + [
+            MeasureAggregate("amount_distinct", function="approx_count_distinct", measure="amount"),
+            MeasureAggregate("amount_median", function="approx_percentile", measure="amount"),
+            MeasureAggregate("amount_p90", function="approx_percentile", measure="amount", info={"percentile": 90}),
+        ]
+        self.browser = self.workspace.browser(self.cube)
+        self.amounts = dict(
+            (category, [fact.amount for fact in IrbdBalance.objects.filter(category=category)])
+            for category in ('a', 'e', 'l')
+        )
+
+    def assertApproximates(self, values, amounts):
+        self.assertEquals(values['amount_distinct'], len(set(amounts)))
+        self.assertAlmostEqual(values['amount_median'], percentile(amounts, 0.5), delta=max(amounts) * 0.05)
+        self.assertAlmostEqual(values['amount_p90'], percentile(amounts, 0.9), delta=max(amounts) * 0.05)
+
+    def aggregate(self, *args, **kwargs):
+        kwargs['aggregates'] = ['amount_sum', 'amount_distinct', 'amount_median', 'amount_p90']
+        return self.browser.aggregate(*args, **kwargs)
+
+    def test_from_facts(self):
+        result = self.aggregate(Cell(self.cube, [PointCut("item", ["a"])]))
+        self.assertEquals(result.summary['amount_sum'], 558430)
+        self.assertApproximates(result.summary, self.amounts['a'])
+
+        result = self.aggregate(drilldown=["item"])
+        cells = dict((cell['item.category'], cell) for cell in result.cells)
+        self.assertEquals(sorted(cells), ['a', 'e', 'l'])
+        for category, amounts in self.amounts.items():
+            self.assertApproximates(cells[category], amounts)
+
+        result = self.browser.aggregate(drilldown=["item"], aggregates=['amount_distinct'])
+        self.assertEquals(result.cells.header, ('item.category', 'item.category_label', 'amount_distinct'))
+        self.assertEquals(result.total_cell_count, 3)
+
+    def test_from_preaggregate(self):
+        self.cube.browser_options['preaggregates'] = [{
+            'class_name': 'hello_world.IrbdBalanceSketch',
+            'attributes': ['item.category', 'item.subcategory', 'year'],
+        }]
+        browser = self.workspace.browser(self.cube)
+        preaggregate = browser.preaggregates[0]
+        self.assertEquals(preaggregate.fields, ['category', 'subcategory', 'year'])
+
+        # One partition and then the other, merged into the existing rows
+        preaggregate.build(Cell(self.cube, [PointCut("item", ["a"])]))
+        self.assertEquals(preaggregate.build(Cell(self.cube, [PointCut("item", ["e"])]), merge=True), 8)
+        preaggregate.build(Cell(self.cube, [PointCut("item", ["l"])]), merge=True)
+        self.assertEquals(IrbdBalanceSketch.objects.count(), 36)
+
+        self.browser = browser
+        with patch.object(DjangoBrowser, 'fact_sketches', side_effect=AssertionError("facts read")):
+            result = self.aggregate(drilldown=["item"])
+            summary = self.aggregate(Cell(self.cube, [PointCut("item", ["l"])])).summary
+        cells = dict((cell['item.category'], cell) for cell in result.cells)
+        for category, amounts in self.amounts.items():
+            self.assertApproximates(cells[category], amounts)
+        self.assertApproximates(summary, self.amounts['l'])
+
+        # Not covered by the pre-aggregate
+        result = self.aggregate(drilldown=["item:line_item"])
+        self.assertEquals(len(result.cells), 31)
+        self.assertEquals(set(cell['amount_distinct'] for cell in result.cells), set([2]))
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+from os import path
+
+from mock import patch
+from cubes import Cell, PointCut, Workspace
+from django.conf import settings
+from django.db.models.sql.compiler import SQLCompiler
+from django.test import TransactionTestCase
+from django.test.utils import override_settings
+
+from django_cubes.backends.django_orm.browser import DjangoBrowser  # NOQA
+from django_cubes.backends.django_orm.store import DjangoStore  # NOQA
+from django_cubes.backends.django_orm.sqlcache import get_query_cache
+
+__all__ = ['CompiledQueryCacheTest']
+
+
+class CompiledQueryCacheTest(TransactionTestCase):
+    fixtures = ['irbdbalance.json']
+
+    def setUp(self):
+        super(CompiledQueryCacheTest, self).setUp()
+        workspace = Workspace(
+            cubes_root=settings.SLICER_MODELS_DIR,
+            config=path.join(settings.SLICER_MODELS_DIR, 'slicer-django_backend.ini'),
+        )
+        self.browser = workspace.browser("irbd_balance")
+        self.cache = get_query_cache()
+        self.cache.clear()
+
+    def cell(self, *path):
+        return Cell(self.browser.cube, cuts=[PointCut("item", list(path))])
+
+    def aggregate(self, cell):
+        result = self.browser.aggregate(cell, drilldown=["year"], page=1, page_size=10)
+        return result.summary, result.cells.rows, result.total_cell_count
+
+    def facts(self, cell):
+        facts = self.browser.facts(cell, fields=['item.category', 'amount'], order=['amount'], page=1, page_size=5)
+        return facts.facts.rows
+
+    def test_cached_queries_return_the_orm_results(self):
+        for item_path in (['a'], ['e'], ['a', 'da'], ['l', 'ol']):
+            cell = self.cell(*item_path)
+            with override_settings(SLICER_SQL_CACHE_SIZE=0):
+                expected = self.aggregate(cell), self.facts(cell)
+            self.assertEquals((self.aggregate(cell), self.facts(cell)), expected)
+        # Summary, drilldown, count and facts of two shapes
+        self.assertEquals(len(self.cache.queries), 8)
+        self.assertEquals(self.cache.hits, 8)
+
+    def test_cache_hits_skip_the_orm(self):
+        expected = self.aggregate(self.cell('a'))
+
+        cell = self.cell('l')
+        with patch.object(SQLCompiler, 'as_sql', side_effect=AssertionError("compiled")):
+            summary, rows, count = self.aggregate(cell)
+        self.assertNotEquals(summary, expected[0])
+        self.assertEquals(summary, {'amount_sum': 480838, 'record_count': 22})
+        self.assertEquals(count, 2)
+
+    def test_cache_size(self):
+        with override_settings(SLICER_SQL_CACHE_SIZE=2):
+            self.aggregate(self.cell('a'))
+        self.assertEquals(len(self.cache.queries), 2)
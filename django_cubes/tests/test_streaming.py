@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+import json
+from os import path
+
+from mock import Mock, patch
+from cubes import Cell, PointCut, Workspace
+from cubes.backends.sql.browser import SnowflakeBrowser
+from cubes.browser import AggregationResult
+from cubes.errors import ArgumentError
+from cubes.model import MeasureAggregate
+from django.conf import settings
+from django.test import TransactionTestCase
+from django.test.utils import override_settings
+from rest_framework.reverse import reverse
+
+from django_cubes.backends.django_orm.browser import DjangoBrowser  # NOQA
+from django_cubes.backends.django_orm.store import DjangoStore  # NOQA
+from django_cubes.backends.django_orm.partials import key_ranges
+from django_cubes.backends.django_orm.timeouts import QueryTimeoutError
+
+from .test_api import BaseCubesAPITest
+
+__all__ = ['AggregatePartsTest', 'AggregationStreamAPI']
+
+
+def parse_events(content):
+    events = []
+    for block in content.decode('utf-8').split('\n\n'):
+        if block:
+            event, data = block.split('\n')
+            events.append((event[len('event: '):], json.loads(data[len('data: '):])))
+    return events
+
+
+class AggregatePartsTest(TransactionTestCase):
+    fixtures = ['irbdbalance.json']
+
+    def setUp(self):
+        super(AggregatePartsTest, self).setUp()
+        workspace = Workspace(
+            cubes_root=settings.SLICER_MODELS_DIR,
+            config=path.join(settings.SLICER_MODELS_DIR, 'slicer-django_backend.ini'),
+        )
+        self.cube = workspace.cube("irbd_balance")
+        self.cube.aggregates = self.cube.aggregates + [
+            MeasureAggregate("amount_avg", function="avg", measure="amount"),
+            MeasureAggregate("amount_max", function="max", measure="amount"),
+            MeasureAggregate("amount_distinct", function="count_distinct", measure="amount"),
+        ]
+        self.browser = workspace.browser(self.cube)
+        self.aggregates = ['amount_sum', 'record_count', 'amount_avg', 'amount_max']
+
+    def test_key_ranges(self):
+        qset = self.browser._build_cell_cut_qset(Cell(self.cube, [PointCut("item", ["e"])]))
+        ranges = key_ranges(qset, 3)
+        self.assertEquals(len(ranges), 3)
+        self.assertEquals(sum(qset.filter(**lookup).count() for lookup in ranges), 8)
+        self.assertEquals(key_ranges(qset.none(), 3), [])
+
+    def test_parts_merge_into_the_aggregation(self):
+        expected = self.browser.aggregate(drilldown=["item"], aggregates=self.aggregates)
+        results = list(self.browser.aggregate_parts(drilldown=["item"], aggregates=self.aggregates, parts=4))
+        self.assertEquals([result.progress for result in results], [(1, 4), (2, 4), (3, 4), (4, 4)])
+        self.assertLess(results[0].summary['record_count'], 62)
+
+        result = results[-1]
+        self.assertEquals(result.summary['record_count'], 62)
+        self.assertEquals(result.summary['amount_sum'], expected.summary['amount_sum'])
+        self.assertAlmostEqual(result.summary['amount_avg'], float(expected.summary['amount_avg']))
+        self.assertEquals(result.summary['amount_max'], expected.summary['amount_max'])
+        self.assertEquals(result.total_cell_count, 3)
+        self.assertEquals(
+            [(cell['item.category'], cell['amount_sum']) for cell in result.cells],
+            [(cell['item.category'], cell['amount_sum']) for cell in expected.cells]
+        )
+
+    def test_summary_and_pages(self):
+        cell = Cell(self.cube, [PointCut("item", ["l"])])
+        result = list(self.browser.aggregate_parts(cell, aggregates=self.aggregates, parts=2))[-1]
+        self.assertEquals(result.summary['amount_sum'], 480838)
+        self.assertEquals(list(result.cells), [])
+
+        results = self.browser.aggregate_parts(drilldown=["item"], aggregates=self.aggregates, page=2, page_size=2)
+        result = list(results)[-1]
+        self.assertEquals([cell['item.category'] for cell in result.cells], ['l'])
+        self.assertEquals(result.total_cell_count, 3)
+
+    def test_aggregates_must_be_additive(self):
+        self.assertRaises(ArgumentError, self.browser.aggregate_parts, aggregates=['amount_distinct'])
+
+
+class AggregationStreamAPI(BaseCubesAPITest):
+    url_name = 'cube_aggregation_stream'
+    url_args = {'cube_name': 'irbd_balance'}
+    method = 'get'
+
+    def result(self, parts, total):
+        result = AggregationResult(cell=Mock(cuts=[]), aggregates=[])
+        result.summary = {'record_count': parts * 10}
+        result.progress = (parts, total)
+        return result
+
+    def test_progressive_aggregation_is_not_supported(self):
+        self.login()
+        response = self.make_request(HTTP_ACCEPT='text/event-stream')
+        self.assertEquals(response.status_code, 400)
+        self.assertEquals(response['Content-Type'], 'text/event-stream; charset=utf-8')
+        self.assertEquals(parse_events(response.content)[0][0], 'error')
+
+    @patch.object(SnowflakeBrowser, 'features', Mock(return_value={'actions': ['aggregate'], 'aggregate_parts': True}))
+    def test_events(self):
+        results = [self.result(1, 3), self.result(2, 3), self.result(3, 3)]
+        self.login()
+        with patch.object(SnowflakeBrowser, 'aggregate_parts', Mock(return_value=iter(results)), create=True) as parts:
+            response = self.make_request(data={'drilldown': 'item', 'parts': '3'})
+        self.assertEquals(parts.call_args[1]['parts'], 3)
+        self.assertEquals(parts.call_args[1]['drilldown'], ['item'])
+        self.assertEquals(response['Content-Type'], 'text/event-stream')
+        events = parse_events(b''.join(response.streaming_content))
+        self.assertEquals([event for event, data in events], ['partial', 'partial', 'complete'])
+        self.assertEquals(events[1][1]['summary'], {'record_count': 20})
+        self.assertEquals(events[2][1]['progress'], {'parts': 3, 'total': 3})
+
+    @patch.object(SnowflakeBrowser, 'features', Mock(return_value={'actions': ['aggregate'], 'aggregate_parts': True}))
+    def test_error_event(self):
+        def results():
+            yield self.result(1, 2)
+            raise QueryTimeoutError('Query cancelled')
+
+        self.login()
+        with patch.object(SnowflakeBrowser, 'aggregate_parts', Mock(return_value=results()), create=True):
+            response = self.make_request()
+        events = parse_events(b''.join(response.streaming_content))
+        self.assertEquals(events, [
+            ('partial', events[0][1]),
+            ('error', {'detail': 'Query cancelled'}),
+        ])
+
+        response = self.make_request(reverse(self.url_name, kwargs=self.url_args) + '?parts=0')
+        self.assertEquals(response.status_code, 400)
+
+    @override_settings(SLICER_ADMISSION={'max_concurrent': 1})
+    @patch.object(SnowflakeBrowser, 'features', Mock(return_value={'actions': ['aggregate'], 'aggregate_parts': True}))
+    def test_stream_keeps_the_admission_slot(self):
+        self.login()
+        results = iter([self.result(1, 1)])
+        with patch.object(SnowflakeBrowser, 'aggregate_parts', Mock(return_value=results), create=True):
+            response = self.make_request()
+            self.assertEquals(response.status_code, 200)
+            # The parts are not aggregated yet
+            self.assertEquals(self.make_request().status_code, 429)
+            self.assertEquals(parse_events(b''.join(response.streaming_content))[0][0], 'complete')
+            self.assertEquals(self.make_request().status_code, 200)
+
+    @override_settings(SLICER_ADMISSION={'max_rows': 1000})
+    @patch.object(SnowflakeBrowser, 'features', Mock(return_value={'actions': ['aggregate'], 'aggregate_parts': True}))
+    def test_stream_is_admitted(self):
+        self.login()
+        with patch.object(SnowflakeBrowser, 'estimate_cost', Mock(return_value=Mock(rows=5000, cells=1)), create=True):
+            with patch.object(SnowflakeBrowser, 'aggregate_parts', create=True) as aggregate_parts:
+                response = self.make_request()
+        self.assertEquals(response.status_code, 400)
+        self.assertFalse(aggregate_parts.called)
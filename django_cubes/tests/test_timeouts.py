@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+import time
+from os import path
+
+from mock import Mock, patch
+from cubes import Workspace
+from cubes.backends.sql.browser import SnowflakeBrowser
+from django.conf import settings
+from django.db import connection, connections
+from django.test import TransactionTestCase
+
+from django_cubes.backends.django_orm.browser import DjangoBrowser  # NOQA
+from django_cubes.backends.django_orm.store import DjangoStore  # NOQA
+from django_cubes.backends.django_orm.timeouts import QueryTimeoutError, current_deadline, statement_timeout
+
+from .test_api import BaseCubesAPITest, load_json
+
+__all__ = ['StatementTimeoutTest', 'TimeoutAPITest']
+
+ENDLESS_QUERY = "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c) SELECT count(*) FROM c"
+
+
+class StatementTimeoutTest(TransactionTestCase):
+    fixtures = ['irbdbalance.json']
+    multi_db = True
+
+    def run_query(self, sql):
+        cursor = connection.cursor()
+        try:
+            cursor.execute(sql)
+            return cursor.fetchone()
+        finally:
+            cursor.close()
+
+    def test_runaway_query_is_cancelled(self):
+        with self.assertRaises(QueryTimeoutError):
+            with statement_timeout(connection, 0.05):
+                self.run_query(ENDLESS_QUERY)
+        self.assertEquals(self.run_query("SELECT 1"), (1, ))
+
+    def test_inner_timeout_cannot_extend_outer_one(self):
+        with self.assertRaises(QueryTimeoutError):
+            with statement_timeout(connection, 0.05):
+                with statement_timeout(connection, 60):
+                    self.run_query(ENDLESS_QUERY)
+
+    def test_nested_timeouts_on_other_connections(self):
+        shard = connections['shard']
+        with patch('django_cubes.backends.django_orm.timeouts._apply') as apply:
+            with statement_timeout(connection, 60):
+                with statement_timeout(shard, 0.05):
+                    pass
+                self.assertEquals(apply.call_args[0], (shard, None))
+            self.assertEquals(apply.call_args[0], (connection, None))
+        deadlines = [call[0][1] for call in apply.call_args_list]
+        self.assertLessEqual(deadlines[1], deadlines[0])
+
+    def test_deadline_of_another_thread(self):
+        deadline = time.time() + 0.05
+        with patch('django_cubes.backends.django_orm.timeouts._apply') as apply:
+            with statement_timeout(connection, 60, deadline):
+                self.assertEquals(current_deadline(), deadline)
+            with statement_timeout(connection, None, deadline):
+                pass
+        self.assertIsNone(current_deadline())
+        self.assertEquals([call[0][1] for call in apply.call_args_list], [deadline, None, deadline, None])
+
+    def test_browser_timeouts(self):
+        workspace = Workspace(
+            cubes_root=settings.SLICER_MODELS_DIR,
+            config=path.join(settings.SLICER_MODELS_DIR, 'slicer-django_backend.ini'),
+        )
+        browser = DjangoBrowser(
+            workspace.cube('irbd_balance'), workspace.get_store('default'), timeout=30.0, facts_timeout=5.0
+        )
+        self.assertEquals(browser.timeouts, {'aggregate': 30.0, 'facts': 5.0, 'report': 30.0})
+        self.assertEquals(browser.aggregate().summary['record_count'], 62)
+
+        browser.timeouts['aggregate'] = 1e-6
+        endless = Mock(side_effect=lambda *args, **kwargs: self.run_query(ENDLESS_QUERY))
+        with patch.object(DjangoBrowser, 'provide_aggregate', endless):
+            self.assertRaises(QueryTimeoutError, browser.aggregate)
+
+
+class TimeoutAPITest(BaseCubesAPITest):
+    url_name = 'cube_aggregation'
+    url_args = {'cube_name': 'irbd_balance'}
+    method = 'get'
+
+    @patch.object(SnowflakeBrowser, 'aggregate', Mock(side_effect=QueryTimeoutError('Query cancelled')))
+    def test_cancelled_query_returns_503(self):
+        self.login()
+        response = self.make_request()
+        self.assertEquals(response.status_code, 503)
+        self.assertEquals(load_json(response.content), {'detail': 'Query cancelled'})
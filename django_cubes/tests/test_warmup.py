@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import tempfile
+from unittest import skipIf
+
+import django
+from mock import patch
+from django.core.management import call_command
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+from django.utils.six import StringIO
+from rest_framework.reverse import reverse
+
+from django_cubes import api, querylog
+from django_cubes.metadata import get_model_cache
+from django_cubes.warmup import top_entries, warm_up
+
+from .test_api import BaseCubesAPITest
+
+__all__ = ['TopEntriesTest', 'WarmUpTest']
+
+
+class TopEntriesTest(SimpleTestCase):
+
+    def test_most_frequent_first(self):
+        entries = [
+            {'m': 'GET', 'p': '/a/', 'q': 'x=1', 's': 200},
+            {'m': 'GET', 'p': '/b/', 'q': '', 's': 200},
+            {'m': 'GET', 'p': '/b/', 's': 200},
+            {'m': 'GET', 'p': '/c/', 'q': '', 's': 500},
+            {'m': 'GET', 'p': '/c/', 'q': '', 's': 500},
+            {'m': 'POST', 'p': '/a/', 'q': 'x=1', 'b': {'queries': {}}},
+        ]
+        self.assertEquals([entry['p'] for entry in top_entries(entries)], ['/b/', '/a/', '/a/'])
+        self.assertEquals(top_entries(entries, 1), [entries[1]])
+
+
+class WarmUpTest(BaseCubesAPITest):
+    url_name = 'cube_aggregation'
+    url_args = {'cube_name': 'irbd_balance'}
+    method = 'get'
+
+    def test_warm_up(self):
+        self.assertEquals(warm_up(), ['irbd_balance'])
+        models = get_model_cache(api.data.workspace)
+        self.assertEquals(list(models.browsers), ['irbd_balance'])
+        self.assertEquals([key[0] for key in models.models], ['irbd_balance'])
+
+    @skipIf(django.VERSION < (1, 7), "Application configs exist since Django 1.7")
+    def test_ready(self):
+        from django.apps import apps
+
+        config = apps.get_app_config('django_cubes')
+        with patch('django_cubes.warmup.warm_up') as warm_up:
+            config.ready()
+            self.assertFalse(warm_up.called)
+            with override_settings(SLICER_WARMUP=True):
+                config.ready()
+            self.assertTrue(warm_up.called)
+
+    def test_command(self):
+        url = reverse(self.url_name, kwargs=self.url_args)
+        handle, log_path = tempfile.mkstemp(suffix='.log')
+        with os.fdopen(handle, 'w') as log:
+            for query in ['drilldown=item', 'drilldown=item', 'drilldown=year']:
+                log.write(json.dumps({'m': 'GET', 'p': url, 'q': query, 'u': self.username, 's': 200}) + '\n')
+        try:
+            out = StringIO()
+            with patch('django_cubes.management.commands.cubes_warmup.replay', wraps=querylog.replay) as replay:
+                call_command('cubes_warmup', log_path, top=1, stdout=out)
+            entries = replay.call_args[0][0]
+            self.assertEquals([entry['q'] for entry in entries], ['drilldown=item'])
+            self.assertIn("cubes:       1 warmed up", out.getvalue())
+            self.assertIn("requests:    1", out.getvalue())
+            self.assertIn("errors:      0", out.getvalue())
+        finally:
+            os.remove(log_path)
@@ -2,6 +2,8 @@
 import six
 from os import path
 from cubes import Workspace, Cell, PointCut, SetCut
+from cubes.browser import Drilldown
+from cubes.model import MeasureAggregate
 
 from unittest import skip
 from django.test import TransactionTestCase
@@ -58,6 +60,71 @@ class ValidateDjangoOrmBrowser(TransactionTestCase):
             (u'Other', 2, -4726)
         ])
 
+    def test_paginated_drilldown(self):
+        result = self.browser.aggregate(drilldown=["item"], page=2, page_size=2)
+        values = [(row.label, row.record["record_count"]) for row in result.table_rows("item")]
+        self.assertEquals(values, [(u'Liabilities', 22)])
+        self.assertEquals(result.total_cell_count, 3)
+
+    def test_drilldown_rows(self):
+        result = self.browser.aggregate(drilldown=["item"])
+        self.assertEquals(result.cells.header, ('item.category', 'item.category_label', 'amount_sum', 'record_count'))
+        self.assertEquals(result.cells.rows, [
+            (u'a', u'Assets', 558430, 32), (u'e', u'Equity', 77592, 8), (u'l', u'Liabilities', 480838, 22)
+        ])
+        self.assertEquals(list(result.cells)[0], {
+            'item.category': u'a', 'item.category_label': u'Assets', 'amount_sum': 558430, 'record_count': 32
+        })
+
+    def test_facts_rows(self):
+        facts = self.browser.facts(
+            fields=['item.line_item', 'amount'], page=1, page_size=2, order=['item.line_item', 'amount']
+        )
+        self.assertEquals(facts.facts.header, ('id', 'item.line_item', 'amount'))
+        self.assertEquals(facts.facts.rows, [
+            (54, u'Accounts payable and misc liabilities', 2707),
+            (53, u'Accounts payable and misc liabilities', 2793),
+        ])
+
+    def test_statistical_aggregates(self):
+        cube = self.browser.cube
+        cube.aggregates = cube.aggregates + [
+            MeasureAggregate(name, function=function, measure='amount')
+            for name, function in [
+                ('amount_distinct', 'count_distinct'), ('amount_stddev', 'stddev'),
+                ('amount_stddev_pop', 'stddev_pop'), ('amount_variance', 'variance'), ('amount_var_pop', 'var_pop'),
+            ]
+        ]
+        self.assertIn('count_distinct', self.browser.features()['aggregate_functions'])
+
+        cell = Cell(cube, cuts=[PointCut("item", ["e"])])
+        amounts = [row['amount'] for row in self.browser.facts(cell, fields=['amount'])]
+        mean = float(sum(amounts)) / len(amounts)
+        squares = sum((amount - mean) ** 2 for amount in amounts)
+
+        names = ['amount_distinct', 'amount_stddev', 'amount_stddev_pop', 'amount_variance', 'amount_var_pop']
+        result = self.browser.aggregate(cell, aggregates=names, drilldown=["item"])
+        self.assertEquals(result.summary['amount_distinct'], len(set(amounts)))
+        self.assertAlmostEquals(result.summary['amount_variance'], squares / (len(amounts) - 1))
+        self.assertAlmostEquals(result.summary['amount_var_pop'], squares / len(amounts))
+        self.assertAlmostEquals(result.summary['amount_stddev'], (squares / (len(amounts) - 1)) ** 0.5)
+        self.assertAlmostEquals(result.summary['amount_stddev_pop'], (squares / len(amounts)) ** 0.5)
+
+        for row in result.cells:
+            self.assertEquals(sorted(name for name in row if name.startswith('amount')), sorted(names))
+
+    def test_cost_estimate(self):
+        cell = Cell(self.browser.cube)
+        cost = self.browser.estimate_cost(cell, Drilldown(["item"], cell))
+        self.assertEquals((cost.rows, cost.cells), (62, 3))
+
+        cell = Cell(self.browser.cube, cuts=[PointCut("item", ["a"])])
+        cost = self.browser.estimate_cost(cell, Drilldown(["item"], cell))
+        self.assertEquals((cost.rows, cost.cells), (21, 6))
+
+        cost = self.browser.estimate_cost(cell, Drilldown(["item", "year"], cell))
+        self.assertEquals((cost.rows, cost.cells), (21, 12))
+
     def test_facts_list(self):
         facts = self.browser.facts(page=1, page_size=10, order=['item.line_item', 'amount'])
         six.assertCountEqual(self, facts, [
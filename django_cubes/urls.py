@@ -4,23 +4,43 @@ try:
 except ImportError:
     from django.conf.urls.defaults import patterns, url
 
-from .api import (
-    ApiVersion, Index, Info, ListCubes,
-    CubeModel, CubeAggregation, CubeCell,
-    CubeReport, CubeFacts, CubeFact, CubeMembers
-)
+
+class LazyView(object):
+    """Calls the view class `name` of `django_cubes.api`, which is imported
+    with cubes and the REST framework on the first request, so that loading
+    the URLs does not import them in processes that never serve the slicer.
+    The views of the REST framework are exempt from CSRF checks."""
+    csrf_exempt = True
+
+    def __init__(self, name):
+        self.name = name
+        self.view = None
+
+    def __call__(self, request, *args, **kwargs):
+        if self.view is None:
+            from . import api
+            self.view = getattr(api, self.name).as_view()
+        return self.view(request, *args, **kwargs)
+
 
 urlpatterns = patterns(
     '',
-    url(r'^$', Index.as_view(), name='index'),
-    url(r'^version/$', ApiVersion.as_view(), name='version'),
-    url(r'^info/$', Info.as_view(), name='info'),
-    url(r'^cubes/$', ListCubes.as_view(), name='cubes'),
-    url(r'^cube/(?P<cube_name>\S+)/model/$', CubeModel.as_view(), name='cube_model'),
-    url(r'^cube/(?P<cube_name>\S+)/aggregate/$', CubeAggregation.as_view(), name='cube_aggregation'),
-    url(r'^cube/(?P<cube_name>\S+)/cell/$', CubeCell.as_view(), name='cube_cell'),
-    url(r'^cube/(?P<cube_name>\S+)/report/$', CubeReport.as_view(), name='cube_report'),
-    url(r'^cube/(?P<cube_name>\S+)/facts/$', CubeFacts.as_view(), name='cube_facts'),
-    url(r'^cube/(?P<cube_name>\S+)/fact/(?P<fact_id>\S+)/$', CubeFact.as_view(), name='cube_fact'),
-    url(r'^cube/(?P<cube_name>\S+)/members/(?P<dimension_name>\S+)/$', CubeMembers.as_view(), name='cube_members'),
+    url(r'^$', LazyView('Index'), name='index'),
+    url(r'^version/$', LazyView('ApiVersion'), name='version'),
+    url(r'^info/$', LazyView('Info'), name='info'),
+    url(r'^cubes/$', LazyView('ListCubes'), name='cubes'),
+    url(r'^cube/(?P<cube_name>\S+)/model/$', LazyView('CubeModel'), name='cube_model'),
+    url(r'^cube/(?P<cube_name>\S+)/aggregate/$', LazyView('CubeAggregation'), name='cube_aggregation'),
+    url(
+        r'^cube/(?P<cube_name>\S+)/aggregate/stream/$', LazyView('CubeAggregationStream'),
+        name='cube_aggregation_stream'
+    ),
+    url(r'^cube/(?P<cube_name>\S+)/cell/$', LazyView('CubeCell'), name='cube_cell'),
+    url(r'^cube/(?P<cube_name>\S+)/report/$', LazyView('CubeReport'), name='cube_report'),
+    url(r'^cube/(?P<cube_name>\S+)/facts/$', LazyView('CubeFacts'), name='cube_facts'),
+    url(r'^cube/(?P<cube_name>\S+)/fact/(?P<fact_id>\S+)/$', LazyView('CubeFact'), name='cube_fact'),
+    url(
+        r'^cube/(?P<cube_name>\S+)/members/(?P<dimension_name>\S+)/$', LazyView('CubeMembers'),
+        name='cube_members'
+    ),
 )
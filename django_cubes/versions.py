@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Data versions of the fact models.
+
+The data version of a model is a counter kept in the Django cache that is
+incremented, atomically with ``cache.incr()``, on every write to the model,
+and the time of the last write. Counters start from a random value when
+they are first used, so a counter lost to an eviction or a restart starts
+again from a value that was never used, instead of validating the ETags of
+older data. When the cache does not keep the counter at all the version is
+``None`` and results are not tagged.
+
+Writes through ``save()`` and ``delete()`` bump the version once the model
+is tracked with `track_data_version()`. Writes that do not send these
+signals, like ``QuerySet.update()``, ``QuerySet.delete()``,
+``bulk_create()``, raw SQL and bulk imports, must call
+`bump_data_version()` when they are done, or results computed before them
+are considered current.
+
+The cache is ``settings.SLICER_VERSION_CACHE``, the ``default`` cache unless
+set, and must be shared by the processes serving the cubes for versions to
+be seen by all of them.
+"""
+import time
+import uuid
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+
+try:
+    from django.core.cache import caches
+except ImportError:
+    # Django < 1.7
+    from django.core.cache import get_cache
+else:
+    def get_cache(alias):
+        return caches[alias]
+
+__all__ = ['bump_data_version', 'data_version', 'track_data_version']
+
+
+def _cache():
+    return get_cache(getattr(settings, 'SLICER_VERSION_CACHE', 'default'))
+
+
+def _cache_key(model):
+    return u'cubes:data_version:%s' % model._meta.db_table
+
+
+def _seed(cache, key):
+    """Starts the counter at `key`, unless it exists, from a random value
+    that fits in a signed 64 bits counter."""
+    cache.add(key, uuid.uuid4().int >> 66, None)
+
+
+def data_version(model):
+    """Returns the (`version`, `timestamp`) tuple of the data of `model`:
+    the counter of its writes and the time of the last one, ``None`` if it
+    is not known. The version is ``None`` if the cache does not keep it."""
+    cache, key = _cache(), _cache_key(model)
+    version = cache.get(key)
+    if version is None:
+        _seed(cache, key)
+        version = cache.get(key)
+    return version, cache.get(key + u':time') if version is not None else None
+
+
+def bump_data_version(model):
+    """Records a write to `model` and returns its new data version, ``None``
+    if the cache does not keep it."""
+    cache, key = _cache(), _cache_key(model)
+    try:
+        version = cache.incr(key)
+    except ValueError:
+        _seed(cache, key)
+        try:
+            version = cache.incr(key)
+        except ValueError:
+            # The cache does not keep the counter
+            return None
+    cache.set(key + u':time', time.time(), None)
+    return version
+
+
+def _bump_sender(sender, **kwargs):
+    bump_data_version(sender)
+
+
+def track_data_version(model):
+    """Starts the data version of `model` and bumps it when its instances
+    are saved or deleted."""
+    _seed(_cache(), _cache_key(model))
+    uid = u'cubes:data_version:%s.%s' % (model._meta.app_label, model._meta.object_name)
+    post_save.connect(_bump_sender, sender=model, dispatch_uid=uid)
+    post_delete.connect(_bump_sender, sender=model, dispatch_uid=uid)
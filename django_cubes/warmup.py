@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Warm-up of the slicer before serving requests.
+
+The first request of a process pays for creating the workspace, reading
+the model files, discovering the cubes extensions, looking up the Django
+models of the cubes and building their browsers. `warm_up()` does all that
+ahead of time for the workspace of the current thread: it precomputes the
+models of the cubes (see `django_cubes.metadata`) and builds the browser of
+every cube, with its features and cut plans. Cubes that fail are logged and
+left to their first request.
+
+When ``settings.SLICER_WARMUP`` is ``True`` the workspace is warmed up when
+the application is loaded, see `django_cubes.apps.CubesConfig`, which suits
+servers handling the requests in the thread that loads the application,
+like prefork workers. It is off by default so that management commands do
+not pay for it.
+
+The result caches are warmed up by replaying the most frequent requests of
+a query log with `top_entries()` and the ``cubes_warmup`` management
+command, against the instance to warm up before traffic is switched to it.
+"""
+import logging
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+__all__ = ['top_entries', 'warm_up']
+
+
+def warm_up():
+    """Creates the workspace of the current thread and builds the models and
+    browsers of its cubes. Returns the names of the cubes warmed up."""
+    from .api import create_local_workspace
+    from .metadata import get_model_cache
+
+    try:
+        config = settings.SLICER_CONFIG_FILE
+        cubes_root = settings.SLICER_MODELS_DIR
+    except AttributeError:
+        raise ImproperlyConfigured('settings.SLICER_CONFIG_FILE and settings.SLICER_MODELS_DIR are not set.')
+
+    models = get_model_cache(create_local_workspace(config=config, cubes_root=cubes_root))
+    models.preload()
+
+    names = []
+    cube_list, list_digest = models.list_cubes()
+    for item in cube_list:
+        try:
+            models.features(models.browser(models.cube(item["name"])))
+        except Exception:
+            logging.exception("Could not warm up cube '%s'" % item["name"])
+        else:
+            names.append(item["name"])
+    return names
+
+
+def top_entries(entries, count=None):
+    """Returns the `count` most frequent requests of the query log
+    `entries`, most frequent first, leaving out requests that failed when
+    they were recorded. Requests are compared by method, path, query and
+    body."""
+    counts = Counter()
+    first = {}
+    for entry in entries:
+        if entry.get('s') is not None and entry['s'] >= 400:
+            continue
+        key = (entry.get('m'), entry.get('p'), entry.get('q') or '', repr(entry.get('b')))
+        counts[key] += 1
+        first.setdefault(key, (len(first), entry))
+    # Most frequent first, in the order they were first recorded on ties
+    keys = sorted(counts, key=lambda key: (-counts[key], first[key][0]))
+    return [first[key][1] for key in keys[:count]]
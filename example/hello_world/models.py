@@ -24,3 +24,40 @@ class IrbdBalance(models.Model):
 
     class Meta:
         db_table = 'irbd_balance'
+
+
+class IrbdBalanceSketch(models.Model):
+    category = models.CharField(max_length=256, blank=True)
+    subcategory = models.CharField(max_length=256, blank=True)
+    year = models.IntegerField(blank=True, null=True)
+    amount_hll = models.TextField(blank=True)
+    amount_tdigest = models.TextField(blank=True)
+
+    class Meta:
+        db_table = 'irbd_balance_sketch'
+
+
+class IrbdBalancePartition(models.Model):
+    id = models.IntegerField(primary_key=True)
+    category = models.CharField(max_length=256, blank=True)
+    category_label = models.CharField(max_length=256, blank=True)
+    subcategory = models.CharField(max_length=256, blank=True)
+    subcategory_label = models.CharField(max_length=256, blank=True)
+    line_item = models.CharField(max_length=256, blank=True)
+    year = models.IntegerField(blank=True, null=True)
+    amount = models.IntegerField(blank=True, null=True)
+
+    class Meta:
+        abstract = True
+
+
+class IrbdBalance2009(IrbdBalancePartition):
+
+    class Meta:
+        db_table = 'irbd_balance_2009'
+
+
+class IrbdBalance2010(IrbdBalancePartition):
+
+    class Meta:
+        db_table = 'irbd_balance_2010'
@@ -15,7 +15,11 @@ def configure_settings(options):
                 'default': {
                     'ENGINE': 'django.db.backends.sqlite3',
                     'NAME': ':memory:',
-                }
+                },
+                'shard': {
+                    'ENGINE': 'django.db.backends.sqlite3',
+                    'NAME': ':memory:',
+                },
             },
             INSTALLED_APPS=(
                 'django.contrib.contenttypes',